@@ -3,4 +3,5 @@
 # (c) 2016 Boundless, http://boundlessgeo.com
 # This code is licensed under the GPL 2.0 license.
 #
-iface = None
\ No newline at end of file
+iface = None
+explorer = None
\ No newline at end of file
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module computes the elements that have to be deleted along with a set of
+catalog elements, and deletes them in dependency order.
+
+The layers and layer groups of the catalog are read once, concurrently, and a
+graph with the elements that reference each element is built from them: layer
+groups reference their layers, layers reference their resource and styles, and
+GWC layers reference the layer they cache. Resources, stores, styles and groups
+are contained in their workspace.
+
+Elements are deleted in waves. Each wave contains the elements whose dependents
+have already been deleted, and its elements are deleted concurrently.
+'''
+
+from xml.etree import ElementTree
+from geoserver.support import url
+from geoserver.layer import Layer
+from geoserver.layergroup import LayerGroup
+from geoserver.style import Style
+from geoserver.workspace import Workspace
+from geoserverexplorer.geoserver.gwc import Gwc, GwcLayer
+from geoserverexplorer.geoserver.parallel import runConcurrently, bindToCatalog
+
+STORE_FOLDERS = ("datastores", "coveragestores", "wmsstores")
+
+
+def _strip(name):
+    return name.split(":")[-1]
+
+def _styleName(style):
+    workspace = getattr(style, "workspace", None)
+    if workspace is not None:
+        return "%s:%s" % (getattr(workspace, "name", workspace), style.name)
+    return style.name
+
+def elementKey(element):
+    '''Returns the key that identifies a catalog element in the dependency graph'''
+    if isinstance(element, GwcLayer):
+        return ("gwc", element.name)
+    if isinstance(element, Layer):
+        return ("layer", element.name)
+    if isinstance(element, LayerGroup):
+        return ("group", element.name)
+    if isinstance(element, Style):
+        return ("style", _styleName(element))
+    if isinstance(element, Workspace):
+        return ("workspace", element.name)
+    if hasattr(element, "store"):
+        return ("resource", element.workspace.name, element.store.name, element.name)
+    return ("store", element.workspace.name, element.name)
+
+def _container(key):
+    '''Returns the key of the element that contains the given one, or None'''
+    if key[0] == "resource":
+        return ("store", key[1], key[2])
+    if key[0] == "store":
+        return ("workspace", key[1])
+    if key[0] in ("style", "group") and ":" in key[1]:
+        return ("workspace", key[1].split(":")[0])
+    return None
+
+def _resourceKey(href):
+    '''Returns the key of a resource from its REST URL'''
+    segments = href.split("/")
+    for i, segment in enumerate(segments[:-4]):
+        if segment == "workspaces" and segments[i + 2] in STORE_FOLDERS:
+            name = segments[i + 5] if len(segments) > i + 5 else ""
+            if name.endswith(".xml"):
+                name = name[:-len(".xml")]
+            return ("resource", segments[i + 1], segments[i + 3], name)
+    return None
+
+
+class CatalogGraph(object):
+    '''
+    The layers and groups of a catalog, with the elements that reference each
+    of them. gwcLayers is the list of GWC layers of the catalog, if it has
+    a GWC service.
+
+    errors contains the description of the layers and groups that could not
+    be read, along with the error. The elements they reference are missing
+    from the graph, so they are not included in the plans as dependents
+    '''
+
+    def __init__(self, catalog, gwcLayers=None):
+        self.catalog = catalog
+        self.elements = {}
+        self.references = {}
+        self.layerStyles = {}
+        self.styleLayers = {}
+        self.errors = []
+        layers = catalog.get_layers()
+        groups = catalog.get_layergroups()
+        for element in layers + groups + list(gwcLayers or []):
+            self.elements[elementKey(element)] = element
+
+        tasks = ([("layer", layer.name, url(catalog.service_url, ["layers", layer.name + ".xml"]))
+                  for layer in layers]
+                 + [("group", group.name, group.href) for group in groups])
+        def fetch(catalog, task):
+            response, content = catalog.http.request(task[2])
+            if response.status != 200:
+                raise Exception(content)
+            return ElementTree.fromstring(content)
+        for (kind, name, href), dom, error in runConcurrently(catalog, fetch, tasks):
+            if error is not None:
+                self.errors.append("%s: %s" % (_describe((kind, name)), error))
+                continue
+            if kind == "layer":
+                self._addLayer(name, dom)
+            else:
+                self._addGroup(name, dom)
+
+        gwcNames = {}
+        for layer in gwcLayers or []:
+            gwcNames.setdefault(_strip(layer.name), []).append(layer)
+        for layer in layers:
+            candidates = gwcNames.get(_strip(layer.name), [])
+            if len(candidates) == 1:
+                # Layers have no workspace, so GWC layers cannot be fully compared
+                # by name. They are only deleted if there is no other GWC layer
+                # with the same name, regardless of its namespace
+                self._reference(("layer", layer.name), elementKey(candidates[0]))
+
+    def _reference(self, key, referrer):
+        self.references.setdefault(key, set()).add(referrer)
+
+    def _addLayer(self, name, dom):
+        key = ("layer", name)
+        link = dom.find("resource/{http://www.w3.org/2005/Atom}link")
+        resource = _resourceKey(link.get("href")) if link is not None else None
+        if resource is not None:
+            self._reference(resource, key)
+            self._reference(_container(resource), key)
+            self._reference(_container(_container(resource)), key)
+        default = dom.findtext("defaultStyle/name")
+        alternates = [e.findtext("name") for e in dom.findall("styles/style")]
+        self.layerStyles[name] = (default, alternates)
+        if default is not None:
+            self._reference(("style", default), key)
+        for style in [default] + alternates:
+            self.styleLayers.setdefault(style, set()).add(name)
+
+    def _addGroup(self, name, dom):
+        key = ("group", name)
+        published = dom.findall("publishables/published") or dom.findall("layers/layer")
+        for element in published:
+            member = element.findtext("name")
+            if member is None:
+                continue
+            if element.get("type") == "layerGroup":
+                candidates = [("group", member), ("group", _strip(member))]
+            else:
+                candidates = [("layer", member), ("layer", _strip(member))]
+            for candidate in candidates:
+                if candidate in self.elements:
+                    self._reference(candidate, key)
+                    break
+
+    def plan(self, elements, deleteStyles=False):
+        '''
+        Returns a DeletePlan to delete the passed elements and the ones that
+        depend on them. If deleteStyles is True, the styles that are only used
+        by deleted layers are deleted as well
+        '''
+        return DeletePlan(self, elements, deleteStyles)
+
+
+class DeletePlan(object):
+    '''
+    The elements to delete, grouped in waves that can be deleted concurrently.
+
+    dependent contains the elements that were not requested but have to be
+    deleted because they depend on a requested one, and styles contains the
+    styles that are deleted because no remaining layer uses them
+    '''
+
+    def __init__(self, graph, elements, deleteStyles):
+        self.graph = graph
+        self.elements = {}
+        for element in elements:
+            self.elements.setdefault(elementKey(element), element)
+        self.dependent = []
+        self.styles = []
+        self.skipped = {}
+
+        pending = list(self.elements)
+        while pending:
+            key = pending.pop()
+            for referrer in graph.references.get(key, []):
+                if referrer not in self.elements and referrer in graph.elements:
+                    self.elements[referrer] = graph.elements[referrer]
+                    self.dependent.append(graph.elements[referrer])
+                    pending.append(referrer)
+
+        if deleteStyles:
+            deleted = self.deletedLayerNames()
+            for name in deleted:
+                default, alternates = graph.layerStyles.get(name, (None, []))
+                for styleName in [default] + alternates:
+                    key = ("style", styleName)
+                    if styleName is None or key in self.elements:
+                        continue
+                    if graph.styleLayers.get(styleName, set()) <= deleted:
+                        style = self._getStyle(styleName)
+                        if style is not None:
+                            self.elements[key] = style
+                            self.styles.append(style)
+
+        self.waves = self._computeWaves()
+
+    def _getStyle(self, name):
+        if ":" in name:
+            workspace, name = name.split(":", 1)
+            return self.graph.catalog.get_style(name, workspace=workspace)
+        return self.graph.catalog.get_style(name)
+
+    def deletedLayerNames(self):
+        return set(key[1] for key in self.elements if key[0] == "layer")
+
+    def styleIndex(self):
+        '''
+        Returns the styles used by the layers that are not deleted, in the format
+        of CatalogWrapper.getStyleIndex
+        '''
+        deleted = self.deletedLayerNames()
+        layerStyles = dict((name, styles) for name, styles in self.graph.layerStyles.items()
+                           if name not in deleted)
+        styleLayers = dict((style, names - deleted) for style, names in self.graph.styleLayers.items())
+        return layerStyles, styleLayers
+
+    def _computeWaves(self):
+        contained = {}
+        for key in self.elements:
+            contained.setdefault(_container(key), set()).add(key)
+        keys = set(self.elements)
+        self.predecessors = {}
+        for key in self.elements:
+            # elements referencing this one, and the ones contained in it
+            predecessors = self.graph.references.get(key, set()) | contained.get(key, set())
+            if key[0] == "style":
+                predecessors = predecessors | set(("layer", name) for name in self.graph.styleLayers.get(key[1], []))
+            self.predecessors[key] = (predecessors & keys) - set([key])
+        remaining = set(self.elements)
+        waves = []
+        while remaining:
+            wave = [key for key in remaining if not (self.predecessors[key] & remaining)]
+            if not wave:
+                # circular references between groups. The remaining elements are
+                # deleted together and the server decides which ones can be deleted
+                wave = list(remaining)
+            waves.append(sorted(wave))
+            remaining.difference_update(wave)
+        return waves
+
+    def skip(self, elements, message):
+        '''
+        Keeps the passed elements of the plan from being deleted. They are reported
+        as not deleted with the given message, along with the elements that can
+        only be deleted after them
+        '''
+        for element in elements:
+            self.skipped[elementKey(element)] = message
+
+    def __len__(self):
+        return len(self.elements)
+
+    def execute(self, recurse=False, progress=None):
+        '''
+        Deletes the elements in the plan, a wave after another. Elements that depend
+        on an element that could not be deleted are not deleted.
+
+        Returns a list of (element, error message) tuples with the elements that
+        were not deleted. progress, if passed, is called with the number of
+        elements processed so far
+        '''
+        catalog = self.graph.catalog
+        failed = dict(self.skipped)
+        done = [0]
+        def waveProgress(n):
+            if progress is not None:
+                progress(done[0] + n)
+        def delete(catalog, key):
+            _deleteElement(catalog, self.elements[key], recurse)
+        for wave in self.waves:
+            runnable = []
+            for key in wave:
+                if key in failed:
+                    continue
+                blocking = sorted(self.predecessors[key] & set(failed))
+                if blocking:
+                    failed[key] = "Not deleted, since %s could not be deleted" % _describe(blocking[0])
+                else:
+                    runnable.append(key)
+            for key, result, error in runConcurrently(catalog, delete, runnable, waveProgress):
+                if error is not None:
+                    failed[key] = unicode(error)
+            done[0] += len(wave)
+            waveProgress(0)
+        catalog._cache.clear()
+        return [(self.elements[key], failed[key]) for key in sorted(failed)]
+
+
+def _describe(key):
+    return "%s '%s'" % (key[0], key[-1])
+
+def _deleteElement(catalog, element, recurse):
+    '''
+    Deletes an element. Elements that do not exist anymore, which is the case of
+    elements removed by the recursive deletion of an element that contained
+    them, are not considered errors
+    '''
+    if isinstance(element, GwcLayer):
+        gwc = Gwc(catalog)
+        layer = GwcLayer(gwc, element.name)
+        try:
+            layer.delete()
+        except Exception:
+            response, content = gwc.http.request(layer.href)
+            if response.status != 404:
+                raise
+        return
+    element = bindToCatalog(element, catalog)
+    try:
+        catalog.delete(element, recurse=recurse, purge=True)
+    except Exception:
+        response, content = catalog.http.request(element.href)
+        if response.status != 404:
+            raise
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import json
+from geoserver.catalog import UploadError
+
+# task states that will not change anymore, or that need user intervention
+FINAL_STATES = ["COMPLETE", "ERROR", "CANCELED", "NO_CRS", "NO_BOUNDS",
+                "NO_FORMAT", "BAD_FORMAT"]
+
+class ImportSession(object):
+    '''
+    An importer session with several tasks, one for each uploaded file.
+
+    The target workspace is set for the whole session when it is created, so
+    it does not have to be set for each task, and the session is run
+    asynchronously. Use refresh to poll the state of its tasks
+    '''
+
+    def __init__(self, catalog, workspace=None):
+        self.catalog = catalog
+        self.url = catalog.gs_base_url + "rest/imports"
+        data = {}
+        if workspace is not None:
+            data["targetWorkspace"] = {"workspace": {"name": workspace.name}}
+        content = self._request(self.url, "POST", json.dumps({"import": data}),
+                                "application/json", (200, 201))
+        self.id = json.loads(content)["import"]["id"]
+        self.url = "%s/%s" % (self.url, self.id)
+        self.tasks = {}
+
+    def _request(self, url, method="GET", body=None, contentType=None, expected=(200,)):
+        headers = {"Accept": "application/json"}
+        if contentType is not None:
+            headers["Content-type"] = contentType
+        response, content = self.catalog.http.request(url, method, body, headers)
+        if response.status not in expected:
+            raise UploadError("Importer request [%s %s] failed with status %d: %s"
+                              % (method, url, response.status, content))
+        return content
+
+    def addFile(self, path, filename, overwrite=False):
+        '''
+        Uploads a file, creating a new task for it. The name of the imported
+        layer is taken from the filename. Returns the ids of the created tasks
+        '''
+        contentType = "application/zip" if filename.endswith(".zip") else "application/octet-stream"
+        with open(path, "rb") as f:
+            content = self._request("%s/tasks/%s" % (self.url, filename), "PUT",
+                                    f.read(), contentType, (200, 201))
+        content = json.loads(content)
+        tasks = content["tasks"] if "tasks" in content else [content["task"]]
+        ids = []
+        for task in tasks:
+            self.tasks[task["id"]] = task["state"]
+            ids.append(task["id"])
+            if overwrite:
+                self._request("%s/tasks/%s" % (self.url, task["id"]), "PUT",
+                              json.dumps({"task": {"updateMode": "REPLACE"}}),
+                              "application/json", (200, 204))
+        return ids
+
+    def commit(self):
+        '''Starts running the session, without waiting for it to finish'''
+        self._request(self.url + "?async=true", "POST", "", None, (200, 201, 202, 204))
+
+    def refresh(self):
+        '''Updates and returns the states of the tasks in the session, as a dict'''
+        content = json.loads(self._request(self.url + "/tasks"))
+        for task in content["tasks"]:
+            self.tasks[task["id"]] = task["state"]
+        return self.tasks
+
+    def isFinished(self):
+        return all(state in FINAL_STATES for state in self.tasks.values())
+
+    def progress(self):
+        '''
+        Returns the progress of the session as a (value, maximum) tuple, with each
+        task accounting for 100 units. The progress counters of running tasks
+        are requested to the server
+        '''
+        value = 0
+        for taskId, state in self.tasks.items():
+            if state in FINAL_STATES:
+                value += 100
+            elif state == "RUNNING":
+                content = json.loads(self._request("%s/tasks/%s/progress" % (self.url, taskId)))
+                total = content.get("total") or 0
+                if total:
+                    value += 100 * content.get("progress", 0) // total
+        return value, 100 * len(self.tasks)
+
+    def cancel(self):
+        '''Deletes the session, canceling the tasks that have not been imported'''
+        self._request(self.url, "DELETE", None, None, (200, 204))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+Helpers to send requests to a catalog concurrently.
+
+Connections cannot be shared between threads, so each worker thread uses its
+own copy of the catalog, with a connection of its own.
+'''
+import copy
+import threading
+from multiprocessing.pool import ThreadPool
+from geoserverexplorer.geoserver.auth import AuthCatalog
+from qgiscommons2.settings import pluginSetting
+
+
+def canRunConcurrently(catalog):
+    # AuthCatalog uses a QgsNetworkAccessManager, which can only be used
+    # from the thread that created it
+    return not isinstance(catalog, AuthCatalog)
+
+def cloneCatalog(catalog):
+    '''Returns a copy of a catalog with its own connection and cache'''
+    clone = copy.copy(catalog)
+    clone._cache = dict()
+    clone.setup_connection()
+    return clone
+
+def bindToCatalog(element, catalog):
+    '''Returns a copy of a catalog element (a layer, a resource, a style...)
+    that uses the given catalog for its requests'''
+    element = copy.copy(element)
+    element.catalog = catalog
+    return element
+
+def _call(func, catalog, item):
+    try:
+        return item, func(catalog, item), None
+    except Exception, e:
+        return item, None, e
+
+def runConcurrently(catalog, func, items, progress=None):
+    '''
+    Calls func(catalog, item) for each one of the passed items, sending up to
+    the configured number of concurrent requests. Each thread passes its own
+    copy of the catalog to func.
+
+    Returns a list of (item, result, error) tuples, in the same order as the
+    items. error is the exception raised by func, or None if it succeeded.
+
+    progress, if passed, is called from the calling thread with the number
+    of items processed so far
+    '''
+    items = list(items)
+    threads = min(int(pluginSetting("ConcurrentRequests")), len(items))
+    results = []
+    if threads <= 1 or not canRunConcurrently(catalog):
+        for item in items:
+            results.append(_call(func, catalog, item))
+            if progress is not None:
+                progress(len(results))
+        return results
+
+    local = threading.local()
+    def worker(item):
+        if not hasattr(local, "catalog"):
+            local.catalog = cloneCatalog(catalog)
+        return _call(func, local.catalog, item)
+
+    pool = ThreadPool(threads)
+    try:
+        for result in pool.imap(worker, items):
+            results.append(result)
+            if progress is not None:
+                progress(len(results))
+    finally:
+        pool.close()
+        pool.join()
+    return results
@@ -18,11 +18,14 @@ class PKICatalog(BaseCatalog):
         if self.service_url.endswith("/"):
             self.service_url = self.service_url.strip("/")
         self.ca_cert = ca_cert
-        self.http = httplib2.Http(ca_certs=self.ca_cert, disable_ssl_certificate_validation=False)
-        self.http.add_certificate(key, cert, '')
+        self.setup_connection()
         self._cache = dict()
         self._version = None
 
+    def setup_connection(self):
+        self.http = httplib2.Http(ca_certs=self.ca_cert, disable_ssl_certificate_validation=False)
+        self.http.add_certificate(self.key, self.cert, '')
+
 class PKIClient(Client):
 
     def __init__(self, url, key, cert, ca_cert):
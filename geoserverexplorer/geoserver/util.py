@@ -78,3 +78,17 @@ def addLayerToGroups(catalog, layer, groups, workspace=None):
         styles.append(style)
         grp.dirty.update(layers=lyrs, styles=styles)
         catalog.save(grp)
+
+def mapPath(filepath, mappings):
+    '''Translates a local path into the path under which the server sees the
+    same file, using a list of (local prefix, server prefix) tuples.
+    Returns None if the path is not under any of the local prefixes'''
+    filepath = filepath.replace("\\", "/")
+    mappings = sorted(mappings or [], key=lambda m: len(m[0]), reverse=True)
+    for local, server in mappings:
+        local = local.replace("\\", "/").rstrip("/")
+        if not local:
+            continue
+        if path.normcase(filepath).startswith(path.normcase(local + "/")):
+            return server.replace("\\", "/").rstrip("/") + filepath[len(local):]
+    return None
@@ -11,14 +11,22 @@ from geoserverexplorer.gui.dialogs.gsnamedialog import getGSLayerName
 from geoserverexplorer.gui.gsnameutils import isNameValid, xmlNameRegex
 from qgiscommons2.settings import pluginSetting
 
-def publishLayer(catalog, layer, workspace=None, overwrite=False):
+def publishLayer(catalog, layer, workspace=None, overwrite=False, gslayers=None):
+    '''
+    Publishes a layer, asking for a new name if its name is not valid or already
+    in use. gslayers is the list of names of the layers in the catalog. Pass it
+    when publishing several layers, so it is not retrieved for each of them
+    '''
     name = layer.name()
-    gslayers = [lyr.name for lyr in catalog.catalog.get_layers()]
+    if gslayers is None:
+        gslayers = [lyr.name for lyr in catalog.catalog.get_layers()]
     # TODO: remove when duplicate names on different workspaces are supported
     #       we shoud check for unique names only on a given workspace
     if (name in gslayers and not overwrite) or not isNameValid(name, gslayers, 0, xmlNameRegex()):
         name = getGSLayerName(name=name, names=gslayers, unique=False)
     catalog.publishLayer(layer, workspace, True, name)
+    if name not in gslayers:
+        gslayers.append(name)
 
 
 def confirmDelete():
@@ -34,11 +42,15 @@ def confirmDelete():
 # noinspection PyPep8Naming
 class DeleteDependentsDialog(QtGui.QDialog):
 
-    def __init__(self, dependent, parent=None):
+    def __init__(self, dependent, unreadable=None, parent=None):
         super(DeleteDependentsDialog, self).__init__(parent)
         self.title = "Confirm Deletion"
-        self.msg = "The following elements depend on the elements to delete " \
-                   "and will be deleted as well:"
+        if dependent:
+            self.msg = "The following elements depend on the elements to delete " \
+                       "and will be deleted as well:"
+        else:
+            self.msg = "The elements that depend on the elements to delete " \
+                       "could not be fully computed:"
         typeorder = ['LayerGroup', 'Layer', 'GwcLayer', 'Other']
         names = dict()
         for dep in dependent:
@@ -68,6 +80,13 @@ class DeleteDependentsDialog(QtGui.QDialog):
         self.deletes = "<br><br>".join(
             ["<br><br>".join(sorted(list(set(names[typ]))))
              for typ in typeorder if typ in names])
+        if unreadable:
+            # elements depending on the unreadable ones are not listed, and their
+            # deletion might fail if the server does not delete them recursively
+            self.deletes += ("<br><br>" if self.deletes else "") + \
+                "<b>The following elements could not be read. Elements that depend " \
+                "on them are not listed and might not be deleted:</b><br><br>" + \
+                "<br>".join(unreadable)
         self.question = "Do you really want to delete all these elements?"
         self.buttonBox = None
         self.initGui()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module loads the data shown in the description panel of the explorer
+in a background thread, so selecting an item does not block the interface
+while the server is queried.
+
+Items that support it implement descriptionCatalog, which returns the catalog
+to query, and descriptionData, which returns the data to show given a catalog
+that can be used from the background thread. Loaded data is cached for each
+element, until an operation modifies the catalog or the item is refreshed.
+Data loaded by requests sent before the cache was invalidated is discarded,
+since it might not reflect the changes.
+
+Requests are only sent once the selection has not changed for a short time,
+so moving quickly through the tree does not query the server for each of
+the items that are crossed.
+'''
+
+import threading
+import sip
+from PyQt4 import QtCore
+from geoserverexplorer.gui.exploreritems import elementKey
+from geoserverexplorer.geoserver.parallel import canRunConcurrently, cloneCatalog
+
+# milliseconds to wait for the selection to settle before loading a description
+DELAY = 200
+
+
+def _descriptionKey(item):
+    return (item.__class__, elementKey(item.element))
+
+
+class DescriptionLoader(QtCore.QObject):
+
+    loaded = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, tree):
+        QtCore.QObject.__init__(self, tree)
+        self.tree = tree
+        self._cache = {}
+        self._pending = set()
+        # incremented each time cached data is invalidated, to recognize
+        # the data of requests sent before that
+        self._generation = 0
+        self._request = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DELAY)
+        self._timer.timeout.connect(self._load)
+        self.loaded.connect(self._loaded)
+
+    def data(self, item):
+        '''
+        Returns the description data of an item if it has been loaded. Otherwise,
+        schedules its loading and returns None. The description of the item is
+        updated once the data is available, if the item is still selected.
+        If the data could not be loaded, the raised exception is returned
+        '''
+        key = _descriptionKey(item)
+        if key in self._cache:
+            return self._cache[key]
+        self._request = item
+        self._timer.start()
+        return None
+
+    def invalidate(self, item=None, recursive=False):
+        '''
+        Removes the cached description data of an item, or of all items if no item
+        is passed. If recursive is True, the data of the descendants of the item
+        is removed as well
+        '''
+        self._generation += 1
+        if item is None:
+            self._cache.clear()
+            return
+        items = [item]
+        while items:
+            item = items.pop()
+            self._cache.pop(_descriptionKey(item), None)
+            if recursive:
+                items.extend(item.child(idx) for idx in xrange(item.childCount()))
+
+    def _load(self):
+        item, self._request = self._request, None
+        if item is None or sip.isdeleted(item) or item is not self.tree.lastClickedItem():
+            return
+        key = _descriptionKey(item)
+        if key in self._pending or key in self._cache:
+            return
+        catalog = item.descriptionCatalog()
+        if catalog is None or not canRunConcurrently(catalog):
+            self._fetch(item, key, catalog, self._generation)
+            return
+        self._pending.add(key)
+        thread = threading.Thread(target=self._fetch,
+                                  args=(item, key, cloneCatalog(catalog), self._generation))
+        thread.daemon = True
+        thread.start()
+
+    def _fetch(self, item, key, catalog, generation):
+        try:
+            data = item.descriptionData(catalog)
+        except Exception, e:
+            data = e
+        # the signal is delivered in the thread of the loader
+        self.loaded.emit(item, key, (generation, data))
+
+    def _loaded(self, item, key, result):
+        generation, data = result
+        self._pending.discard(key)
+        selected = not sip.isdeleted(item) and item is self.tree.lastClickedItem()
+        if generation != self._generation:
+            # the cache was invalidated while loading, so the data might be
+            # outdated. It is loaded again if the item is still selected
+            if selected:
+                self.data(item)
+            return
+        self._cache[key] = data
+        if selected:
+            description = getattr(item, "description", None)
+            if description is not None and not sip.isdeleted(description):
+                description.setHtml(item.getDescriptionHtml(self.tree, self.tree.explorer))
+        if isinstance(data, Exception):
+            # errors are shown, but the data is loaded again the next time
+            # the item is selected
+            del self._cache[key]
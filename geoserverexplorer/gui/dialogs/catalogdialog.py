@@ -148,6 +148,39 @@ class DefineCatalogDialog(QtGui.QDialog):
 
         verticalLayout.addWidget(self.authBox)
 
+        self.pathsTable = QtGui.QTableWidget()
+        self.pathsTable.setColumnCount(2)
+        self.pathsTable.setHorizontalHeaderLabels(["Local folder", "Server folder"])
+        self.pathsTable.horizontalHeader().setStretchLastSection(True)
+        self.pathsTable.verticalHeader().setVisible(False)
+        if self.catalog is not None and hasattr(self.catalog, "pathMappings"):
+            pathMappings = self.catalog.pathMappings
+        elif self.name is not None:
+            pathMappings = readPathMappings(self.name)
+        else:
+            pathMappings = []
+        for local, server in pathMappings:
+            self.addPathMapping(local, server)
+        addPathButton = QtGui.QPushButton("Add")
+        addPathButton.clicked.connect(lambda: self.addPathMapping())
+        removePathButton = QtGui.QPushButton("Remove")
+        removePathButton.clicked.connect(self.removePathMapping)
+        buttonsLayout = QtGui.QVBoxLayout()
+        buttonsLayout.addWidget(addPathButton)
+        buttonsLayout.addWidget(removePathButton)
+        buttonsLayout.addStretch()
+        pathsLayout = QtGui.QHBoxLayout()
+        pathsLayout.addWidget(self.pathsTable)
+        pathsLayout.addLayout(buttonsLayout)
+
+        self.pathsBox = QtGui.QGroupBox()
+        self.pathsBox.setTitle("Folders shared with the server")
+        self.pathsBox.setToolTip("Layers in these folders are published by reference to their\n"
+                                 "path in the server, instead of uploading their data")
+        self.pathsBox.setLayout(pathsLayout)
+
+        verticalLayout.addWidget(self.pathsBox)
+
         if self.catalog is not None:
             if isinstance(self.catalog, PKICatalog):
                 self.tabWidget.setCurrentIndex(1)
@@ -171,6 +204,17 @@ class DefineCatalogDialog(QtGui.QDialog):
         self.resize(400,200)
 
 
+    def addPathMapping(self, local="", server=""):
+        row = self.pathsTable.rowCount()
+        self.pathsTable.insertRow(row)
+        self.pathsTable.setItem(row, 0, QtGui.QTableWidgetItem(local))
+        self.pathsTable.setItem(row, 1, QtGui.QTableWidgetItem(server))
+
+    def removePathMapping(self):
+        rows = sorted(set(index.row() for index in self.pathsTable.selectedIndexes()), reverse=True)
+        for row in rows:
+            self.pathsTable.removeRow(row)
+
     def okPressed(self):
         self.url = unicode(self.urlBox.text().strip('/')     + '/rest')
         if not self.url.startswith('http'):
@@ -211,6 +255,14 @@ class DefineCatalogDialog(QtGui.QDialog):
                                               "Please specify a valid authentication for connecting to the catalog")
                     return
 
+        self.pathMappings = []
+        for row in xrange(self.pathsTable.rowCount()):
+            local, server = [unicode(self.pathsTable.item(row, col).text()).strip()
+                             if self.pathsTable.item(row, col) is not None else ""
+                             for col in (0, 1)]
+            if local and server:
+                self.pathMappings.append((local, server))
+
         nametxt = unicode(self.nameBox.text())
         # increment only when adding a new connection or if editing a saved
         # connection and the name has changed
@@ -234,9 +286,36 @@ class DefineCatalogDialog(QtGui.QDialog):
                 settings.setValue("authid", None)
                 settings.setValue("username", self.username)
             settings.endGroup()
+            savePathMappings(self.name, self.pathMappings)
         self.ok = True
         self.close()
 
     def cancelPressed(self):
         self.ok = False
         self.close()
+
+
+def readPathMappings(name):
+    '''Returns the (local folder, server folder) tuples stored for a catalog connection'''
+    settings = QtCore.QSettings()
+    settings.beginGroup("/GeoServer/Catalogs/" + name)
+    size = settings.beginReadArray("pathMappings")
+    mappings = []
+    for i in xrange(size):
+        settings.setArrayIndex(i)
+        mappings.append((unicode(settings.value("local")), unicode(settings.value("server"))))
+    settings.endArray()
+    settings.endGroup()
+    return mappings
+
+def savePathMappings(name, mappings):
+    settings = QtCore.QSettings()
+    settings.beginGroup("/GeoServer/Catalogs/" + name)
+    settings.remove("pathMappings")
+    settings.beginWriteArray("pathMappings")
+    for i, (local, server) in enumerate(mappings):
+        settings.setArrayIndex(i)
+        settings.setValue("local", local)
+        settings.setValue("server", server)
+    settings.endArray()
+    settings.endGroup()
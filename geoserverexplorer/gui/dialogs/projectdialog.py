@@ -64,9 +64,14 @@ class PublishProjectDialog(QtGui.QDialog):
 
         self.overwriteBox = QtGui.QCheckBox()
         self.overwriteBox.setChecked(False)
-        self.overwriteBox.setText("Overwrite without asking")
+        self.overwriteBox.setText("Republish data of layers already in the workspace")
         layout.addWidget(self.overwriteBox)
 
+        self.deleteOthersBox = QtGui.QCheckBox()
+        self.deleteOthersBox.setChecked(False)
+        self.deleteOthersBox.setText("Delete layers in the workspace that are not in the project")
+        layout.addWidget(self.deleteOthersBox)
+
         self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Close)
         layout.addWidget(self.buttonBox)
 
@@ -81,6 +86,7 @@ class PublishProjectDialog(QtGui.QDialog):
     def okPressed(self):
         self.workspace = self.workspaces[self.workspaceBox.currentIndex()]
         self.overwrite = self.overwriteBox.isChecked()
+        self.deleteOthers = self.deleteOthersBox.isChecked()
         self.groupName = self.groupNameBox.text()
         if self.groupName.strip() == "":
             self.groupName = None
@@ -92,3 +98,51 @@ class PublishProjectDialog(QtGui.QDialog):
         self.workspace = None
         self.close()
 
+
+class SyncPlanDialog(QtGui.QDialog):
+    '''Shows the operations that will be run to publish a project, so they can be reviewed before running them'''
+
+    def __init__(self, plan, parent = None):
+        super(SyncPlanDialog, self).__init__(parent)
+        self.plan = plan
+        self.ok = False
+        self.initGui()
+
+    def initGui(self):
+        layout = QtGui.QVBoxLayout()
+        self.setWindowTitle('Publish project')
+
+        if len(self.plan):
+            msg = "The following operations will be performed to publish the project:"
+        else:
+            msg = "The catalog is already up to date with the project. There is nothing to publish."
+        msgLabel = QtGui.QLabel(msg)
+        msgLabel.setWordWrap(True)
+        layout.addWidget(msgLabel)
+
+        operationsList = QtGui.QListWidget()
+        operationsList.addItems(self.plan.descriptions())
+        layout.addWidget(operationsList)
+
+        if len(self.plan):
+            buttons = QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel
+        else:
+            buttons = QtGui.QDialogButtonBox.Close
+        self.buttonBox = QtGui.QDialogButtonBox(buttons)
+        layout.addWidget(self.buttonBox)
+
+        self.setLayout(layout)
+
+        self.buttonBox.accepted.connect(self.okPressed)
+        self.buttonBox.rejected.connect(self.cancelPressed)
+
+        self.resize(500, 400)
+
+    def okPressed(self):
+        self.ok = True
+        self.close()
+
+    def cancelPressed(self):
+        self.ok = False
+        self.close()
+
@@ -6,6 +6,7 @@
 from PyQt4.Qsci import QsciScintilla, QsciLexerXML
 from PyQt4 import QtGui, QtCore
 import xml.dom.minidom
+from geoserverexplorer.qgis import stylecache
 
 
 class SldEditorDialog(QtGui.QDialog):
@@ -37,6 +38,7 @@ class SldEditorDialog(QtGui.QDialog):
 
     def okPressed(self):
         self.explorer.run(self.style.update_body, "Update SLD body", [], self.editor.text())
+        stylecache.forgetUploadedStyle(self.style.catalog, self.style.name)
         self.close()
 
     def cancelPressed(self):
@@ -15,6 +15,8 @@ from geoserverexplorer.gui.explorertree import ExplorerTreeWidget
 from geoserverexplorer.qgis.utils import UserCanceledOperation
 from qgiscommons2.settings import pluginSetting
 
+MAX_SEARCH_RESULTS = 200
+
 class GeoServerExplorer(QtGui.QDockWidget):
 
     def __init__(self, parent = None):
@@ -37,7 +39,23 @@ class GeoServerExplorer(QtGui.QDockWidget):
         self.toolbar.setToolButtonStyle(QtCore.Qt.ToolButtonIconOnly)
         self.toolbar.setVisible(showToolbar)
         self.setToolbarActions([])
-        self.splitter.addWidget(self.explorerTree)
+        self.searchBox = QtGui.QLineEdit()
+        self.searchBox.setPlaceholderText("Search...")
+        self.searchBox.textChanged.connect(self.search)
+        self.searchResults = QtGui.QListWidget()
+        self.searchResults.setVisible(False)
+        self.searchResults.itemClicked.connect(self.searchResultClicked)
+        self.searchResults.itemActivated.connect(self.searchResultClicked)
+        self.searchItems = []
+        self.treeWidget = QtGui.QWidget()
+        treeLayout = QtGui.QVBoxLayout()
+        treeLayout.setSpacing(2)
+        treeLayout.setMargin(0)
+        treeLayout.addWidget(self.searchBox)
+        treeLayout.addWidget(self.searchResults)
+        treeLayout.addWidget(self.explorerTree)
+        self.treeWidget.setLayout(treeLayout)
+        self.splitter.addWidget(self.treeWidget)
         self.log = QtGui.QTextEdit()
         self.description = QtGui.QWidget()
         self.descriptionLayout = QtGui.QVBoxLayout()
@@ -83,6 +101,27 @@ class GeoServerExplorer(QtGui.QDockWidget):
 
         self.toolbar.update()
 
+    def search(self, text):
+        '''Shows the items of the connected catalogs that match the text in the search box'''
+        self.searchResults.clear()
+        self.searchItems = self.explorerTree.searchIndex.search(text, MAX_SEARCH_RESULTS)
+        self.searchResults.setVisible(bool(text.strip()))
+        for item in self.searchItems:
+            path = []
+            parent = item.parent()
+            while parent is not None and parent.parent() is not None:
+                path.append(parent.text(0))
+                parent = parent.parent()
+            text = item.text(0)
+            if path:
+                text += "  (%s)" % " / ".join(reversed(path))
+            self.searchResults.addItem(QtGui.QListWidgetItem(item.icon(0), text))
+
+    def searchResultClicked(self, listItem):
+        item = self.searchItems[self.searchResults.row(listItem)]
+        if item.treeWidget() is self.explorerTree:
+            self.explorerTree.revealItem(item)
+
     def refreshContent(self):
         showDescription = pluginSetting("ShowDescription")
         self.description.setVisible(showDescription)
@@ -100,6 +139,9 @@ class GeoServerExplorer(QtGui.QDockWidget):
         QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
         try:
             command(*params)
+            if msg is not None:
+                # the operation might have modified elements whose description is cached
+                self.explorerTree.descriptionLoader.invalidate()
             for item in refresh:
                 if item is not None:
                     item.refreshContent(self)
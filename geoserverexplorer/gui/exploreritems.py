@@ -6,9 +6,51 @@
 from geoserverexplorer.geoserver import util
 from PyQt4 import QtGui, QtCore
 
+_icons = {}
+
+def getIcon(path):
+    '''Returns the icon in a file. Each file is loaded once, and its icon is shared by all the items using it'''
+    icon = _icons.get(path)
+    if icon is None:
+        icon = QtGui.QIcon(path)
+        _icons[path] = icon
+    return icon
+
+def elementKey(element):
+    '''
+    Returns the key used to index the items representing an element. Named
+    elements are identified by their class, catalog, workspace and name, and
+    other elements by themselves
+    '''
+    if element is None:
+        return None
+    if not hasattr(element, "name"):
+        try:
+            hash(element)
+        except TypeError:
+            return None
+        return element
+    catalog = getattr(element, "catalog", None)
+    # the workspace is only taken if it is a plain attribute, to avoid
+    # properties that send requests to the catalog
+    workspace = element.__dict__.get("workspace") if hasattr(element, "__dict__") else None
+    return (element.__class__, getattr(catalog, "service_url", None),
+            getattr(workspace, "name", workspace), element.name)
+
+def _childKey(item):
+    '''
+    Returns the key used to match the children of an item before and after
+    refreshing it. Elements without a name are recreated on each refresh, so
+    only the class and text of their items are compared
+    '''
+    element = getattr(item, "element", None)
+    return (item.__class__, item.text(0), elementKey(element) if hasattr(element, "name") else None)
+
 class TreeItem(QtGui.QTreeWidgetItem):
     def __init__(self, element, icon = None, text = None):
         QtGui.QTreeWidgetItem.__init__(self)
+        self._element = None
+        self._shadow = None
         self.element = element
         self.setData(0, QtCore.Qt.UserRole, element)
         self._text = text
@@ -18,15 +60,145 @@ class TreeItem(QtGui.QTreeWidgetItem):
             self.setIcon(0, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
 
+    @property
+    def element(self):
+        return self._element
+
+    @element.setter
+    def element(self, element):
+        # the tree indexes its items by element, so it has to be notified
+        # when the element of an item in the tree is replaced
+        tree = self.treeWidget()
+        if tree is not None and hasattr(tree, "unindexItem"):
+            tree.unindexItem(self)
+            self._element = element
+            tree.indexItem(self)
+        else:
+            self._element = element
+
+    def searchTerms(self):
+        '''Returns the texts used to find the item with the search box of the explorer'''
+        element = self.element
+        if not hasattr(element, "name"):
+            return []
+        terms = [self.text(0), element.name]
+        workspace = element.__dict__.get("workspace") if hasattr(element, "__dict__") else None
+        terms.append(getattr(workspace, "name", workspace))
+        return [term for term in terms if isinstance(term, basestring)]
+
     def refresh(self):
         text = self._text if self._text is not None else util.name(self.element)
         self.setText(0, text)
 
+    def addChild(self, item):
+        if self._shadow is not None:
+            self._shadow.addChild(item)
+        else:
+            QtGui.QTreeWidgetItem.addChild(self, item)
+
+    def addChildren(self, items):
+        if self._shadow is not None:
+            self._shadow.addChildren(items)
+        else:
+            QtGui.QTreeWidgetItem.addChildren(self, items)
+
+    def takeChildren(self):
+        if self._shadow is not None:
+            return self._shadow.takeChildren()
+        return QtGui.QTreeWidgetItem.takeChildren(self)
+
+    def sortChildren(self, column, order):
+        if self._shadow is not None:
+            self._shadow.sortChildren(column, order)
+        else:
+            QtGui.QTreeWidgetItem.sortChildren(self, column, order)
+
     def refreshContent(self, explorer):
-        self.takeChildren()
+        tree = self.treeWidget()
+        if tree is not None and hasattr(tree, "descriptionLoader"):
+            tree.descriptionLoader.invalidate(self, recursive=True)
         self.refresh()
         if hasattr(self, 'populate'):
-            explorer.run(self.populate, None, [])
+            explorer.run(self.refreshChildren, None, [])
+        else:
+            self.takeChildren()
+
+    def refreshChildren(self):
+        '''
+        Populates the item again and updates its children with the differences
+        between the new children and the current ones. Unchanged children are
+        kept, along with their expansion and selection state, so only the rows
+        that have changed are updated in the tree
+        '''
+        self._shadow = QtGui.QTreeWidgetItem()
+        try:
+            self.populate()
+        finally:
+            newChildren = self._shadow.takeChildren()
+            self._shadow = None
+            self._mergeChildren(newChildren)
+
+    def _mergeChildren(self, newChildren):
+        current = [self.child(idx) for idx in xrange(self.childCount())]
+        available = {}
+        for child in current:
+            available.setdefault(_childKey(child), []).append(child)
+        children = []
+        replaced = {}
+        for child in newChildren:
+            candidates = available.get(_childKey(child))
+            if candidates:
+                old = candidates.pop(0)
+                replaced[id(child)] = old
+                old._updateFrom(child)
+                children.append(old)
+            else:
+                children.append(child)
+        if not current:
+            # all the children are inserted in a single operation
+            self.addChildren(children)
+            return
+        kept = set(id(child) for child in children)
+        for child in current:
+            if id(child) not in kept:
+                self.removeChild(child)
+        for idx, child in enumerate(children):
+            if self.child(idx) is child:
+                continue
+            if child.parent() is self:
+                expanded = child.isExpanded()
+                selected = child.isSelected()
+                self.removeChild(child)
+                self.insertChild(idx, child)
+                child.setExpanded(expanded)
+                child.setSelected(selected)
+            else:
+                self.insertChild(idx, child)
+        # attributes pointing to the new children have to point to the kept ones
+        for name, value in self.__dict__.items():
+            if isinstance(value, QtGui.QTreeWidgetItem) and id(value) in replaced:
+                setattr(self, name, replaced[id(value)])
+
+    def _updateFrom(self, item):
+        '''Updates this item with the state of an equivalent item created by a new populate call'''
+        for name, value in item.__dict__.items():
+            if name != "_shadow":
+                self.__dict__[name] = value
+        self.setData(0, QtCore.Qt.UserRole, self.element)
+        for column in xrange(item.columnCount()):
+            self.setText(column, item.text(column))
+        self.setIcon(0, item.icon(0))
+        self.setFlags(item.flags())
+        tree = self.treeWidget()
+        if tree is not None and hasattr(tree, "searchIndex"):
+            tree.searchIndex.add(self, self.searchTerms())
+        newChildren = item.takeChildren()
+        if newChildren or not self.isExpanded() or not hasattr(self, "populate"):
+            self._mergeChildren(newChildren)
+        else:
+            # children that are only populated when the item is expanded. Since
+            # it is expanded, it has to be populated again
+            self.refreshChildren()
 
     def descriptionWidget(self, tree, explorer):
         text = self.getDescriptionHtml(tree, explorer)
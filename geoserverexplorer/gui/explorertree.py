@@ -11,6 +11,21 @@ from geoserverexplorer.qgis import uri as uri_utils
 from PyQt4 import QtGui, QtCore, QtXml
 from PyQt4.QtGui import QMessageBox
 from geoserver.catalog import FailedRequestError
+from geoserverexplorer.gui.exploreritems import elementKey, getIcon
+from geoserverexplorer.gui.searchindex import SearchIndex
+from geoserverexplorer.gui.descriptionloader import DescriptionLoader
+
+def _treePosition(item):
+    position = []
+    while item is not None:
+        parent = item.parent()
+        if parent is not None:
+            position.append(parent.indexOfChild(item))
+        else:
+            position.append(item.treeWidget().indexOfTopLevelItem(item))
+        item = parent
+    return position[::-1]
+
 
 class ExplorerTreeWidget(QtGui.QTreeWidget):
 
@@ -31,6 +46,11 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         self.setAcceptDrops(True)
         self.setDropIndicatorShown(True)
         self.lastClicked = None
+        self._itemsIndex = {}
+        self.searchIndex = SearchIndex()
+        self.descriptionLoader = DescriptionLoader(self)
+        self.model().rowsInserted.connect(self._rowsInserted)
+        self.model().rowsAboutToBeRemoved.connect(self._rowsAboutToBeRemoved)
 
         self.itemSelectionChanged.connect(
             lambda : self._selectionChanged(explorer))
@@ -88,7 +108,7 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
             actions = item.multipleSelectionContextMenuActions(
                 self, self.explorer, items)
         if (isinstance(item, TreeItem)):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/refresh.png")
             refreshAction = QtGui.QAction(icon, "Refresh", self.explorer)
             refreshAction.triggered.connect(lambda: item.refreshContent(self.explorer))
             actions.append(refreshAction)
@@ -143,7 +163,7 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
             return
         menu = QtGui.QMenu()
         if (isinstance(self.selectedItem, TreeItem) and hasattr(self.selectedItem, 'populate')):
-            refreshIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")
+            refreshIcon = getIcon(os.path.dirname(__file__) + "/../images/refresh.png")
             refreshAction = QtGui.QAction(refreshIcon, "Refresh", None)
             refreshAction.triggered.connect(lambda: self.selectedItem.refreshContent(self.explorer))
             menu.addAction(refreshAction)
@@ -154,24 +174,63 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         menu.exec_(point)
 
     def findAllItems(self, element):
-        allItems = []
-        iterator = QtGui.QTreeWidgetItemIterator(self)
-        value = iterator.value()
-        while value:
-            if hasattr(value, 'element'):
-                if hasattr(value.element, 'name') and hasattr(element, 'name'):
-                    if  value.element.name == element.name and value.element.__class__ == element.__class__:
-                        allItems.append(value)
-                elif value.element == element:
-                    allItems.append(value)
-            iterator += 1
-            value = iterator.value()
-        #=======================================================================
-        # if not allItems:
-        #     allItems = [None] #Signal that the whole tree has to be updated
-        #=======================================================================
+        '''
+        Returns the items representing an element, in the order they appear in
+        the tree. Items are looked up in an index that is updated as items are
+        added to and removed from the tree
+        '''
+        key = elementKey(element)
+        if key is None:
+            return []
+        allItems = [item for item in self._itemsIndex.get(key, []) if item.treeWidget() is self]
+        if len(allItems) > 1:
+            allItems.sort(key=_treePosition)
         return allItems
 
+    def indexItem(self, item):
+        '''Adds an item and its children to the index of items by element'''
+        key = elementKey(getattr(item, "element", None))
+        if key is not None:
+            self._itemsIndex.setdefault(key, []).append(item)
+        if hasattr(item, "searchTerms"):
+            self.searchIndex.add(item, item.searchTerms())
+        for idx in xrange(item.childCount()):
+            self.indexItem(item.child(idx))
+
+    def unindexItem(self, item):
+        '''Removes an item and its children from the index of items by element'''
+        key = elementKey(getattr(item, "element", None))
+        items = self._itemsIndex.get(key, [])
+        if item in items:
+            items.remove(item)
+            if not items:
+                del self._itemsIndex[key]
+        self.searchIndex.remove(item)
+        for idx in xrange(item.childCount()):
+            self.unindexItem(item.child(idx))
+
+    def revealItem(self, item):
+        '''Expands the ancestors of an item, and selects it and shows its description'''
+        parent = item.parent()
+        while parent is not None:
+            parent.setExpanded(True)
+            parent = parent.parent()
+        self.scrollToItem(item)
+        self.setCurrentItem(item)
+        self.treeItemClicked(item, 0)
+
+    def _rowsInserted(self, parent, first, last):
+        for row in xrange(first, last + 1):
+            item = self.itemFromIndex(self.model().index(row, 0, parent))
+            if item is not None:
+                self.indexItem(item)
+
+    def _rowsAboutToBeRemoved(self, parent, first, last):
+        for row in xrange(first, last + 1):
+            item = self.itemFromIndex(self.model().index(row, 0, parent))
+            if item is not None:
+                self.unindexItem(item)
+
     def _selectionChanged(self, explorer):
         items = self.selectedItems()
         # see also: self.treeItemClicked about single selection workaround
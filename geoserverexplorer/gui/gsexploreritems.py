@@ -11,12 +11,12 @@ from PyQt4 import QtGui, QtCore
 from geoserverexplorer.qgis import layers as qgislayers
 from geoserver.store import DataStore
 from geoserver.resource import Coverage, FeatureType
-from dialogs.catalogdialog import DefineCatalogDialog
+from dialogs.catalogdialog import DefineCatalogDialog, readPathMappings
 from geoserver.style import Style
 from geoserver.layer import Layer
 from dialogs.styledialog import AddStyleToLayerDialog, StyleFromLayerDialog
 from geoserverexplorer.qgis.catalog import CatalogWrapper
-from geoserverexplorer.gui.exploreritems import TreeItem
+from geoserverexplorer.gui.exploreritems import TreeItem, getIcon
 from dialogs.groupdialog import LayerGroupDialog
 from dialogs.workspacedialog import DefineWorkspaceDialog
 from geoserver.layergroup import UnsavedLayerGroup
@@ -31,9 +31,12 @@ from geoserverexplorer.gui.gwcexploreritems import GwcLayersItem
 from geoserverexplorer import config
 from geoserverexplorer.qgis.utils import *
 from geoserverexplorer.qgis.sldadapter import adaptGsToQgs, getGeomTypeFromSld,\
-    getGsCompatibleSld
+    getGsCompatibleSld, setLayerSld
 from geoserverexplorer.gui.confirm import *
 from geoserverexplorer.geoserver.util import getLayerFromStyle
+from geoserverexplorer.geoserver.deleteplanner import CatalogGraph
+from geoserverexplorer.geoserver.parallel import bindToCatalog
+from geoserverexplorer.qgis import stylecache
 from geoserverexplorer.gui.confirm import confirmDelete
 from geoserverexplorer.geoserver.pki import PKICatalog
 from _ssl import SSLError
@@ -44,7 +47,6 @@ from geoserverexplorer.geoserver.auth import AuthCatalog
 from geoserverexplorer.gui.gsoperations import addDraggedStyleToLayer
 import xml.dom.minidom
 from qgiscommons2.settings import pluginSetting
-from qgiscommons2.files import tempFilename
 
 class GsTreeItem(TreeItem):
 
@@ -88,7 +90,6 @@ class GsTreeItem(TreeItem):
 
     def deleteElements(self, selected, tree, explorer):
         elements = []
-        uniqueStyles = []
         workspacesToUpdate = []
         for item in selected:
             elements.append(item.element)
@@ -97,7 +98,6 @@ class GsTreeItem(TreeItem):
                     subitem = item.child(idx)
                     elements.insert(0, subitem.element)
             elif isinstance(item, GsLayerItem):
-                uniqueStyles.extend(self.uniqueStyles(item.element))
                 workspace = item.element.resource.workspace
                 workspacesToUpdate.extend(tree.findAllItems(workspace))
             elif isinstance(item, GsWorkspaceItem):
@@ -107,10 +107,27 @@ class GsTreeItem(TreeItem):
                         subsubitem = subitem.child(subidx)
                         elements.insert(0, subsubitem.element)
         toUpdate = set(item.parent() for item in selected)
-        progress = 0
-        dependent = self.getDependentElements(elements, tree)
-        if dependent:
-            depdlg = DeleteDependentsDialog(dependent)
+        deleteStyle = pluginSetting("DeleteStyle")
+        recurse = pluginSetting("Recurse")
+
+        # the dependencies of the elements are computed from a single snapshot
+        # of each catalog
+        elementsByCatalog = defaultdict(list)
+        for element in elements:
+            elementsByCatalog[element.catalog].append(element)
+        plans = []
+        for catalog, catalogElements in elementsByCatalog.iteritems():
+            catItem = tree.findAllItems(catalog)[0]
+            gwcItem = catItem.gwcItem
+            gwcLayers = []
+            if gwcItem.isValid:
+                gwcLayers = [gwcItem.child(idx).element for idx in xrange(gwcItem.childCount())]
+            graph = CatalogGraph(catalog, gwcLayers)
+            plans.append(graph.plan(catalogElements, deleteStyle))
+        dependent = [e for plan in plans for e in plan.dependent]
+        unreadable = [error for plan in plans for error in plan.graph.errors]
+        if dependent or unreadable:
+            depdlg = DeleteDependentsDialog(dependent, unreadable)
             if not depdlg.exec_():
                 return
             toDelete = set()
@@ -121,136 +138,68 @@ class GsTreeItem(TreeItem):
             toUpdate = toUpdate - toDelete
         elif not confirmDelete():
             return
-        deleteStyle = pluginSetting("DeleteStyle")
-        recurse = pluginSetting("Recurse")
 
-        elements[0:0] = dependent
         if recurse:
             toUpdate.update(workspacesToUpdate)
-        if deleteStyle:
-            elements.extend(uniqueStyles)
-            stylesEntriesToUpdate = set()
-            for e in uniqueStyles:
+        for plan in plans:
+            for e in plan.styles:
                 items = tree.findAllItems(e);
                 for item in items:
                     #the item representing the layer we are deleting will be here, but we have to ignore it
                     #and update only the "styles" item
                     if isinstance(item.parent(), GsStylesItem):
-                        stylesEntriesToUpdate.add(item.parent())
+                        toUpdate.add(item.parent())
                         break
-            toUpdate.update(stylesEntriesToUpdate)
-        explorer.setProgressMaximum(len(elements), "Deleting elements")
-        for progress, element in enumerate(elements):
-            explorer.setProgress(progress)
-            #we run this delete operation this way, to ignore the error in case we are trying to delete
-            #something that doesn't exist which might happen if a previous deletion has purged the element
-            #we now want to delete. It is deleted already anyway, so we should not raise any exception
-            #TODO: this might swallow other type of exceptions. Should implement a more fine-grained error handling
+        # styles are removed from the layers using them before the deletion starts,
+        # using the index of the layers using each style from the snapshot
+        for plan in plans:
+            styles = [e for e in plan.elements.values() if isinstance(e, Style)]
+            if not styles:
+                continue
+            catalog = plan.graph.catalog
             try:
-                if isinstance(element, Style):
-                    layersToUpdate = []
-                    layers = element.catalog.get_layers()
-                    for layer in layers:
-                        styles = layer.styles
-                        if not styles:
-                            continue
-                        if layer.default_style.name == element.name:
-                            layersToUpdate.append(layer)
-                        else:
-                            for style in styles:
-                                if style.name == element.name:
-                                    layersToUpdate.append(layer)
-                                    break
-                    for layer in layersToUpdate:
-                        styles = layer.styles
-                        styles = [style for style in styles if style.name != element.name]
-                        layer.styles = styles
-                        element.catalog.save(layer)
-                        toUpdate.add(tree.findAllItems(layer)[0])
-                element.catalog.delete(element, recurse = recurse, purge = True)
-            except:
-                pass
-        explorer.setProgress(len(elements))
+                layerNames = set(CatalogWrapper(catalog).removeStylesFromLayers(styles, plan.styleIndex()))
+            except Exception, e:
+                # styles that might still be used by a layer are not deleted. Some of
+                # the layers might have been updated, so all the ones using them are refreshed
+                plan.skip(styles, "Not deleted, since it could not be removed from the layers using it: %s"
+                          % unicode(e))
+                styleLayers = plan.styleIndex()[1]
+                layerNames = set()
+                for key, element in plan.elements.iteritems():
+                    if isinstance(element, Style):
+                        layerNames.update(styleLayers.get(key[1], []))
+            # the items of the updated layers are found in the index of the tree,
+            # which only needs their names, so the layers are not listed again
+            for name in layerNames:
+                toUpdate.update(tree.findAllItems(Layer(catalog, name)))
+
+        total = sum(len(plan) for plan in plans)
+        explorer.setProgressMaximum(total, "Deleting elements")
+        errors = []
+        done = 0
+        for plan in plans:
+            def progress(n):
+                explorer.setProgress(done + n)
+            errors.extend(plan.execute(recurse, progress))
+            failed = [element for element, msg in errors]
+            for element in plan.elements.values():
+                if isinstance(element, Style) and element not in failed:
+                    stylecache.forgetUploadedStyle(element.catalog, element.name)
+            done += len(plan)
+        explorer.setProgress(total)
         for item in toUpdate:
             if item is not None:
                 item.refreshContent(explorer)
         if None in toUpdate:
             explorer.refreshContent()
         explorer.resetActivity()
+        if errors:
+            explorer.setWarning("The following elements could not be deleted:<br>"
+                                + "<br>".join("%s: %s" % (element.name, msg) for element, msg in errors))
         explorer.setDescriptionWidget()
         explorer.setToolbarActions([])
 
-    def uniqueStyles(self, layer):
-        '''returns the styles used by a layer that are not used by any other layer'''
-        unique = []
-        allUsedStyles = set()
-        catalog = layer.catalog
-        layers = catalog.get_layers()
-        for lyr in layers:
-            if lyr.name == layer.name:
-                continue
-            for style in lyr.styles:
-                allUsedStyles.add(style.name)
-                if lyr.default_style is not None:
-                    allUsedStyles.add(lyr.default_style.name)
-        for style in layer.styles:
-            if style.name not in allUsedStyles:
-                unique.append(style)
-        if layer.default_style is not None and layer.default_style not in allUsedStyles:
-            unique.append(layer.default_style)
-        return unique
-
-    def getDependentElements(self, elements, tree):
-        dependent = []
-        for element in elements:
-            if isinstance(element, Layer):
-                groups = element.catalog.get_layergroups()
-                for group in groups:
-                    if group.layers is None:
-                        continue
-                    for layer in group.layers:
-                        if layer == element.name:
-                            dependent.append(group)
-                            break
-                catItem = tree.findAllItems(element.catalog)[0];
-                gwcItem = catItem.gwcItem
-                if gwcItem.isValid:
-                    possibleGwcLayers = []
-                    for idx in xrange(gwcItem.childCount()):
-                        gwcLayerItem = gwcItem.child(idx)
-                        gwcLayer = gwcLayerItem.element
-                        if gwcLayer.name.split(":")[-1] == element.name:
-                            possibleGwcLayers.append(gwcLayer)
-                    if len(possibleGwcLayers) == 1:
-                        #Since layers have no workspace, we cannot fully compare with gwc layer names.
-                        #We only delete if we are sure that the gwc layer is the only one with that name,
-                        #not considering namespaces
-                        dependent.append(possibleGwcLayers[0])
-            elif isinstance(element, (FeatureType, Coverage)):
-                layers = element.catalog.get_layers()
-                for layer in layers:
-                    if layer.resource.name == element.name:
-                        dependent.append(layer)
-            elif isinstance(element, Style):
-                layers = element.catalog.get_layers()
-                for layer in layers:
-                    styles = layer.styles
-                    if styles:
-                        continue
-                    if layer.default_style is not None and layer.default_style.name == element.name:
-                        dependent.append(layer)
-                    else:
-                        for style in styles:
-                            if style.name == element.name:
-                                dependent.append(layer)
-                                break
-
-        if dependent:
-            subdependent = self.getDependentElements(dependent, tree)
-            if subdependent:
-                dependent[0:0] = subdependent
-        return dependent
-
     def iconPath(self):
         return os.path.dirname(__file__) + "/../images/geoserver.png"
 
@@ -258,7 +207,7 @@ class GsTreeItem(TreeItem):
 class GsCatalogsItem(GsTreeItem):
     def __init__(self):
         self._catalogs = {}
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
         GsTreeItem.__init__(self, None, icon, "Catalogs")
         settings = QtCore.QSettings()
         saveCatalogs = pluginSetting("SaveCatalogs")
@@ -272,7 +221,7 @@ class GsCatalogsItem(GsTreeItem):
 
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
         createCatalogAction = QtGui.QAction(icon, "New catalog...", explorer)
         createCatalogAction.triggered.connect(lambda: self.addGeoServerCatalog(explorer))
         return [createCatalogAction]
@@ -293,6 +242,7 @@ class GsCatalogsItem(GsTreeItem):
                 else:
                     cat = RetryCatalog(dlg.url, dlg.username, dlg.password)
                 cat.authid = dlg.authid
+                cat.pathMappings = dlg.pathMappings
                 v = cat.gsversion()
                 try:
                     major = int(v.split(".")[0])
@@ -333,26 +283,23 @@ class GsCatalogsItem(GsTreeItem):
 class GsLayersItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/layer.png")
         GsTreeItem.__init__(self, None, icon, "Layers")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
     def populate(self):
         layers = self.catalog.get_layers()
         items = {}
+        layerItems = []
         for layer in layers:
             if layer.name in items:
                 items[layer.name].markAsDuplicated()
             else:
-                try:
-                    layerItem = GsLayerItem(layer)
-                except:
-                    config.iface.messageBar().pushMessage("Warning", "Layers %s could not be added" % layer.name,
-                      level = QgsMessageBar.WARNING,
-                      duration = 10)
-                layerItem.populate()
-                self.addChild(layerItem)
+                layerItem = GsLayerItem(layer)
+                layerItems.append(layerItem)
                 items[layer.name] = layerItem
+        # styles of layers are added when the layer item is expanded
+        self.addChildren(layerItems)
         self.sortChildren(0, QtCore.Qt.AscendingOrder)
 
 
@@ -362,18 +309,16 @@ class GsLayersItem(GsTreeItem):
 class GsGroupsItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/group.gif")
         GsTreeItem.__init__(self, None, icon, "Groups")
 
     def populate(self):
         groups = self.catalog.get_layergroups()
-        for group in groups:
-            groupItem = GsGroupItem(group)
-            groupItem.populate()
-            self.addChild(groupItem)
+        # layers of groups are added when the group item is expanded
+        self.addChildren([GsGroupItem(group) for group in groups])
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
         createGroupAction = QtGui.QAction(icon, "New group...", explorer)
         createGroupAction.triggered.connect(lambda: self.createGroup(explorer))
         return [createGroupAction]
@@ -392,7 +337,7 @@ class GsGroupsItem(GsTreeItem):
 class GsWorkspacesItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/workspace.png")
         GsTreeItem.__init__(self, None, icon, "Workspaces")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
@@ -414,7 +359,7 @@ class GsWorkspacesItem(GsTreeItem):
         return addDraggedUrisToWorkspace(uris, self.parentCatalog(), self.getDefaultWorkspace(), explorer, tree)
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
         createWorkspaceAction = QtGui.QAction(icon, "New workspace...", explorer)
         createWorkspaceAction.triggered.connect(lambda: self.createWorkspace(explorer))
         return [createWorkspaceAction]
@@ -432,22 +377,20 @@ class GsWorkspacesItem(GsTreeItem):
 class GsStylesItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/style.png")
         GsTreeItem.__init__(self, None, icon, "Styles")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
     def populate(self):
         styles = self.parentCatalog().get_styles()
-        for style in styles:
-            styleItem = GsStyleItem(style, False)
-            self.addChild(styleItem)
+        self.addChildren([GsStyleItem(style, False) for style in styles])
 
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
         createStyleFromLayerAction = QtGui.QAction(icon, "New style from QGIS layer...", explorer)
         createStyleFromLayerAction.triggered.connect(lambda: self.createStyleFromLayer(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/clean.png")
         cleanAction = QtGui.QAction(icon, "Clean (remove unused styles)", explorer)
         cleanAction.triggered.connect(lambda: self.cleanStyles(explorer))
         consolidateStylesAction = QtGui.QAction(icon, "Consolidate styles", explorer)
@@ -484,7 +427,7 @@ class GsCatalogItem(GsTreeItem):
         self.catalog = catalog
         self.name = name
         self.isConnected = False
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver_gray.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/geoserver_gray.png")
         GsTreeItem.__init__(self, catalog, icon, name)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
@@ -539,6 +482,7 @@ class GsCatalogItem(GsTreeItem):
                     raise UserCanceledOperation()
                 self.catalog = RetryCatalog(url, username, password)
             self.catalog.authid = authid
+            self.catalog.pathMappings = readPathMappings(self.name)
             QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
         try:
             dlg = QtGui.QProgressDialog("Retrieving catalog information", None, 0, 0  , config.iface.mainWindow())
@@ -587,7 +531,7 @@ class GsCatalogItem(GsTreeItem):
         #=======================================================================
         self.settingsItem = GsSettingsItem(self.catalog)
         self.addChild(self.settingsItem)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
         self.setIcon(0, icon)
         self.isConnected = True
         self.parent()._catalogs[self.text(0)] = self.catalog
@@ -611,16 +555,16 @@ class GsCatalogItem(GsTreeItem):
         return True
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         removeCatalogAction = QtGui.QAction(icon, "Remove", explorer)
         removeCatalogAction.triggered.connect(lambda: self.removeCatalog(tree, explorer))
         actions = [removeCatalogAction]
         if self.isConnected:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/clean.png")
             cleanAction = QtGui.QAction(icon, "Clean (remove unused elements)", explorer)
             cleanAction.triggered.connect(lambda: self.cleanCatalog(explorer))
             actions.append(cleanAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")
             publishLayerAction = QtGui.QAction(icon, "Publish layers to this catalog", explorer)
             publishLayerAction.triggered.connect(lambda: self._publishLayers(tree, explorer))
             actions.append(publishLayerAction)
@@ -628,7 +572,7 @@ class GsCatalogItem(GsTreeItem):
             publishProjectAction.triggered.connect(lambda: self._publishProject(tree, explorer))
             actions.append(publishProjectAction)
 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/edit.png")
         editAction = QtGui.QAction(icon, "Edit...", explorer)
         editAction.triggered.connect(lambda: self.editCatalog(explorer))
         actions.append(editAction)
@@ -648,6 +592,7 @@ class GsCatalogItem(GsTreeItem):
             elif dlg.username and dlg.password:
                 self.catalog = RetryCatalog(dlg.url, dlg.username, dlg.password)
             self.catalog.authid = dlg.authid
+            self.catalog.pathMappings = dlg.pathMappings
             if self.name != dlg.name:
                 if self.name in explorer.catalogs():
                     del explorer.catalogs()[self.name]
@@ -660,7 +605,7 @@ class GsCatalogItem(GsTreeItem):
                 self.setText(0, self.name)
                 self._text = self.name
 
-            self.setIcon(0, QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver_gray.png"))
+            self.setIcon(0, getIcon(os.path.dirname(__file__) + "/../images/geoserver_gray.png"))
             self.refreshContent(explorer)
 
 
@@ -709,11 +654,18 @@ class GsCatalogItem(GsTreeItem):
 class GsLayerItem(GsTreeItem):
     def __init__(self, layer):
         self.catalog = layer.catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
-        GsTreeItem.__init__(self, layer, icon, layer.resource.title)
+        icon = getIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        # the layer and its resource are not requested until they are needed, so
+        # listing the layers of a catalog takes a single request. The item shows
+        # the name of the layer, and its title once its description is loaded
+        GsTreeItem.__init__(self, layer, icon)
+        self._searchTerms = [layer.name]
+        if ":" in layer.name:
+            self._searchTerms.append(layer.name.split(":")[0])
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
                       | QtCore.Qt.ItemIsDropEnabled | QtCore.Qt.ItemIsDragEnabled)
         self.isDuplicated = False
+        self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.ShowIndicator)
 
     def populate(self):
         layer = self.element
@@ -723,9 +675,26 @@ class GsLayerItem(GsTreeItem):
         if layer.default_style is not None:
             styleItem = GsStyleItem(layer.default_style, True)
             self.addChild(styleItem)
+        self._addSearchTerms([style.name for style in layer.styles + [layer.default_style]
+                              if style is not None])
+
+    def searchTerms(self):
+        return [term for term in self._searchTerms if isinstance(term, basestring)]
+
+    def _addSearchTerms(self, terms):
+        '''Adds terms to search the item by, as the data of the layer is fetched'''
+        self._searchTerms.extend(term for term in terms if term not in self._searchTerms)
+        tree = self.treeWidget()
+        if tree is not None and hasattr(tree, "searchIndex"):
+            tree.searchIndex.add(self, self.searchTerms())
+
+    def _showResourceData(self, data):
+        if data["title"] and self.text(0) != data["title"]:
+            self.setText(0, data["title"])
+        self._addSearchTerms([data["title"], data["workspace"], data["abstract"]] + data["keywords"])
 
     def markAsDuplicated(self):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/warning.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/warning.png")
         self.setIcon(0, icon)
         self.isDuplicated = True
 
@@ -749,8 +718,14 @@ class GsLayerItem(GsTreeItem):
         items = tree.selectedItems()
         # don't show if multiple items selected, but not the current item
         if not items or self in items or len(items) == 1:
-            try:
-                wsname = self.element.resource.workspace.name
+            data = tree.descriptionLoader.data(self)
+            if data is None:
+                html += '<p><h3><b>Properties</b></h3></p><p>Loading...</p>'
+            elif isinstance(data, Exception):
+                html = "<p><b>Could not get layer information from server. Try refreshing the layer to update this description panel</b></p>"
+            else:
+                self._showResourceData(data)
+                wsname = data["workspace"]
                 if self.isDuplicated:
                     iconPath = os.path.dirname(__file__) + "/../images/warning.png"
                     html += ('<p><img src="' + iconPath + '"/> &nbsp; There are several layers with this name in the catalog. '
@@ -758,11 +733,11 @@ class GsLayerItem(GsTreeItem):
                         + 'This element represents the layer based on a datastore from the ' + wsname + ' workspace </p>')
                 html += '<p><h3><b>Properties</b></h3></p><ul>'
                 html += '<li><b>Name: </b>' + unicode(self.element.name) + '</li>\n'
-                html += '<li><b>Title: </b>' + unicode(self.element.resource.title) + ' &nbsp;<a href="modify:title">Modify</a></li>\n'
-                html += '<li><b>Abstract: </b>' + unicode(self.element.resource.abstract) + ' &nbsp;<a href="modify:abstract">Modify</a></li>\n'
-                html += ('<li><b>SRS: </b>' + str(self.element.resource.projection) + ' &nbsp;<a href="modify:srs">Modify</a></li>\n')
+                html += '<li><b>Title: </b>' + unicode(data["title"]) + ' &nbsp;<a href="modify:title">Modify</a></li>\n'
+                html += '<li><b>Abstract: </b>' + unicode(data["abstract"]) + ' &nbsp;<a href="modify:abstract">Modify</a></li>\n'
+                html += ('<li><b>SRS: </b>' + str(data["projection"]) + ' &nbsp;<a href="modify:srs">Modify</a></li>\n')
                 html += ('<li><b>Datastore workspace: </b>' + wsname + ' </li>\n')
-                bbox = self.element.resource.latlon_bbox
+                bbox = data["bbox"]
                 if bbox is not None:
                     html += '<li><b>Bounding box (lat/lon): </b></li>\n<ul>'
                     html += '<li> N:' + str(bbox[3]) + '</li>'
@@ -771,8 +746,6 @@ class GsLayerItem(GsTreeItem):
                     html += '<li> W:' + str(bbox[1]) + '</li>'
                     html += '</ul>'
                 html += '</ul>'
-            except:
-                html = "<p><b>Could not get layer information from server. Try refreshing the layer to update this description panel</b></p>"
 
         actions = self.contextMenuActions(tree, explorer)
         items = tree.selectedItems()
@@ -787,6 +760,19 @@ class GsLayerItem(GsTreeItem):
             html += '</ul>'
         return html
 
+    def descriptionCatalog(self):
+        return self.catalog
+
+    def descriptionData(self, catalog):
+        '''Returns the properties of the resource of the layer, requesting them using the passed catalog'''
+        resource = bindToCatalog(self.element, catalog).resource
+        return {"workspace": resource.workspace.name,
+                "title": resource.title,
+                "abstract": resource.abstract,
+                "keywords": list(resource.keywords or []),
+                "projection": resource.projection,
+                "bbox": resource.latlon_bbox}
+
     def linkClicked(self, tree, explorer, url):
         actionName = url.toString()
         if actionName == 'modify:title':
@@ -817,41 +803,41 @@ class GsLayerItem(GsTreeItem):
             layers = self.parent().get_layers_namespaced_name()
             count = len(layers)
             idx = layers.index(self.element.name)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
             removeLayerFromGroupAction = QtGui.QAction(icon, "Remove layer from group", explorer)
             removeLayerFromGroupAction.setEnabled(count > 1)
             removeLayerFromGroupAction.triggered.connect(lambda: self.removeLayerFromGroup(explorer))
             actions.append(removeLayerFromGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/up.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/up.png")
             moveLayerUpInGroupAction = QtGui.QAction(icon, "Move up", explorer)
             moveLayerUpInGroupAction.setEnabled(count > 1 and idx > 0)
             moveLayerUpInGroupAction.triggered.connect(lambda: self.moveLayerUpInGroup(explorer))
             actions.append(moveLayerUpInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/down.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/down.png")
             moveLayerDownInGroupAction = QtGui.QAction(icon, "Move down", explorer)
             moveLayerDownInGroupAction.setEnabled(count > 1 and idx < count - 1)
             moveLayerDownInGroupAction.triggered.connect(lambda: self.moveLayerDownInGroup(explorer))
             actions.append(moveLayerDownInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/top.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/top.png")
             moveLayerToFrontInGroupAction = QtGui.QAction(icon, "Move to front", explorer)
             moveLayerToFrontInGroupAction.setEnabled(count > 1 and idx > 0)
             moveLayerToFrontInGroupAction.triggered.connect(lambda: self.moveLayerToFrontInGroup(explorer))
             actions.append(moveLayerToFrontInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/bottom.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/bottom.png")
             moveLayerToBackInGroupAction = QtGui.QAction(icon, "Move to back", explorer)
             moveLayerToBackInGroupAction.setEnabled(count > 1 and idx < count - 1)
             moveLayerToBackInGroupAction.triggered.connect(lambda: self.moveLayerToBackInGroup(explorer))
             actions.append(moveLayerToBackInGroupAction)
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
             addStyleToLayerAction = QtGui.QAction(icon, "Add style to layer...", explorer)
             addStyleToLayerAction.triggered.connect(lambda: self.addStyleToLayer(explorer))
             actions.append(addStyleToLayerAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
             deleteLayerAction = QtGui.QAction(icon, "Delete", explorer)
             deleteLayerAction.triggered.connect(lambda: self.deleteLayer(tree, explorer))
             actions.append(deleteLayerAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/import_into_qgis.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/import_into_qgis.png")
             addLayerAction = QtGui.QAction(icon, "Add to current QGIS project", explorer)
             addLayerAction.triggered.connect(lambda: self.addLayerToProject(explorer))
             actions.append(addLayerAction)
@@ -859,10 +845,10 @@ class GsLayerItem(GsTreeItem):
         return actions
 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/group.gif")
         createGroupAction = QtGui.QAction(icon, "Create group...", explorer)
         createGroupAction.triggered.connect(lambda: self.createGroupFromLayers(selected, tree, explorer))
         return [deleteSelectedAction, createGroupAction]
@@ -1014,10 +1000,11 @@ class GsLayerItem(GsTreeItem):
 class GsGroupItem(GsTreeItem):
     def __init__(self, group):
         self.catalog = group.catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/group.gif")
         GsTreeItem.__init__(self, group, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
                       | QtCore.Qt.ItemIsDropEnabled)
+        self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.ShowIndicator)
 
     def get_layers_namespaced_name(self):
         """
@@ -1051,20 +1038,20 @@ class GsGroupItem(GsTreeItem):
             return []
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/edit.png")
         editLayerGroupAction = QtGui.QAction(icon, "Edit...", explorer)
         editLayerGroupAction.triggered.connect(lambda: self.editLayerGroup(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteLayerGroupAction = QtGui.QAction(icon, "Delete", explorer)
         deleteLayerGroupAction.triggered.connect(lambda: self.deleteLayerGroup(tree, explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/import_into_qgis.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/import_into_qgis.png")
         addGroupAction = QtGui.QAction(icon, "Add to current QGIS project", explorer)
         addGroupAction.triggered.connect(lambda: self.addGroupToProject(explorer))
         return [editLayerGroupAction, deleteLayerGroupAction, addGroupAction]
 
 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1095,7 +1082,7 @@ class GsGroupItem(GsTreeItem):
 
 class GsStyleItem(GsTreeItem):
     def __init__(self, style, isDefault):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/style.png")
         name = style.name if not isDefault else style.name + " [default style]"
         GsTreeItem.__init__(self, style, icon, name)
         self.isDefault = isDefault
@@ -1105,30 +1092,30 @@ class GsStyleItem(GsTreeItem):
     def contextMenuActions(self, tree, explorer):
         actions = []
         if isinstance(self.parent(), GsLayerItem):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/default-style.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/default-style.png")
             setAsDefaultStyleAction = QtGui.QAction(icon, "Set as default style", explorer)
             setAsDefaultStyleAction.triggered.connect(lambda: self.setAsDefaultStyle(tree, explorer))
             setAsDefaultStyleAction.setEnabled(not self.isDefault)
             actions.append(setAsDefaultStyleAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
             removeStyleFromLayerAction = QtGui.QAction(icon, "Remove style from layer", explorer)
             removeStyleFromLayerAction.triggered.connect(lambda: self.removeStyleFromLayer(tree, explorer))
             removeStyleFromLayerAction.setEnabled(not self.isDefault)
             actions.append(removeStyleFromLayerAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/edit.png")
             editStyleAction = QtGui.QAction(icon, "Edit...", explorer)
             editStyleAction.triggered.connect(lambda: self.editStyle(tree, explorer, self.parent().element))
             actions.append(editStyleAction)
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
             deleteStyleAction = QtGui.QAction(icon, "Delete", explorer)
             deleteStyleAction.triggered.connect(lambda: self.deleteStyle(tree, explorer))
             actions.append(deleteStyleAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/edit.png")
             editStyleAction = QtGui.QAction(icon, "Edit...", explorer)
             editStyleAction.triggered.connect(lambda: self.editStyle(tree, explorer))
             actions.append(editStyleAction)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit_sld.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/edit_sld.png")
         editSLDAction = QtGui.QAction(icon, "Edit SLD...", explorer)
         editSLDAction.triggered.connect(lambda: self.editSLD(tree, explorer))
         actions.append(editSLDAction)
@@ -1146,14 +1133,14 @@ class GsStyleItem(GsTreeItem):
         if isinstance(selected[0].parent(), GsLayerItem):
             default = any([s.isDefault for s in selected])
             if not default:
-                icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+                icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
                 deleteSelectedAction = QtGui.QAction(icon, "Remove from layer", explorer)
                 deleteSelectedAction.triggered.connect(lambda: self.removeStylesFromLayer(selected, tree, explorer))
                 return [deleteSelectedAction]
             else:
                 return []
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
             deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
             deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
             return [deleteSelectedAction]
@@ -1175,9 +1162,6 @@ class GsStyleItem(GsTreeItem):
         except:
             self._showSldParsingError()
         sld = adaptGsToQgs(sld)
-        sldfile = tempFilename("sld")
-        with open(sldfile, 'w') as f:
-            f.write(sld)
         geomtype = getGeomTypeFromSld(sld)
         uri = geomtype + "?crs=epsg:4326&"
         if gslayer is not None:
@@ -1186,7 +1170,7 @@ class GsStyleItem(GsTreeItem):
             fieldsstring = '&'.join(fieldsdesc)
             uri += fieldsstring
         layer = QgsVectorLayer(uri, "tmp", "memory")
-        layer.loadSldStyle(sldfile)
+        setLayerSld(layer, sld)
         oldSld = getGsCompatibleSld(layer)[0]
         config.iface.showLayerProperties(layer)
         settings.setValue('/Projections/defaultBehaviour', prjSetting)
@@ -1195,6 +1179,7 @@ class GsStyleItem(GsTreeItem):
         #      which would need to be uploaded
         if newSld != oldSld:
             explorer.run(self.element.update_body, "Update style", [], newSld)
+            stylecache.forgetUploadedStyle(self.element.catalog, self.element.name)
 
     def _showSldParsingError(self):
         config.iface.messageBar().pushMessage("Warning", "Style is not stored as XML and cannot be edited",
@@ -1256,7 +1241,7 @@ class GsStyleItem(GsTreeItem):
 class GsWorkspaceItem(GsTreeItem):
     def __init__(self, workspace, isDefault):
         self.catalog = workspace.catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/workspace.png")
         self.isDefault = isDefault
         name = workspace.name if not isDefault else workspace.name + " [default workspace]"
         GsTreeItem.__init__(self, workspace, icon, name)
@@ -1281,14 +1266,14 @@ class GsWorkspaceItem(GsTreeItem):
 
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/default-workspace.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/default-workspace.png")
         setAsDefaultAction = QtGui.QAction(icon, "Set as default workspace", explorer)
         setAsDefaultAction.triggered.connect(lambda: self.setAsDefaultWorkspace(tree, explorer))
         setAsDefaultAction.setEnabled(not self.isDefault)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteWorkspaceAction = QtGui.QAction(icon, "Delete", explorer)
         deleteWorkspaceAction.triggered.connect(lambda: self.deleteWorkspace(tree, explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/clean.png")
         cleanAction = QtGui.QAction(icon, "Clean (remove unused resources)", explorer)
         cleanAction.triggered.connect(lambda: self.cleanWorkspace(explorer))
         return[setAsDefaultAction, deleteWorkspaceAction, cleanAction]
@@ -1298,7 +1283,7 @@ class GsWorkspaceItem(GsTreeItem):
         explorer.run(cat.cleanUnusedResources, "Clean (remove unused resources)", [self])
 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1334,26 +1319,24 @@ class GsWorkspaceItem(GsTreeItem):
 class GsStoreItem(GsTreeItem):
     def __init__(self, store):
         if isinstance(store, DataStore):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_polygon.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/layer_polygon.png")
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/grid.jpg")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/grid.jpg")
         GsTreeItem.__init__(self, store, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
     def populate(self):
         resources = self.element.get_resources()
-        for resource in resources:
-            resourceItem = GsResourceItem(resource)
-            self.addChild(resourceItem)
+        self.addChildren([GsResourceItem(resource) for resource in resources])
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteStoreAction = QtGui.QAction(icon, "Delete", explorer)
         deleteStoreAction.triggered.connect(lambda: self.deleteStore(tree, explorer))
         return[deleteStoreAction]
 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1380,14 +1363,14 @@ class GsStoreItem(GsTreeItem):
 class GsResourceItem(GsTreeItem):
     def __init__(self, resource):
         if isinstance(resource, Coverage):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/grid.jpg")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/grid.jpg")
         else:
             icon = None
         GsTreeItem.__init__(self, resource, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteResourceAction = QtGui.QAction(icon, "Delete", explorer)
         deleteResourceAction.triggered.connect(lambda: self.deleteResource(tree, explorer))
         return[deleteResourceAction]
@@ -1404,7 +1387,7 @@ class GsResourceItem(GsTreeItem):
 class GsProcessesItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/process.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/process.png")
         GsTreeItem.__init__(self, None, icon, "WPS processes")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
 
@@ -1423,7 +1406,7 @@ class GsProcessesItem(GsTreeItem):
 class GsProcessItem(GsTreeItem):
     def __init__(self, process):
         #self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/process.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/process.png")
         GsTreeItem.__init__(self, None, icon, process)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
 
@@ -1434,7 +1417,7 @@ class GsProcessItem(GsTreeItem):
 class GsSettingsItem(GsTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/config.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/config.png")
         settings = Settings(self.catalog)
         GsTreeItem.__init__(self, settings, icon, "Settings")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
@@ -6,20 +6,32 @@
 from PyQt4 import QtCore
 from qgis.core import *
 from geoserverexplorer.qgis import layers as qgislayers
-from geoserverexplorer.qgis.catalog import CatalogWrapper
+from geoserverexplorer.qgis.catalog import CatalogWrapper, generalizationLevels
 from geoserverexplorer.gui.confirm import publishLayer
-from geoserverexplorer.gui.dialogs.projectdialog import PublishProjectDialog
-from geoserver.catalog import ConflictingDataError
+from geoserverexplorer.gui.dialogs.projectdialog import PublishProjectDialog, SyncPlanDialog
+from geoserverexplorer.qgis.syncplanner import planProjectSync
 from geoserverexplorer.gui.dialogs.layerdialog import PublishLayersDialog
 
 
-def publishDraggedLayer(explorer, layer, workspace):
+def checkGeneralizationLevels(explorer):
+    '''
+    Checks the generalization levels in the plugin settings before publishing, so
+    a wrong setting is reported once instead of making each published layer fail
+    '''
+    try:
+        generalizationLevels()
+        return True
+    except Exception, e:
+        explorer.setWarning(unicode(e))
+        return False
+
+def publishDraggedLayer(explorer, layer, workspace, gslayers=None):
     cat = workspace.catalog
     cat = CatalogWrapper(cat)
     ret = explorer.run(publishLayer,
              "Publish layer from layer '" + layer.name() + "'",
              [],
-             cat, layer, workspace)
+             cat, layer, workspace, False, gslayers)
     return ret
 
 def addDraggedLayerToGroup(explorer, layer, groupItem):
@@ -37,10 +49,13 @@ def addDraggedLayerToGroup(explorer, layer, groupItem):
 
 def addDraggedUrisToWorkspace(uris, catalog, workspace, explorer, tree):
     if uris and workspace:
+        if not checkGeneralizationLevels(explorer):
+            return []
         allLayers = qgislayers.getAllLayersAsDict()
         publishableLayers = qgislayers.getPublishableLayersAsDict()
         if len(uris) > 1:
             explorer.setProgressMaximum(len(uris))
+        gslayers = [lyr.name for lyr in catalog.get_layers()]
         for i, uri in enumerate(uris):
             source = uri if isinstance(uri, basestring) else uri.uri
             if source in allLayers:
@@ -64,7 +79,7 @@ def addDraggedUrisToWorkspace(uris, catalog, workspace, explorer, tree):
                 name = "'%s'" % allLayers[source] if source in allLayers else "with source '%s'" % source
                 explorer.setWarning("Layer %s is not valid for publication" % name)
             else:
-                if not publishDraggedLayer(explorer, layer, workspace):
+                if not publishDraggedLayer(explorer, layer, workspace, gslayers):
                     break
             explorer.setProgress(i + 1)
         explorer.resetActivity()
@@ -92,83 +107,45 @@ def addDraggedStyleToLayer(tree, explorer, styleItem, layerItem):
 
 
 def publishProject(tree, explorer, catalog):
-    layers = qgislayers.getAllLayers()
+    if not checkGeneralizationLevels(explorer):
+        return
     dlg = PublishProjectDialog(catalog)
     dlg.exec_()
     if not dlg.ok:
         return
-    workspace = dlg.workspace
-    groupName = dlg.groupName
-    overwrite = dlg.overwrite
-    explorer.setProgressMaximum(len(layers), "Publish layers")
-    progress = 0
     cat = CatalogWrapper(catalog)
-    for layer in layers:
-        explorer.setProgress(progress)
-        explorer.run(publishLayer,
-                     None,
-                     [],
-                     cat, layer, workspace, overwrite)
-        progress += 1
+    plan = []
+    def computePlan():
+        plan.append(planProjectSync(cat, dlg.workspace, dlg.groupName,
+                                    dlg.overwrite, dlg.deleteOthers))
+    if not explorer.run(computePlan, None, []):
+        return
+    plan = plan[0]
+    planDlg = SyncPlanDialog(plan)
+    planDlg.exec_()
+    if not planDlg.ok:
+        return
+    explorer.setProgressMaximum(len(plan), "Publish project")
+    for progress, (description, func, args) in enumerate(plan.operations):
         explorer.setProgress(progress)
-    explorer.resetActivity()
-    groups = qgislayers.getGroups()
-    for group in groups:
-        names = [layer.name() for layer in groups[group][::-1]]
-        try:
-            layergroup = catalog.create_layergroup(group, names, names, getGroupBounds(groups[group]))
-        except ConflictingDataError:
-            layergroup = catalog.get_layergroup(group)
-            layergroup.dirty.update(layers = names, styles = names)
-        explorer.run(catalog.save, "Create layer group '" + group + "'",
-                 [], layergroup)
-
-    if groupName is not None:
-        names = [layer.name() for layer in layers[::-1]]
-        try:
-            layergroup = catalog.create_layergroup(groupName, names, names, getGroupBounds(layers))
-        except ConflictingDataError:
-            layergroup = catalog.get_layergroup(groupName)
-            layergroup.dirty.update(layers = names, styles = names)
-        explorer.run(catalog.save, "Create global layer group",
-                 [], layergroup)
+        explorer.run(func, None, [], *args)
+    explorer.setProgress(len(plan))
     tree.findAllItems(catalog)[0].refreshContent(explorer)
     explorer.resetActivity()
 
-def getGroupBounds(layers):
-    bounds = None
-    def addToBounds(bbox, bounds):
-        if bounds is not None:
-            bounds = [min(bounds[0], bbox.xMinimum()),
-                        max(bounds[1], bbox.xMaximum()),
-                        min(bounds[2], bbox.yMinimum()),
-                        max(bounds[3], bbox.yMaximum())]
-        else:
-            bounds = [bbox.xMinimum(), bbox.xMaximum(),
-                      bbox.yMinimum(), bbox.yMaximum()]
-        return bounds
-
-    for layer in layers:
-        transform = QgsCoordinateTransform(layer.crs(), QgsCoordinateReferenceSystem("EPSG:4326"))
-        bounds = addToBounds(transform.transformBoundingBox(layer.extent()), bounds)
-
-    return (str(bounds[0]), str(bounds[1]), str(bounds[2]), str(bounds[3]), "EPSG:4326")
-
 def publishLayers(tree, explorer, catalog):
+    if not checkGeneralizationLevels(explorer):
+        return
     dlg = PublishLayersDialog(catalog)
     dlg.exec_()
     if dlg.topublish is None:
         return
     cat = CatalogWrapper(catalog)
-    progress = 0
     explorer.setProgressMaximum(len(dlg.topublish), "Publish layers")
-    for layer, workspace, name, style in dlg.topublish:
-        explorer.run(cat.publishLayer,
+    explorer.run(cat.publishLayers,
              None,
              [],
-             layer, workspace, True, name, style)
-        progress += 1
-        explorer.setProgress(progress)
+             dlg.topublish, True, explorer.setProgress)
     catItem = tree.findAllItems(catalog)[0]
     catItem.refreshContent(explorer)
     explorer.resetActivity()
@@ -7,10 +7,14 @@ from PyQt4 import QtGui, QtCore
 from geoserverexplorer.gui.dialogs.gwclayer import EditGwcLayerDialog, SeedGwcLayerDialog
 from geoserverexplorer.geoserver.gwc import Gwc, GwcLayer, SeedingStatusParsingError
 from geoserver.catalog import FailedRequestError
-from geoserverexplorer.gui.exploreritems import TreeItem
+from geoserverexplorer.gui.exploreritems import TreeItem, getIcon
 import os
 from geoserverexplorer.gui.confirm import confirmDelete
 
+# cached seeding state of layers without seeding tasks, since None means that
+# the state has not been loaded yet
+NO_SEEDING_TASKS = "none"
+
 class GwcTreeItem(TreeItem):
 
     def iconPath(self):
@@ -19,7 +23,7 @@ class GwcTreeItem(TreeItem):
 class GwcLayersItem(GwcTreeItem):
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/gwc.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/gwc.png")
         TreeItem.__init__(self, None, icon, "GeoWebCache layers")
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
@@ -49,7 +53,7 @@ class GwcLayersItem(GwcTreeItem):
 
     def contextMenuActions(self, tree, explorer):
         if self.isValid:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+            icon = getIcon(os.path.dirname(__file__) + "/../images/add.png")
             addGwcLayerAction = QtGui.QAction(icon, "New GWC layer...", explorer)
             addGwcLayerAction.triggered.connect(lambda: self.addGwcLayer(tree, explorer))
             return [addGwcLayerAction]
@@ -84,20 +88,20 @@ class GwcLayersItem(GwcTreeItem):
 
 class GwcLayerItem(GwcTreeItem):
     def __init__(self, layer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/layer.png")
         TreeItem.__init__(self, layer, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
 
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/edit.png")
         editGwcLayerAction = QtGui.QAction(icon, "Edit...", explorer)
         editGwcLayerAction.triggered.connect(lambda: self.editGwcLayer(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/seed.png")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/seed.png")
         seedGwcLayerAction = QtGui.QAction(icon, "Seed...", explorer)
         seedGwcLayerAction.triggered.connect(lambda: self.seedGwcLayer(explorer))
         emptyGwcLayerAction = QtGui.QAction("Empty", explorer)
         emptyGwcLayerAction.triggered.connect(lambda: self.emptyGwcLayer(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteLayerAction = QtGui.QAction(icon, "Delete", explorer)
         deleteLayerAction.triggered.connect(lambda: self.deleteLayer(explorer))
         return[editGwcLayerAction, seedGwcLayerAction, emptyGwcLayerAction, deleteLayerAction]
@@ -111,7 +115,7 @@ class GwcLayerItem(GwcTreeItem):
             return []
 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon(os.path.dirname(__file__) + "/../images/delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteLayers(explorer, selected))
         return [deleteSelectedAction]
@@ -128,18 +132,19 @@ class GwcLayerItem(GwcTreeItem):
         items = tree.selectedItems()
         # don't show if multiple items selected, but not the current item
         if not items or self in items or len(items) == 1:
-            try:
-                html += '<p><b>Seeding status</b></p>'
-                state = self.element.getSeedingState()
-                if state is None:
-                    html += "<p>No seeding tasks exist for this layer</p>"
-                else:
-                    html += "<p>This layer is being seeded. Processed {} tiles of {}</p>".format(state[0], state[1])
-                    html += '<p><a href="update">update</a> - <a href="kill">kill</a></p>'
-            except SeedingStatusParsingError:
+            html += '<p><b>Seeding status</b></p>'
+            state = tree.descriptionLoader.data(self)
+            if state is None:
+                html += "<p>Loading...</p>"
+            elif isinstance(state, SeedingStatusParsingError):
                 html += '<p>Cannot determine running seeding tasks for this layer</p>'
-            except:
+            elif isinstance(state, Exception):
                 html = "<p><b>Could not get information from server. Try refreshing the item to update this description panel</b></p>"
+            elif state == NO_SEEDING_TASKS:
+                html += "<p>No seeding tasks exist for this layer</p>"
+            else:
+                html += "<p>This layer is being seeded. Processed {} tiles of {}</p>".format(state[0], state[1])
+                html += '<p><a href="update">update</a> - <a href="kill">kill</a></p>'
 
         actions = self.contextMenuActions(tree, explorer)
         items = tree.selectedItems()
@@ -155,6 +160,14 @@ class GwcLayerItem(GwcTreeItem):
         return html
 
 
+    def descriptionCatalog(self):
+        return self.element.gwc.catalog
+
+    def descriptionData(self, catalog):
+        '''Returns the seeding state of the layer, requesting it with a GWC connection of the passed catalog'''
+        state = GwcLayer(Gwc(catalog), self.element.name).getSeedingState()
+        return NO_SEEDING_TASKS if state is None else state
+
     def linkClicked(self, tree, explorer, url):
         TreeItem.linkClicked(self,tree, explorer, url)
         if url.toString() == 'kill':
@@ -163,6 +176,7 @@ class GwcLayerItem(GwcTreeItem):
             except FailedRequestError:
                 #TODO:
                 return
+        tree.descriptionLoader.invalidate(self)
         try:
             text = self.getDescriptionHtml(tree, explorer)
             self.description.setHtml(text)
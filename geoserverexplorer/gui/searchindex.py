@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module keeps an inverted index of the items in the explorer tree, so they
+can be searched as the user types, without sending requests to the catalogs.
+
+Items are indexed by the words in their search terms: names, titles,
+abstracts, keywords, workspaces and style names, depending on the type of
+item. Words are kept sorted, so the ones starting with a typed prefix are
+found with a binary search.
+'''
+
+import re
+import heapq
+from bisect import bisect_left, insort
+
+_PARTS = re.compile(r"[^\W_]+", re.UNICODE)
+_IDENTIFIERS = re.compile(r"\w+", re.UNICODE)
+
+
+def indexWords(text):
+    '''
+    Returns the lowercase words in a text. Identifiers with underscores are
+    returned both as a whole and split into their parts
+    '''
+    text = text.lower()
+    return set(_PARTS.findall(text)) | set(_IDENTIFIERS.findall(text))
+
+def queryWords(query):
+    return set(_IDENTIFIERS.findall(query.lower()))
+
+
+class SearchIndex(object):
+
+    def __init__(self):
+        self._items = {}
+        self._index = {}
+        self._words = []
+
+    def add(self, item, terms):
+        '''Indexes an item with the given terms, replacing its previous terms if it was already indexed'''
+        self.remove(item)
+        words = set()
+        for term in terms:
+            if term:
+                words.update(indexWords(term))
+        if not words:
+            return
+        key = id(item)
+        self._items[key] = (item, words)
+        for word in words:
+            keys = self._index.get(word)
+            if keys is None:
+                keys = self._index[word] = set()
+                insort(self._words, word)
+            keys.add(key)
+
+    def remove(self, item):
+        key = id(item)
+        entry = self._items.pop(key, None)
+        if entry is None:
+            return
+        for word in entry[1]:
+            keys = self._index[word]
+            keys.discard(key)
+            if not keys:
+                del self._index[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def _prefixMatches(self, prefix):
+        keys = set()
+        idx = bisect_left(self._words, prefix)
+        while idx < len(self._words) and self._words[idx].startswith(prefix):
+            keys.update(self._index[self._words[idx]])
+            idx += 1
+        return keys
+
+    def search(self, query, limit=None):
+        '''
+        Returns the items with words starting with each of the words in the query,
+        sorted by their text. At most limit items are returned, if it is passed
+        '''
+        words = queryWords(query)
+        if not words:
+            return []
+        keys = None
+        # longer words usually match less items, so they are intersected first
+        for word in sorted(words, key=len, reverse=True):
+            matches = self._prefixMatches(word)
+            keys = matches if keys is None else keys & matches
+            if not keys:
+                return []
+        items = (self._items[key][0] for key in keys)
+        sortKey = lambda item: item.text(0).lower()
+        if limit is not None:
+            return heapq.nsmallest(limit, items, key=sortKey)
+        return sorted(items, key=sortKey)
+
+    def __len__(self):
+        return len(self._items)
@@ -8,6 +8,7 @@ import config
 from geoserverexplorer.gui.explorer import GeoServerExplorer
 from geoserverexplorer.geoserver import pem
 from PyQt4 import QtGui, QtCore
+from qgis.core import QgsMapLayer
 try:
     from processing.core.Processing import Processing
     from processingprovider.geoserverprovider import GeoServerProvider
@@ -41,6 +42,7 @@ class GeoServerExplorerPlugin:
     def unload(self):
         pem.removePkiTempFiles(self.explorer.catalogs())
         self.explorer.deleteLater()
+        config.explorer = None
         removeSettingsMenu("GeoServer", self.iface.removePluginWebMenu)
         removeHelpMenu("GeoServer", self.iface.removePluginWebMenu)
         removeAboutMenu("GeoServer", self.iface.removePluginWebMenu)
@@ -48,6 +50,7 @@ class GeoServerExplorerPlugin:
         if processingOk:
             Processing.removeProvider(self.provider)
         layerwatcher.disconnectLayerWasAdded()
+        self.iface.legendInterface().removeLegendLayerAction(self.syncDataAction)
         try:
             from qgistester.tests import removeTestModule
             from geoserverexplorer.test import testplugin
@@ -64,6 +67,7 @@ class GeoServerExplorerPlugin:
         self.iface.addPluginToWebMenu(u"GeoServer", self.explorerAction)
 
         self.explorer = GeoServerExplorer()
+        config.explorer = self.explorer
         self.iface.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.explorer)
         if not pluginSetting("ExplorerVisible"):
             self.explorer.hide()
@@ -78,6 +82,11 @@ class GeoServerExplorerPlugin:
 
         layerwatcher.connectLayerWasAdded(self.explorer)
 
+        self.syncDataAction = QtGui.QAction(icon, "Synchronize data with GeoServer", self.iface.mainWindow())
+        self.syncDataAction.triggered.connect(layerwatcher.syncActiveLayerData)
+        self.iface.legendInterface().addLegendLayerAction(self.syncDataAction, u"GeoServer", u"geoserversync",
+                                                          QgsMapLayer.VectorLayer, True)
+
     def _explorerVisibilityChanged(self, visible):
         setPluginSetting("ExplorerVisible", visible)
 
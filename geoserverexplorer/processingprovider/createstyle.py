@@ -6,6 +6,7 @@
 from qgis.core import *
 from geoserveralgorithm import GeoServerAlgorithm
 from processing.core.parameters import *
+from geoserverexplorer.qgis import stylecache
 
 
 class CreateStyle(GeoServerAlgorithm):
@@ -20,6 +21,7 @@ class CreateStyle(GeoServerAlgorithm):
         overwrite = self.getParameterValue(self.OVERWRITE)
         name = self.getParameterValue(self.NAME)
         self.catalog.create_style(name, stylefile, overwrite)
+        stylecache.forgetUploadedStyle(self.catalog, name)
 
     def defineCharacteristics(self):
         self.addBaseParameters()
@@ -4,25 +4,35 @@
 # This code is licensed under the GPL 2.0 license.
 #
 import os
+import json
 from qgis.core import *
 from PyQt4 import QtCore
 from geoserverexplorer.qgis import layers, exporter, utils
 from geoserver.catalog import ConflictingDataError, UploadError, FailedRequestError
 from geoserverexplorer.qgis.sldadapter import adaptGsToQgs,\
-    getGsCompatibleSld
+    getGsCompatibleSld, setLayerSld, setScaleRange
 from geoserverexplorer.qgis import uri as uri_utils
 from gsimporter.client import Client
 from geoserverexplorer.geoserver.pki import PKICatalog, PKIClient
 from geoserverexplorer.geoserver.auth import AuthCatalog, AuthClient
 from geoserverexplorer.geoserver.basecatalog import BaseCatalog
 from geoserverexplorer.geoserver import pem
+from geoserverexplorer.geoserver.parallel import runConcurrently, bindToCatalog
+from geoserverexplorer.geoserver.importer import ImportSession
+from geoserverexplorer.qgis.importpoller import ImportPoller
 from geoserverexplorer.geoserver.util import groupsWithLayer, removeLayerFromGroups, \
     addLayerToGroups
+from geoserver.support import url
+from geoserver.util import prepare_upload_bundle
+from geoserver.store import DataStore, CoverageStore
+from geoserver.resource import FeatureType, Coverage
+from xml.etree import ElementTree
 from geoserverexplorer.gui.gsnameutils import xmlNameFixUp, xmlNameIsValid
 import requests
 from geoserverexplorer.qgis.utils import addTrackedLayer
+from geoserverexplorer.qgis import featuresync, hooks, stylecache
+from geoserverexplorer.qgis.syncplanner import getWorkspaceResourceNames, setResourceMetadata
 from qgiscommons2.settings import pluginSetting
-from qgiscommons2.files import tempFilename
 
 try:
     from processing.modeler.ModelerAlgorithm import ModelerAlgorithm
@@ -38,6 +48,11 @@ try:
 except Exception, e:
     processingOk = False
 
+# names of the icons known to be in the styles folder of each catalog, and
+# the API used to upload icons to it
+_knownIcons = {}
+_iconsApi = {}
+
 def createGeoServerCatalog(service_url = "http://localhost:8080/geoserver/rest",
                            username="admin",
                            password="geoserver",
@@ -100,6 +115,7 @@ class CatalogWrapper(object):
         toDelete = [s for s in styles if s.name not in usedStyles]
         for style in toDelete:
             style.catalog.delete(style, purge = True)
+            stylecache.forgetUploadedStyle(style.catalog, style.name)
 
     def cleanUnusedResources(self):
         '''cleans resources that are not published through any layer in the catalog'''
@@ -119,48 +135,118 @@ class CatalogWrapper(object):
 
     def consolidateStyles(self):
         '''
-        Deletes styles that are redundant and just keeps one copy of them
-        in the catalog, configuring the corresponding layers to use that copy
+        Finds styles that are redundant and configures the layers that use them
+        to use a single copy of each of them.
+
+        Style bodies and layers are requested concurrently. Styles are compared
+        by the hash of their SLD, leaving out formatting and names, and the
+        layers to change are found with an index of the layers using each style
         '''
+        def fetchSldHash(catalog, style):
+            return stylecache.sldHash(bindToCatalog(style, catalog).sld_body, True)
+        styles = self.catalog.get_styles()
         used = {}
-        allstyles = self.catalog.get_styles()
-        for style in allstyles:
-            sld = style.sld_body.replace("<sld:Name>%s</sld:Name>" % style.name, "")
-            if sld in used.keys():
-                used[sld].append(style)
-            else:
-                used[sld] = [style]
+        for style, sldHash, error in runConcurrently(self.catalog, fetchSldHash, styles):
+            if error is None:
+                used.setdefault(sldHash, []).append(_styleFullName(style))
+        replacements = {}
+        for names in used.values():
+            for name in names[1:]:
+                replacements[name] = names[0]
+        if not replacements:
+            return
 
-        for sld, styles in used.iteritems():
-            if len(styles) == 1:
+        layerStyles, styleLayers = self.getStyleIndex()
+        updates = {}
+        for name in replacements:
+            for layerName in styleLayers.get(name, []):
+                default, alternates = layerStyles[layerName]
+                newAlternates = []
+                for alternate in alternates:
+                    alternate = replacements.get(alternate, alternate)
+                    if alternate not in newAlternates:
+                        newAlternates.append(alternate)
+                updates[layerName] = (replacements.get(default),
+                                      newAlternates if newAlternates != alternates else None)
+        self.updateLayerStyles(updates)
+
+    def getStyleIndex(self):
+        '''
+        Returns the styles used by the layers in the catalog, as a dict with the
+        (default style, [alternate styles]) of each layer, and an index with the set
+        of layers that use each style. Layers are requested concurrently
+        '''
+        def fetchLayerStyles(catalog, layerName):
+            response, content = catalog.http.request(url(catalog.service_url, ["layers", layerName + ".xml"]))
+            if response.status != 200:
+                raise FailedRequestError(content)
+            dom = ElementTree.fromstring(content)
+            return (dom.findtext("defaultStyle/name"),
+                    [e.findtext("name") for e in dom.findall("styles/style")])
+        layerStyles = {}
+        styleLayers = {}
+        layerNames = [layer.name for layer in self.catalog.get_layers()]
+        for layerName, styleNames, error in runConcurrently(self.catalog, fetchLayerStyles, layerNames):
+            if error is not None:
                 continue
-            #find the layers that use any of the secondary styles in the list, and make them use the first one
-            styleNames = [s.name for s in styles[1:]]
-            layers = self.catalog.get_layers()
-            for layer in layers:
-                changed = False
-                if layer.default_style.name in styleNames:
-                    layer.default_style = styles[0]
-                    changed = True
-                alternateStyles = layer.styles
-                newAlternateStyles = set()
-                for alternateStyle in alternateStyles:
-                    if alternateStyle.name in styleNames:
-                        newAlternateStyles.add(styles[0])
-                    else:
-                        newAlternateStyles.add(alternateStyle)
-                newAlternateStyles = list(newAlternateStyles)
-                if newAlternateStyles != alternateStyles:
-                    layer.styles = newAlternateStyles
-                    changed = True
-                if changed:
-                    self.catalog.save(layer)
+            layerStyles[layerName] = styleNames
+            for name in [styleNames[0]] + styleNames[1]:
+                styleLayers.setdefault(name, set()).add(layerName)
+        return layerStyles, styleLayers
+
+    def updateLayerStyles(self, updates):
+        '''
+        Sets the styles of several layers concurrently. updates is a dict with layer
+        names as keys and (default style, [alternate styles]) tuples as values, where
+        None means that the default or alternate styles are not changed
+        '''
+        def updateLayer(catalog, layerName):
+            default, alternates = updates[layerName]
+            root = ElementTree.Element("layer")
+            if default is not None:
+                ElementTree.SubElement(ElementTree.SubElement(root, "defaultStyle"), "name").text = default
+            if alternates is not None:
+                stylesElement = ElementTree.SubElement(root, "styles")
+                for name in alternates:
+                    ElementTree.SubElement(ElementTree.SubElement(stylesElement, "style"), "name").text = name
+            headers = {"Content-type": "text/xml"}
+            response, content = catalog.http.request(url(catalog.service_url, ["layers", layerName + ".xml"]),
+                                                     "PUT", ElementTree.tostring(root, "utf-8"), headers)
+            if response.status != 200:
+                raise Exception(content)
+
+        results = runConcurrently(self.catalog, updateLayer, sorted(updates))
+        self.catalog._cache.clear()
+        errors = [(layerName, error) for layerName, result, error in results if error is not None]
+        if errors:
+            raise Exception("The following layers could not be updated:\n"
+                            + "\n".join("%s: %s" % (name, unicode(error)) for name, error in errors))
+
+    def removeStylesFromLayers(self, styles, index=None):
+        '''
+        Removes the given styles from the alternate styles of the layers that use
+        them, before deleting the styles. The layers using the styles are found
+        with a single index of the catalog, and are updated concurrently.
+        index is the index to use, as returned by getStyleIndex. If it is not
+        passed, it is computed. Returns the names of the updated layers
+        '''
+        names = set(_styleFullName(style) for style in styles)
+        layerStyles, styleLayers = index or self.getStyleIndex()
+        updates = {}
+        for name in names:
+            for layerName in styleLayers.get(name, []):
+                default, alternates = layerStyles[layerName]
+                updates[layerName] = (None, [alternate for alternate in alternates if alternate not in names])
+        updates = dict((layerName, update) for layerName, update in updates.items()
+                       if update[1] != layerStyles[layerName][1])
+        self.updateLayerStyles(updates)
+        return list(updates)
 
 
     def publishStyle(self, layer, overwrite = True, name = None):
         '''
         Publishes the style of a given layer style in the specified catalog. If the overwrite parameter is True,
-        it will overwrite a style with that name in case it exists
+        it will overwrite a style with that name in case it exists, unless it is the same style
         '''
 
         if isinstance(layer, basestring):
@@ -169,23 +255,89 @@ class CatalogWrapper(object):
         if sld is not None:
             name = name if name is not None else layer.name()
             name = name.replace(" ", "_")
+            newHash = stylecache.sldHash(sld)
+            if overwrite and self._getStyleHash(name) == newHash:
+                return sld
             self.uploadIcons(icons)
+            stylecache.forgetUploadedStyle(self.catalog, name)
             self.catalog.create_style(name, sld, overwrite)
+            stylecache.setUploadedHash(self.catalog, name, newHash)
         return sld
 
+    def _getStyleHash(self, name):
+        '''
+        Returns the hash of the SLD of a style in the catalog, or None if the
+        style does not exist. The SLD is only requested if the hash is not known
+        '''
+        styleHash = stylecache.getUploadedHash(self.catalog, name)
+        if styleHash is None:
+            response, content = self.catalog.http.request(url(self.catalog.service_url,
+                                                              ["styles", name + ".sld"]))
+            if response.status != 200:
+                return None
+            styleHash = stylecache.sldHash(content)
+            stylecache.setUploadedHash(self.catalog, name, styleHash)
+        return styleHash
+
 
     def uploadIcons(self, icons):
-        for icon in icons:
-            url = self.catalog.gs_base_url + "rest/resource/styles/"+icon[1]
-            if isinstance(self.catalog, PKICatalog):
-                r = requests.put(url, data=icon[2], cert=(self.catalog.cert, self.catalog.key), verify=self.catalog.ca_cert)
-            else:
-                r = requests.put(url, data=icon[2], auth=(self.catalog.username, self.catalog.password))
-            try:
-                r.raise_for_status()
-            except Exception, e:
-                #In case the GeoServer instance is a Suite one with GeoServer 2.9 or earlier
-                self.uploadIconsSuite(icons)
+        '''
+        Uploads the SVG icons used by a style that are not already in the styles
+        folder of the catalog. Icons are named after their content, so an icon
+        is not uploaded again if there is a file with its name.
+
+        The resource API is used, if available. Otherwise, the catalog is
+        assumed to be a Suite one with GeoServer 2.9 or earlier, and the
+        icons are uploaded with its own API. This is checked once per catalog
+        '''
+        icons = dict((icon[1], icon) for icon in icons).values()
+        known = _knownIcons.setdefault(self.catalog.service_url, set())
+        missing = [icon for icon in icons if icon[1] not in known]
+        if not missing:
+            return
+        existing = self._listStylesFolder()
+        if existing is None:
+            self.uploadIconsSuite(missing)
+            known.update(icon[1] for icon in missing)
+            return
+        known.update(existing)
+        missing = [icon for icon in missing if icon[1] not in existing]
+
+        def uploadIcon(catalog, icon):
+            headers = {"Content-type": "image/svg+xml"}
+            response, content = catalog.http.request(url(catalog.service_url, ["resource", "styles", icon[1]]),
+                                                     "PUT", icon[2], headers)
+            if response.status not in (200, 201):
+                raise Exception("Error uploading SVG icon to GeoServer:\n" + content)
+
+        results = runConcurrently(self.catalog, uploadIcon, missing)
+        errors = [error for icon, result, error in results if error is not None]
+        known.update(icon[1] for icon, result, error in results if error is None)
+        if errors:
+            raise errors[0]
+
+    def _listStylesFolder(self):
+        '''
+        Returns the names of the files in the styles folder of the catalog, or
+        None if the resource API is not available. Other errors are raised, and
+        the API is checked again the next time
+        '''
+        if _iconsApi.get(self.catalog.service_url) == "suite":
+            return None
+        headers = {"Accept": "application/json"}
+        response, content = self.catalog.http.request(url(self.catalog.service_url, ["resource", "styles"]),
+                                                      "GET", None, headers)
+        if response.status in (404, 405):
+            _iconsApi[self.catalog.service_url] = "suite"
+            return None
+        if response.status != 200:
+            raise Exception("Error listing the styles folder of the catalog:\n" + content)
+        _iconsApi[self.catalog.service_url] = "resource"
+        children = json.loads(content)["ResourceDirectory"].get("children") or {}
+        children = children.get("child") or []
+        if isinstance(children, dict):
+            children = [children]
+        return set(child["name"] for child in children)
 
     def uploadIconsSuite(self, icons):
         url = self.catalog.gs_base_url + "app/api/icons"
@@ -222,11 +374,14 @@ class CatalogWrapper(object):
         return data
 
 
-    def _publishPostgisLayer(self, layer, workspace, overwrite, name, storename=None):
+    def _getPostgisStore(self, layer, workspace, overwrite, storename=None):
+        '''
+        Returns the name of the store for the database of a PostGIS layer and
+        the store itself, creating it if needed. The store is None if it exists
+        and cannot be overwritten
+        '''
         uri = QgsDataSourceURI(layer.dataProvider().dataSourceUri())
 
-
-
         conname = self.getConnectionNameFromLayer(layer)
         storename = xmlNameFixUp(storename or conname)
 
@@ -256,6 +411,11 @@ class CatalogWrapper(object):
                                      port = uri.port(),
                                      user = user,
                                      passwd = passwd)
+        return storename, store
+
+    def _publishPostgisLayer(self, layer, workspace, overwrite, name, storename=None, title=None):
+        uri = QgsDataSourceURI(layer.dataProvider().dataSourceUri())
+        storename, store = self._getPostgisStore(layer, workspace, overwrite, storename)
         if store is not None:
             grpswlyr = []
             if overwrite:
@@ -285,25 +445,19 @@ class CatalogWrapper(object):
                 if frsc is not None:
                     self.catalog.delete(frsc)
 
-            # for dbs the name has to be the table name, initially
-            ftype = self.catalog.publish_featuretype(uri.table(), store,
-                                                     layer.crs().authid())
-
-            # once table-based feature type created, switch name to user-chosen
-            if ftype.name != name:
-                ftype.dirty["name"] = name
-                ftype.dirty["title"] = name
-            self.catalog.save(ftype)
+            self._saveResourceDefinition(layer, workspace, store.name, name,
+                                         title or name, uri.table())
 
             # now re-add to any previously assigned-to layer groups
             if overwrite and grpswlyr:
-                ftype = self.catalog.get_resource(name)
+                ftype = self.getResourceInStore(layer, workspace, store.name, name)
                 if ftype:
                     addLayerToGroups(self.catalog, ftype, grpswlyr,
                                      workspace=workspace)
+        return storename
 
 
-    def _uploadRest(self, layer, workspace, overwrite, name):
+    def _uploadRest(self, layer, workspace, overwrite, name, title=None):
         if layer.type() == layer.RasterLayer:
             path = self.getDataFromLayer(layer)
             self.catalog.create_coveragestore(name,
@@ -312,45 +466,413 @@ class CatalogWrapper(object):
                                       overwrite=overwrite)
         elif layer.type() == layer.VectorLayer:
             path = self.getDataFromLayer(layer)
-            self.catalog.create_featurestore(name,
-                              path,
-                              workspace=workspace,
-                              overwrite=overwrite)
+            self._checkStoreDoesNotExist(name, workspace, overwrite)
+            # the feature type is not configured by GeoServer, so it can be
+            # created with the name, title and bounding boxes computed here
+            params = {"configure": "none"}
+            if overwrite:
+                params["update"] = "overwrite"
+            storeUrl = url(self.catalog.service_url,
+                           ["workspaces", workspace.name, "datastores", name, "file.shp"],
+                           params)
+            archive = prepare_upload_bundle(name, path)
+            headers = {"Content-type": "application/zip", "Accept": "application/xml"}
+            try:
+                with open(archive, "rb") as f:
+                    response, content = self.catalog.http.request(storeUrl, "PUT", f.read(), headers)
+            finally:
+                os.unlink(archive)
+            if response.status not in (200, 201):
+                raise UploadError(content)
+            self._saveResourceDefinition(layer, workspace, name, name, title or name, name)
+        return name
+
+    def _checkStoreDoesNotExist(self, name, workspace, overwrite):
+        if overwrite:
+            return
+        try:
+            store = self.catalog.get_store(name, workspace)
+        except FailedRequestError:
+            store = None
+        if store is not None:
+            raise ConflictingDataError("There is already a store named " + name)
+
+    def _resourcesUrl(self, layer, workspace, storename):
+        if layer.type() == layer.RasterLayer:
+            segments = ["workspaces", workspace.name, "coveragestores", storename, "coverages"]
+        else:
+            segments = ["workspaces", workspace.name, "datastores", storename, "featuretypes"]
+        return url(self.catalog.service_url, segments)
+
+    def _resourceDefinition(self, layer, name, title, nativeName, abstract=None):
+        '''
+        Returns the XML definition of the feature type or coverage for a layer,
+        with its bounding boxes and SRS computed from the layer itself, so
+        GeoServer does not have to compute them after the resource is created
+        '''
+        native, latlon, srs = layers.getLayerBoundingBoxes(layer)
+        tag = "coverage" if layer.type() == layer.RasterLayer else "featureType"
+        root = ElementTree.Element(tag)
+        ElementTree.SubElement(root, "name").text = name
+        ElementTree.SubElement(root, "nativeName").text = nativeName
+        ElementTree.SubElement(root, "title").text = title
+        if abstract is not None:
+            ElementTree.SubElement(root, "abstract").text = abstract
+        if srs is not None:
+            ElementTree.SubElement(root, "srs").text = srs
+            ElementTree.SubElement(root, "projectionPolicy").text = "FORCE_DECLARED"
+        for elementName, bbox in (("nativeBoundingBox", native), ("latLonBoundingBox", latlon)):
+            if bbox is None:
+                continue
+            element = ElementTree.SubElement(root, elementName)
+            for coordName, coord in zip(("minx", "maxx", "miny", "maxy"), bbox[:4]):
+                ElementTree.SubElement(element, coordName).text = repr(coord)
+            if bbox[4] is not None:
+                ElementTree.SubElement(element, "crs").text = bbox[4]
+        return ElementTree.tostring(root, "utf-8")
+
+    def _saveResourceDefinition(self, layer, workspace, storename, name, title, nativeName):
+        '''
+        Creates the feature type or coverage for a layer in the given store, or
+        updates it if it already exists
+        '''
+        resourcesUrl = self._resourcesUrl(layer, workspace, storename)
+        xml = self._resourceDefinition(layer, name, title, nativeName)
+        saveResourceDefinition(self.catalog, resourcesUrl, name, xml)
+        self.catalog._cache.clear()
+
+    def getResourceInStore(self, layer, workspace, storename, name):
+        '''
+        Returns the resource with the given name in a store, using a single
+        request, or None if it does not exist
+        '''
+        if layer.type() == layer.RasterLayer:
+            store = CoverageStore(self.catalog, workspace, storename)
+            resource = Coverage(self.catalog, workspace, store, name)
+        else:
+            store = DataStore(self.catalog, workspace, storename)
+            resource = FeatureType(self.catalog, workspace, store, name)
+        try:
+            resource.fetch()
+        except FailedRequestError:
+            return None
+        return resource
+
+
+    def getServerPath(self, layer):
+        '''
+        Returns the path to the data of a layer as seen by the server, if it is
+        a file in a folder shared with the server, according to the path mappings
+        of the catalog connection. Returns None otherwise
+        '''
+        return layers.getServerPath(layer, getattr(self.catalog, "pathMappings", None))
+
+    def _uploadExternal(self, layer, workspace, overwrite, name, path, title=None):
+        '''
+        Creates a store that references the data file in the server filesystem,
+        so the data does not have to be uploaded
+        '''
+        if layer.type() == layer.RasterLayer:
+            storeType, fileType = "coveragestores", "geotiff"
+            params = {"configure": "first", "coverageName": name}
+        else:
+            storeType = "datastores"
+            fileType = "gpkg" if path.lower().endswith(".gpkg") else "shp"
+            params = {"configure": "none"}
+        if overwrite:
+            params["update"] = "overwrite"
+        self._checkStoreDoesNotExist(name, workspace, overwrite)
+
+        storeUrl = url(self.catalog.service_url,
+                       ["workspaces", workspace.name, storeType, name, "external." + fileType],
+                       params)
+        headers = {"Content-type": "text/plain"}
+        response, content = self.catalog.http.request(storeUrl, "PUT", "file:" + path, headers)
+        if response.status not in (200, 201):
+            raise UploadError(content)
+
+        if storeType == "datastores":
+            nativeName = os.path.splitext(os.path.basename(path))[0]
+            source = unicode(layer.source())
+            if "|layername=" in source:
+                nativeName = source.split("|layername=")[1].split("|")[0]
+            self._saveResourceDefinition(layer, workspace, name, name, title or name, nativeName)
+        self.catalog._cache.clear()
+        return name
+
+    def canPublishInBatch(self, layer):
+        '''
+        Returns True if the layer can be published with publishPostgisLayers,
+        which is the case of PostGIS layers that do not have to be preprocessed
+        '''
+        return (layer.type() == layer.VectorLayer
+                and layer.dataProvider().name() == "postgres"
+                and not (processingOk and pluginSetting("PreuploadVectorHook")))
+
+    def publishPostgisLayers(self, toPublish, overwrite=True, progress=None):
+        '''
+        Publishes a list of PostGIS layers, passed as (layer, workspace, name, style)
+        tuples, with the same meaning as the parameters of publishLayer.
 
+        The store for each database is created or verified once and the existing
+        feature types in it are listed once. Names and bounding boxes are
+        computed in advance, and tables are then published concurrently.
+        '''
+        stores = {}
+        tasks = []
+        for layer, workspace, name, style in toPublish:
+            workspace = workspace or self.catalog.get_default_workspace()
+            name = xmlNameFixUp(name or layer.name())
+            key = (workspace.name, self.getConnectionNameFromLayer(layer))
+            if key not in stores:
+                storename, store = self._getPostgisStore(layer, workspace, overwrite)
+                existing = {} if store is None else {r.name: r for r in store.get_resources()}
+                stores[key] = (store, existing)
+            store, existing = stores[key]
+            if store is None or (name in existing and not overwrite):
+                continue
+            addTrackedLayer(layer, self.catalog.service_url)
+            sld = None
+            if style is None:
+                sld, icons = getGsCompatibleSld(layer)
+                if sld is not None:
+                    self.uploadIcons(icons)
+            uri = QgsDataSourceURI(layer.dataProvider().dataSourceUri())
+            title, abstract = layers.getLayerMetadata(layer, name)
+            tasks.append({"name": name,
+                          "existing": existing.get(name),
+                          "resourcesUrl": self._resourcesUrl(layer, workspace, store.name),
+                          "definition": self._resourceDefinition(layer, name, title, uri.table(), abstract),
+                          "sld": sld,
+                          "style": style})
+
+        # layers to overwrite have to be removed from their groups before
+        # deleting them, and are added back once they are published again
+        groups = []
+        if overwrite and tasks:
+            names = set(task["name"] for task in tasks)
+            for group in self.catalog.get_layergroups():
+                lyrs = group.layers or []
+                if any(lyr.split(":")[-1] in names for lyr in lyrs):
+                    groups.append((group, list(lyrs), list(group.styles)))
+            for group, lyrs, styles in groups:
+                kept = [(lyr, style) for lyr, style in zip(lyrs, styles)
+                        if lyr.split(":")[-1] not in names]
+                group.dirty.update(layers=[lyr for lyr, style in kept],
+                                   styles=[style for lyr, style in kept])
+                self.catalog.save(group)
+
+        def publishTable(catalog, task):
+            name = task["name"]
+            if overwrite:
+                gslayer = catalog.get_layer(name)
+                if gslayer is not None:
+                    catalog.delete(gslayer)
+                if task["existing"] is not None:
+                    catalog.delete(bindToCatalog(task["existing"], catalog))
+            if task["sld"] is not None:
+                catalog.create_style(name, task["sld"], overwrite)
+                stylecache.setUploadedHash(catalog, name, stylecache.sldHash(task["sld"]))
+            saveResourceDefinition(catalog, task["resourcesUrl"], name, task["definition"])
+            if task["sld"] is not None or task["style"] is not None:
+                gslayer = catalog.get_layer(name)
+                gslayer.default_style = task["style"] or catalog.get_style(name)
+                catalog.save(gslayer)
+
+        results = runConcurrently(self.catalog, publishTable, tasks, progress)
+        self.catalog._cache.clear()
+
+        errors = [(task["name"], error) for task, result, error in results if error is not None]
+        # layers that could not be published might have been deleted already,
+        # so only the ones that still exist are added back to their groups
+        failed = set(name for name, error in errors)
+        missing = set(name for name in failed if self.catalog.get_layer(name) is None)
+        for group, lyrs, styles in groups:
+            restored = [(lyr, style) for lyr, style in zip(lyrs, styles)
+                        if lyr.split(":")[-1] not in missing]
+            group.dirty.update(layers=[lyr for lyr, style in restored],
+                               styles=[style for lyr, style in restored])
+            try:
+                self.catalog.save(group)
+            except Exception, e:
+                errors.append((group.name, "group could not be restored (%s)" % unicode(e)))
+
+        if errors:
+            raise Exception("The following layers could not be published:\n"
+                            + "\n".join("%s: %s" % (name, unicode(error)) for name, error in errors))
+
+    def _addLayerToImportSession(self, session, layer, name, overwrite):
+        # the importer names layers after the uploaded files
+        data = self.getDataFromLayer(layer)
+        if isinstance(data, dict):
+            archive = prepare_upload_bundle(name, data)
+            try:
+                return session.addFile(archive, name + ".zip", overwrite)
+            finally:
+                os.unlink(archive)
+        else:
+            return session.addFile(data, name + os.path.splitext(data)[1], overwrite)
 
     def _uploadImporter(self, layer, workspace, overwrite, name):
         # @todo - more richness needed to allow ingestion into target store
         # versus just publishing the layer to a workspace as a shapefile
-        path = self.getDataFromLayer(layer)
-        if isinstance(path, dict):
-            if 'shp' in path:
-                path = path['shp']
-            else:
-                raise Exception('Unexpected condition : %s', path.keys())
-        session = self.client.upload(path)
-        if not session.tasks:
+        session = ImportSession(self.catalog, workspace)
+        if not self._addLayerToImportSession(session, layer, name, overwrite):
             raise Exception('Geoserver is not able to process the uploaded data')
-        if len(session.tasks) != 1:
-            # this probably shouldn't happen but just in case
-            raise Exception('Unexpected condition')
-        # set workspace if needed (network trip)
-        # limitation in setting name as importer interprets this as a request
-        # to use an existing store by name
-        if workspace:
-            session.tasks[0].set_target(workspace=workspace.name)
-        if overwrite:
-            session.tasks[0].set_update_mode('REPLACE')
+        # the session is run asynchronously and polled, so the GUI is not
+        # blocked while GeoServer ingests the data
         session.commit()
+        states = ImportPoller([session]).wait()[session.id]
+        failed = [state for state in states.values() if state != "COMPLETE"]
+        if failed:
+            raise UploadError("GeoServer could not import layer %s (%s)" % (name, ", ".join(failed)))
 
 
+    def publishLayersWithImporter(self, toPublish, overwrite=True, progress=None):
+        '''
+        Publishes a list of layers, passed as (layer, workspace, name, style) tuples,
+        with the same meaning as the parameters of publishLayer, using the importer API.
+
+        All the layers to publish to a workspace are uploaded to a single importer
+        session, with a task for each layer, and the session is run asynchronously,
+        reporting the number of finished tasks to the progress function, if passed.
+        '''
+        sessions = {}
+        taskNames = {}
+        styles = []
+        metadata = []
+        toSync = []
+        for layer, workspace, name, style in toPublish:
+            workspace = workspace or self.catalog.get_default_workspace()
+            addTrackedLayer(layer, self.catalog.service_url)
+            name = xmlNameFixUp(name or layer.name())
+            gslayer = self.catalog.get_layer(name)
+            if gslayer is not None and not overwrite:
+                continue
+            sld = self.publishStyle(layer, overwrite, name) if style is None else None
+            if sld is not None or style is not None:
+                styles.append((name, style))
+            sourceLayer = layer
+            layer = self.preprocess(layer)
+            if layer.type() == layer.VectorLayer and layer.dataProvider().name() == "postgres":
+                self.upload(layer, workspace, overwrite, name)
+                continue
+            # the importer titles layers with their names, so only other titles
+            # and abstracts have to be set once the layers are imported
+            title, abstract = layers.getLayerMetadata(sourceLayer, name)
+            if title != name or abstract is not None:
+                metadata.append((name, (workspace, layer.type() == layer.RasterLayer, title, abstract)))
+            if layer is sourceLayer and layer.type() == layer.VectorLayer:
+                toSync.append((layer, name, workspace))
+            if workspace.name not in sessions:
+                sessions[workspace.name] = ImportSession(self.catalog, workspace)
+            session = sessions[workspace.name]
+            for taskId in self._addLayerToImportSession(session, layer, name, overwrite) or []:
+                taskNames[(session.id, taskId)] = name
+
+        for session in sessions.values():
+            session.commit()
+        errors = []
+        failed = set()
+        if sessions:
+            states = ImportPoller(sessions.values()).wait(progress)
+            for sessionId, sessionStates in states.items():
+                for taskId, state in sessionStates.items():
+                    if state != "COMPLETE":
+                        name = taskNames.get((sessionId, taskId), "task %s" % taskId)
+                        failed.add(name)
+                        errors.append("%s: could not be imported (%s)" % (name, state))
+        self.catalog._cache.clear()
+
+        # only imported layers can be synced, since the others have no feature type
+        for layer, name, workspace in toSync:
+            if name in failed:
+                featuresync.clearSyncInfo(layer)
+            else:
+                featuresync.initSyncInfo(layer, name, workspace)
+
+        def assignStyle(catalog, nameAndStyle):
+            name, style = nameAndStyle
+            gslayer = catalog.get_layer(name)
+            if gslayer is None:
+                raise Exception("Layer could not be found in the catalog")
+            gslayer.default_style = style or catalog.get_style(name)
+            catalog.save(gslayer)
+        styles = [(name, style) for name, style in styles if name not in failed]
+        for (name, style), result, error in runConcurrently(self.catalog, assignStyle, styles):
+            if error is not None:
+                errors.append("%s: style could not be assigned (%s)" % (name, unicode(error)))
+
+        def assignMetadata(catalog, nameAndMetadata):
+            name, (workspace, isRaster, title, abstract) = nameAndMetadata
+            setResourceMetadata(catalog, workspace, name, isRaster, title, abstract)
+        metadata = [(name, m) for name, m in metadata if name not in failed]
+        for (name, m), result, error in runConcurrently(self.catalog, assignMetadata, metadata):
+            if error is not None:
+                errors.append("%s: title and abstract could not be set (%s)" % (name, unicode(error)))
+
+        if errors:
+            raise Exception("The following layers could not be published:\n" + "\n".join(sorted(errors)))
+
+    def publishLayers(self, toPublish, overwrite=True, progress=None):
+        '''
+        Publishes a list of layers, passed as (layer, workspace, name, style) tuples,
+        with the same meaning as the parameters of publishLayer.
+
+        PostGIS layers are published concurrently with publishPostgisLayers. The
+        rest of them are uploaded in a single importer session per workspace, or
+        one by one if the REST API is used. The number of published layers is
+        reported to the progress function, if passed.
+        '''
+        batch = [t for t in toPublish if self.canPublishInBatch(t[0])]
+        others = [t for t in toPublish if not self.canPublishInBatch(t[0])]
+        progress = progress or (lambda n: None)
+        # the setting is read once, before anything is published
+        levels = generalizationLevels()
+        errors = []
+        if batch:
+            try:
+                self.publishPostgisLayers(batch, overwrite, progress)
+            except Exception, e:
+                errors.append(unicode(e))
+            progress(len(batch))
+        useRest = pluginSetting("UseRestApi")
+        if others and not useRest:
+            try:
+                self.publishLayersWithImporter(others, overwrite,
+                                               lambda n: progress(len(batch) + n))
+            except Exception, e:
+                errors.append(unicode(e))
+        else:
+            for i, (layer, workspace, name, style) in enumerate(others):
+                try:
+                    self.publishLayer(layer, workspace, overwrite, name, style, levels)
+                except Exception, e:
+                    errors.append("%s: %s" % (name or layer.name(), unicode(e)))
+                progress(len(batch) + i + 1)
+        # publishLayer already publishes the generalized copies of the layers it publishes
+        for layer, workspace, name, style in (batch if useRest else toPublish):
+            if levels and style is None and canGeneralize(layer) and getGsCompatibleSld(layer)[0] is not None:
+                name = xmlNameFixUp(name or layer.name())
+                try:
+                    self.publishGeneralizedLayer(layer, workspace, overwrite, name, levels)
+                except Exception, e:
+                    errors.append("%s: %s" % (name, unicode(e)))
+        if errors:
+            raise Exception("\n".join(errors))
+
     def upload(self, layer, workspace=None, overwrite=True, name=None):
-        '''uploads the specified layer'''
+        '''
+        uploads the specified layer. Returns True if its store was created by
+        reference to the data file in the server filesystem, so the server
+        reads the same data as QGIS
+        '''
 
         if isinstance(layer, basestring):
             layer = layers.resolveLayer(layer)
 
         name = name or layer.name()
-        title = name
+        title, abstract = layers.getLayerMetadata(layer, name)
         name = name.replace(" ", "_")
 
         restApi = pluginSetting("UseRestApi")
@@ -359,12 +881,17 @@ class CatalogWrapper(object):
             msg = layer.name() + ' is not a valid raster or vector layer'
             raise Exception(msg)
 
+        workspace = workspace or self.catalog.get_default_workspace()
         provider = layer.dataProvider()
+        serverPath = self.getServerPath(layer)
+        storename = None
         try:
             if provider.name() == 'postgres':
-                self._publishPostgisLayer(layer, workspace, overwrite, name)
+                storename = self._publishPostgisLayer(layer, workspace, overwrite, name, title=title)
+            elif serverPath is not None:
+                storename = self._uploadExternal(layer, workspace, overwrite, name, serverPath, title)
             elif restApi:
-                self._uploadRest(layer, workspace, overwrite, name)
+                storename = self._uploadRest(layer, workspace, overwrite, name, title)
             else:
                 self._uploadImporter(layer, workspace, overwrite, name)
         except UploadError, e:
@@ -384,28 +911,33 @@ class CatalogWrapper(object):
 
 
         # Verify the resource was created
-        resource = self.catalog.get_resource(name)
-        if resource is not None:
-            assert resource.name == name
+        if storename is not None:
+            resource = self.getResourceInStore(layer, workspace, storename, name)
         else:
+            resource = self.catalog.get_resource(name, workspace=workspace)
+        if resource is None:
             msg = ('could not create layer %s.' % name)
             raise Exception(msg)
 
-        if title != name:
+        # Resources created by GeoServer itself (rasters and importer uploads)
+        # might lack the title or the lat/lon bounding box. They are fixed with
+        # the values computed locally, in a single request
+        if resource.title != title:
             resource.dirty["title"] = title
-            self.catalog.save(resource)
+        if abstract is not None and resource.abstract != abstract:
+            resource.dirty["abstract"] = abstract
         if resource.latlon_bbox is None:
-            box = resource.native_bbox[:4]
-            minx, maxx, miny, maxy = [float(a) for a in box]
-            if -180 <= minx <= 180 and -180 <= maxx <= 180 and \
-                    -90 <= miny <= 90 and -90 <= maxy <= 90:
-                resource.latlon_bbox = resource.native_bbox
-                resource.projection = "EPSG:4326"
-                self.catalog.save(resource)
-            else:
+            native, latlon, srs = layers.getLayerBoundingBoxes(layer)
+            if latlon is None or srs is None:
                 msg = ('Could not set projection for layer '
                        '[%s]. the layer has been created, but its projection should be set manually.')
                 raise Exception(msg % layer.name())
+            resource.native_bbox = native
+            resource.latlon_bbox = latlon
+            resource.projection = srs
+        if resource.dirty:
+            self.catalog.save(resource)
+        return serverPath is not None and provider.name() != 'postgres'
 
     def getConnectionNameFromLayer(self, layer):
         connName = "postgis_store"
@@ -452,35 +984,28 @@ class CatalogWrapper(object):
             return
 
         group = groups[name]
-        bounds = None
-
-        def addToBounds(bbox, bounds):
-            if bounds is not None:
-                bounds = [min(bounds[0], bbox.xMinimum()),
-                            max(bounds[1], bbox.xMaximum()),
-                            min(bounds[2], bbox.yMinimum()),
-                            max(bounds[3], bbox.yMaximum())]
-            else:
-                bounds = [bbox.xMinimum(), bbox.xMaximum(),
-                          bbox.yMinimum(), bbox.yMaximum()]
-            return bounds
-
-        for layer in group:
-            gslayer = self.catalog.get_layer(layer.name())
-            if gslayer is None or overwriteLayers:
-                self.publishLayer(layer, workspace, True)
-            transform = QgsCoordinateTransform(layer.crs(), QgsCoordinateReferenceSystem("EPSG:4326"))
-            bounds = addToBounds(transform.transformBoundingBox(layer.extent()), bounds)
-
-        names = [layer.name() for layer in group]
-
-        bounds = (str(bounds[0]), str(bounds[1]), str(bounds[2]), str(bounds[3]), "EPSG:4326")
-        layergroup = self.catalog.create_layergroup(destName, names, names, bounds)
-
+        workspace = workspace or self.catalog.get_default_workspace()
+        names = [xmlNameFixUp(layer.name()) for layer in group]
+
+        # the layers already in the workspace are listed once, instead of
+        # requesting each of them, and the missing ones are published together
+        featureTypes, coverages = getWorkspaceResourceNames(self.catalog, workspace)
+        toPublish = [(layer, workspace, layerName, None) for layer, layerName in zip(group, names)
+                     if overwriteLayers or layerName not in featureTypes | coverages]
+        if toPublish:
+            self.publishLayers(toPublish, True)
+
+        bounds = layers.getGroupBounds(group)
+        if gsgroup is None:
+            layergroup = self.catalog.create_layergroup(destName, names, names, bounds)
+        else:
+            layergroup = gsgroup
+            layergroup.dirty.update(layers=names, styles=names, bounds=bounds)
         self.catalog.save(layergroup)
 
 
-    def publishLayer (self, layer, workspace=None, overwrite=True, name=None, style=None):
+    def publishLayer (self, layer, workspace=None, overwrite=True, name=None, style=None,
+                      generalization=None):
         '''
         Publishes a QGIS layer.
         It creates the corresponding store and the layer itself.
@@ -497,11 +1022,20 @@ class CatalogWrapper(object):
         style: the style to use from the ones in the catalog. Will upload the QGIS style if
         not passed or None
 
+        generalization: a list of (scale, tolerance) tuples. For each of them, a copy of the
+        layer simplified with that tolerance is published, to be rendered at scales smaller
+        than that scale, and a layer group with the layer and its copies is created. Only used
+        with line and polygon layers, when the QGIS style is uploaded. Uses the levels in the
+        plugin settings if not passed or None
+
         '''
 
         if isinstance(layer, basestring):
             layer = layers.resolveLayer(layer)
 
+        if generalization is None:
+            generalization = generalizationLevels()
+
         addTrackedLayer(layer, self.catalog.service_url)
 
         name = xmlNameFixUp(name) if name is not None \
@@ -513,8 +1047,17 @@ class CatalogWrapper(object):
 
         sld = self.publishStyle(layer, overwrite, name) if style is None else None
 
+        sourceLayer = layer
         layer = self.preprocess(layer)
-        self.upload(layer, workspace, overwrite, name)
+        byReference = self.upload(layer, workspace, overwrite, name)
+        if (layer is sourceLayer and layer.type() == layer.VectorLayer
+                and layer.dataProvider().name() != "postgres"):
+            # edits of layers published by reference are already in the data
+            # read by the server, so they must not be sent again with WFS-T
+            if byReference:
+                featuresync.clearSyncInfo(layer)
+            else:
+                featuresync.initSyncInfo(layer, name, workspace)
 
         if sld is not None or style is not None:
             #assign style to created store
@@ -522,59 +1065,99 @@ class CatalogWrapper(object):
             publishing.default_style = style or self.catalog.get_style(name)
             self.catalog.save(publishing)
 
+        if generalization and sld is not None and canGeneralize(layer):
+            self.publishGeneralizedLayer(layer, workspace, overwrite, name, generalization)
+
+    def publishGeneralizedLayer(self, layer, workspace, overwrite, name, levels):
+        '''
+        Publishes simplified copies of a vector layer that has already been published
+        with the given name, and a layer group named [name]_multiscale that renders the
+        layer and each copy at its own range of scales.
+
+        levels is a list of (scale, tolerance) tuples. The copy for each level is
+        simplified with the tolerance, in layer units, and used at scales smaller than
+        the scale of the level. Each member of the group uses a copy of the QGIS style
+        of the layer restricted to its range of scales
+        '''
+        workspace = workspace or self.catalog.get_default_workspace()
+        levels = sorted(levels)
+        sld, icons = getGsCompatibleSld(layer)
+        members = [name]
+        for i, (scale, tolerance) in enumerate(levels):
+            copyName = "%s_gen%i" % (name, i + 1)
+            path = exporter.exportGeneralizedLayer(layer, tolerance, copyName)
+            self.upload(QgsVectorLayer(path, copyName, "ogr"), workspace, overwrite, copyName)
+            members.append(copyName)
+
+        # the scale range of each member. The ranges that the rules of the style already
+        # have, including the scale visibility of the layer, are restricted to it
+        bounds = [None] + [scale for scale, tolerance in levels] + [None]
+        styles = []
+        for i, member in enumerate(members):
+            styleName = "%s_scale%i" % (name, i)
+            styles.append(styleName)
+            if not overwrite and self.catalog.get_style(styleName) is not None:
+                continue
+            styleSld = setScaleRange(sld, bounds[i], bounds[i + 1])
+            self.catalog.create_style(styleName, styleSld, overwrite)
+            stylecache.setUploadedHash(self.catalog, styleName, stylecache.sldHash(styleSld))
+        for member, styleName in zip(members[1:], styles[1:]):
+            gslayer = self.catalog.get_layer(member)
+            gslayer.default_style = self.catalog.get_style(styleName)
+            self.catalog.save(gslayer)
+
+        groupName = name + "_multiscale"
+        groupBounds = layers.getGroupBounds([layer])
+        group = self.catalog.get_layergroup(groupName)
+        if group is None:
+            group = self.catalog.create_layergroup(groupName, members, styles, groupBounds)
+        elif overwrite:
+            group.dirty.update(layers=members, styles=styles, bounds=groupBounds)
+        else:
+            return
+        self.catalog.save(group)
+
     def preprocess(self, layer):
         '''
         Preprocesses the layer with the corresponding preprocess hook and returns the path to the
-        resulting layer. If no preprocessing is performed, it returns the input layer itself
+        resulting layer. If no preprocessing is performed, it returns the input layer itself.
+        The output of the hook is kept, and reused if the layer and the hook file do not change
         '''
         if not processingOk:
             return layer
 
         if layer.type() == layer.RasterLayer:
-            try:
-                hookFile = pluginSetting("PreuploadRasterHook")
-                if hookFile:
-                    alg = self.getAlgorithmFromHookFile(hookFile)
-                    if (len(alg.parameters) == 1 and isinstance(alg.parameters[0], ParameterRaster)
-                        and len(alg.outputs) == 1 and isinstance(alg.outputs[0], OutputRaster)):
-                        alg.parameters[0].setValue(layer)
-                        if runalg(alg, SilentProgress()):
-                            return load(alg.outputs[0].value)
-                        return layer
-                else:
-                    return layer
-            except:
-                QgsMessageLog.logMessage("Could not apply hook to layer upload. Wrong Hook", level=QgsMessageLog.WARNING)
-                return layer
+            hookFile = pluginSetting("PreuploadRasterHook")
+            parameterClass, outputClass, extension = ParameterRaster, OutputRaster, "tif"
         elif layer.type() == layer.VectorLayer:
-            try:
-                hookFile = pluginSetting("PreuploadVectorHook")
-                if hookFile:
-                    alg = self.getAlgorithmFromHookFile(hookFile)
-                    if (len(alg.parameters) == 1 and isinstance(alg.parameters[0], ParameterVector)
-                        and len(alg.outputs) == 1 and isinstance(alg.outputs[0], OutputVector)):
-                        alg.parameters[0].setValue(layer)
-                        if runalg(alg, SilentProgress()):
-                            return load(alg.outputs[0].value)
-                        return layer
-                else:
-                    return layer
-            except:
-                QgsMessageLog.logMessage("Could not apply hook to layer upload. Wrong Hook", level=QgsMessageLog.WARNING)
+            hookFile = pluginSetting("PreuploadVectorHook")
+            parameterClass, outputClass, extension = ParameterVector, OutputVector, "shp"
+        else:
+            return layer
+        if not hookFile:
+            return layer
+        try:
+            alg = self.getAlgorithmFromHookFile(hookFile)
+            if not (len(alg.parameters) == 1 and isinstance(alg.parameters[0], parameterClass)
+                    and len(alg.outputs) == 1 and isinstance(alg.outputs[0], outputClass)):
                 return layer
+            output, computed = hooks.getHookOutput(hookFile, layer, extension)
+            if computed:
+                return load(output)
+            alg.parameters[0].setValue(layer)
+            if output is not None:
+                alg.outputs[0].value = output
+            if runalg(alg, SilentProgress()):
+                if output is not None:
+                    hooks.setHookOutputComputed(hookFile, layer, output)
+                return load(alg.outputs[0].value)
+            return layer
+        except:
+            QgsMessageLog.logMessage("Could not apply hook to layer upload. Wrong Hook", level=QgsMessageLog.WARNING)
+            return layer
 
     def getAlgorithmFromHookFile(self, hookFile):
-        if hookFile.endswith('py'):
-            script = ScriptAlgorithm(hookFile)
-            script.provider = ModelerUtils.providers['script']
-            return script
-        elif hookFile.endswith('model'):
-            model = ModelerAlgorithm()
-            model.openModel(hookFile)
-            model.provider = ModelerUtils.providers['model']
-            return model
-        else:
-            raise Exception ("Wrong hook file")
+        return hooks.getHookAlgorithm(hookFile)
 
     def addLayerToProject(self, name, destName = None):
         '''
@@ -595,14 +1178,8 @@ class CatalogWrapper(object):
             qgslayer = QgsVectorLayer(uri, destName or resource.title, "WFS")
             if not qgslayer.isValid():
                 raise Exception ("Layer at %s is not a valid layer" % uri)
-            ok = True
             try:
-                sld = layer.default_style.sld_body
-                sld = adaptGsToQgs(sld)
-                sldfile = tempFilename("sld")
-                with open(sldfile, 'w') as f:
-                    f.write(sld)
-                msg, ok = qgslayer.loadSldStyle(sldfile)
+                ok = setLayerSld(qgslayer, getQgisStyle(self.catalog, layer.default_style))
             except Exception, e:
                 ok = False
             QgsMapLayerRegistry.instance().addMapLayers([qgslayer])
@@ -637,6 +1214,67 @@ class CatalogWrapper(object):
         QgsMapLayerRegistry.instance().addMapLayers([qgslayer])
 
 
+def generalizationLevels():
+    '''
+    Returns the levels of generalization in the plugin settings, as a list of
+    (scale, tolerance) tuples
+    '''
+    setting = pluginSetting("GeneralizationLevels") or ""
+    levels = []
+    for level in setting.split(","):
+        if not level.strip():
+            continue
+        try:
+            scale, tolerance = level.split(":")
+            levels.append((float(scale), float(tolerance)))
+        except ValueError:
+            raise Exception("Wrong generalization level '%s'. Levels must be entered as scale:tolerance"
+                            % level.strip())
+    return levels
+
+def canGeneralize(layer):
+    return layer.type() == layer.VectorLayer and layer.geometryType() in (QGis.Line, QGis.Polygon)
+
+def _styleFullName(style):
+    # styles in a workspace are referenced in layers with the workspace prefix
+    workspace = getattr(style, "workspace", None)
+    workspace = getattr(workspace, "name", workspace)
+    return style.name if not workspace else "%s:%s" % (workspace, style.name)
+
+def getQgisStyle(catalog, style):
+    '''
+    Returns the SLD of a style in a catalog, adapted to be used in QGIS.
+
+    Converted styles are kept along with the ETag of the style body, if the
+    server sends one, and the body is only downloaded again if it has changed
+    '''
+    name = _styleFullName(style)
+    cached = stylecache.getConvertedStyle(catalog, name)
+    headers = {}
+    if cached is not None and cached[0] is not None:
+        headers["If-None-Match"] = cached[0]
+    response, content = catalog.http.request(style.body_href, "GET", None, headers)
+    if response.status == 304 and cached is not None:
+        return cached[1]
+    if response.status != 200:
+        raise FailedRequestError("Could not get the body of style %s: %s" % (name, content))
+    sld = adaptGsToQgs(content)
+    stylecache.setConvertedStyle(catalog, name, response.get("etag"), sld)
+    return sld
+
+def saveResourceDefinition(catalog, resourcesUrl, name, xml):
+    '''
+    Creates a feature type or coverage from its XML definition, by posting it to
+    the url of the resources of its store. If it already exists, it is updated
+    '''
+    headers = {"Content-type": "text/xml"}
+    response, content = catalog.http.request(resourcesUrl, "POST", xml, headers)
+    if response.status not in (200, 201):
+        resourceUrl = resourcesUrl + "/" + name + ".xml"
+        response, content = catalog.http.request(resourceUrl, "PUT", xml, headers)
+        if response.status != 200:
+            raise UploadError(content)
+
 def createPGFeatureStore(catalog, name, workspace=None, overwrite=False,
     host="localhost", port=5432, database="db", schema="public", user="postgres", passwd=""):
     try:
@@ -11,10 +11,13 @@ for uploading to GeoServer.
 from qgis.core import *
 from geoserverexplorer.qgis import utils
 import os
+from contextlib import contextmanager
 from PyQt4 import QtCore
 from qgis.utils import iface
 from qgis.gui import QgsMessageBar
 from qgiscommons2.files import tempFilenameInTempFolder
+from qgiscommons2.settings import pluginSetting
+from osgeo import gdal
 
 def exportVectorLayer(layer):
     '''accepts a QgsVectorLayer or a string with a filepath'''
@@ -46,20 +49,155 @@ def exportVectorLayer(layer):
 
 
 
+def exportGeneralizedLayer(layer, tolerance, name):
+    '''
+    Exports a copy of a vector layer with its geometries simplified using the
+    given tolerance, in layer units, to a shapefile. Returns the path to the
+    exported file
+    '''
+    settings = QtCore.QSettings()
+    systemEncoding = settings.value( "/UI/encoding", "System" )
+    output = tempFilenameInTempFolder(name + ".shp")
+    writer = QgsVectorFileWriter(output, systemEncoding, layer.pendingFields(),
+                                 layer.dataProvider().geometryType(), layer.crs())
+    for feat in layer.getFeatures():
+        geom = feat.geometry()
+        if geom is not None:
+            simplified = geom.simplify(tolerance)
+            if simplified is not None:
+                feat.setGeometry(simplified)
+        writer.addFeature(feat)
+    del writer
+    return output
+
 def exportRasterLayer(layer):
-    if (not unicode(layer.source()).lower().endswith("tif") ):
-        filename = str(layer.name())
-        output = tempFilenameInTempFolder(filename + ".tif")
-        writer = QgsRasterFileWriter(output)
-        writer.setOutputFormat("GTiff");
-        writer.writeRaster(layer.pipe(), layer.width(), layer.height(), layer.extent(), layer.crs())
-        del writer
-        return output
+    source = unicode(layer.source())
+    if pluginSetting("OptimizeRasters"):
+        if layer.providerType() == "gdal":
+            return optimizeRaster(source, unicode(layer.name()))
+        return optimizeRaster(_writeRaster(layer), unicode(layer.name()))
+    if (not source.lower().endswith("tif")):
+        return _writeRaster(layer)
     else:
-        return unicode(layer.source())
+        return source
 
+def _writeRaster(layer):
+    filename = str(layer.name())
+    output = tempFilenameInTempFolder(filename + ".tif")
+    writer = QgsRasterFileWriter(output)
+    writer.setOutputFormat("GTiff");
+    writer.writeRaster(layer.pipe(), layer.width(), layer.height(), layer.extent(), layer.crs())
+    del writer
+    return output
 
+OVERVIEW_MIN_SIZE = 256
+BLOCK_SIZE = 512
 
+def _driverSupports(compression):
+    '''Returns True if the GeoTIFF driver of the installed GDAL supports a compression
+    method. ZSTD, for instance, is only available since GDAL 2.3'''
+    optionList = gdal.GetDriverByName("GTiff").GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""
+    return "<Value>%s</Value>" % compression in optionList
 
+def _compressionOptions(ds):
+    compression = pluginSetting("RasterCompression").upper()
+    if compression != "NONE" and not _driverSupports(compression):
+        compression = "DEFLATE"
+    band = ds.GetRasterBand(1)
+    isByte = band.DataType == gdal.GDT_Byte
+    isFloat = band.DataType in (gdal.GDT_Float32, gdal.GDT_Float64)
+    if compression == "JPEG" and not (isByte and ds.RasterCount in (1, 3)
+                                      and band.GetColorTable() is None):
+        compression = "DEFLATE"
+    options = ["TILED=YES", "BLOCKXSIZE=%i" % BLOCK_SIZE, "BLOCKYSIZE=%i" % BLOCK_SIZE,
+               "BIGTIFF=IF_SAFER", "NUM_THREADS=ALL_CPUS"]
+    if compression == "NONE":
+        return options
+    options.append("COMPRESS=" + compression)
+    if compression in ("DEFLATE", "LZW", "ZSTD"):
+        predictor = int(pluginSetting("RasterPredictor"))
+        if predictor == 3 and not isFloat:
+            predictor = 2
+        if predictor > 1:
+            options.append("PREDICTOR=%i" % predictor)
+    elif compression == "JPEG" and ds.RasterCount == 3:
+        options.append("PHOTOMETRIC=YCBCR")
+    return options
+
+def _overviewLevels(ds):
+    levels = []
+    factor = 2
+    while max(ds.RasterXSize, ds.RasterYSize) / factor >= OVERVIEW_MIN_SIZE:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+def isOptimizedRaster(ds):
+    '''Returns True if the dataset is a tiled, compressed GeoTIFF that
+    already has the overviews it needs'''
+    if ds.GetDriver().ShortName != "GTiff":
+        return False
+    band = ds.GetRasterBand(1)
+    blockWidth, blockHeight = band.GetBlockSize()
+    if blockWidth == ds.RasterXSize or blockHeight == 1:
+        return False
+    if ds.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE") is None:
+        return False
+    return band.GetOverviewCount() >= len(_overviewLevels(ds))
+
+def optimizeRaster(filename, name):
+    '''Prepares a raster file for publishing, writing it as an internally tiled
+    and compressed GeoTIFF with internal overviews, following the layout of a
+    cloud optimized GeoTIFF. Returns the path to the resulting file, which is
+    the passed one if it is already optimized'''
+    ds = gdal.Open(filename)
+    if ds is None:
+        raise Exception("Error reading file {} or it is not a valid raster layer file".format(filename))
+    if isOptimizedRaster(ds):
+        return filename
+    driver = gdal.GetDriverByName("GTiff")
+    options = _compressionOptions(ds)
+    resampling = pluginSetting("RasterOverviewResampling").upper()
+    if ds.GetRasterBand(1).GetColorTable() is not None:
+        resampling = "NEAREST"
+    # overviews have to be computed before the final copy, so the copy can
+    # place them ahead of the full resolution data, as cloud optimized
+    # GeoTIFF readers expect
+    tiled = tempFilenameInTempFolder(name + "_tiled.tif")
+    with _gdalConfig(GDAL_NUM_THREADS="ALL_CPUS", COMPRESS_OVERVIEW=_compression(options)):
+        tmp = driver.CreateCopy(tiled, ds, 0, options)
+        ds = None
+        if tmp is None:
+            raise Exception("Error preparing raster file {}: {}".format(filename, gdal.GetLastErrorMsg()))
+        levels = _overviewLevels(tmp)
+        if levels:
+            tmp.BuildOverviews(resampling, levels)
+        output = tempFilenameInTempFolder(name + ".tif")
+        out = driver.CreateCopy(output, tmp, 0, options + ["COPY_SRC_OVERVIEWS=YES"])
+        tmp = None
+    if out is None:
+        raise Exception("Error preparing raster file {}: {}".format(filename, gdal.GetLastErrorMsg()))
+    out = None
+    try:
+        driver.Delete(tiled)
+    except:
+        pass
+    return output
 
+@contextmanager
+def _gdalConfig(**options):
+    '''Sets GDAL configuration options, restoring their previous values when done'''
+    previous = dict((key, gdal.GetConfigOption(key)) for key in options)
+    for key, value in options.items():
+        gdal.SetConfigOption(key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            gdal.SetConfigOption(key, value)
 
+def _compression(options):
+    for option in options:
+        if option.startswith("COMPRESS="):
+            return option.split("=")[1]
+    return "NONE"
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+Incremental synchronization of the features of tracked vector layers, using WFS-T.
+
+Only the features that have been inserted, updated or deleted are sent to GeoServer.
+Changes are taken from the edit buffer of the layer when edits are committed, keeping
+only the ones that the data provider reports as committed, or computed by comparing the
+layer with the snapshot taken the last time it was synchronized.
+'''
+
+import os
+import json
+import hashlib
+from qgis.core import *
+from PyQt4.QtXml import QDomDocument
+from PyQt4 import QtCore
+from xml.etree.ElementTree import XML
+from geoserverexplorer.qgis.utils import userFolder, getTrackedLayerSyncInfo, setTrackedLayerSyncInfo
+from geoserverexplorer.qgis.layers import getServerPath
+from qgiscommons2.settings import pluginSetting
+
+WFS_NS = "http://www.opengis.net/wfs"
+OGC_NS = "http://www.opengis.net/ogc"
+GML_NS = "http://www.opengis.net/gml"
+
+class FeatureSyncError(Exception):
+    pass
+
+
+class FeatureChanges(object):
+    '''
+    The changes to send to the server.
+
+    inserted: list of QgsFeature objects
+    updated: list of (fid, key, feature, changedFieldNames, geometryChanged) tuples.
+    feature is the new version of the feature. changedFieldNames is None if all fields have to be sent
+    deleted: list of (fid, key) tuples
+
+    key is the value of the key field before the change, or None if features are identified by their fid
+    '''
+
+    def __init__(self):
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+
+    def isEmpty(self):
+        return not (self.inserted or self.updated or self.deleted)
+
+    def count(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+def canSyncLayer(layer, catalog=None):
+    '''Only file-based vector layers have to be synced. PostGIS layers are read
+    by GeoServer directly from the database, and so are files in folders shared
+    with the server, according to the path mappings of the catalog, if passed.
+    Layers without a key field can only be synced if they have server fids'''
+    if layer.type() != QgsMapLayer.VectorLayer or layer.dataProvider().name() == "postgres":
+        return False
+    info = getTrackedLayerSyncInfo(layer)
+    return (info is not None
+            and (info.get("keyField") is not None or hasServerFids(layer))
+            and (catalog is None or getServerPath(layer, getattr(catalog, "pathMappings", None)) is None))
+
+
+def hasServerFids(layer):
+    '''
+    Returns True if the fids of the features of a layer can be mapped to the ids of
+    the published features. That is only the case of shapefiles, which are uploaded
+    as they are, and whose records are numbered from 0 in QGIS and from 1 in GeoServer
+    '''
+    return layer.dataProvider().name() == "ogr" and layer.source().lower().endswith(".shp")
+
+
+def _keyField(layer):
+    pk = layer.dataProvider().pkAttributeIndexes()
+    if len(pk) == 1:
+        return layer.pendingFields()[pk[0]].name()
+    return None
+
+
+def initSyncInfo(layer, name, workspace=None):
+    '''
+    Stores the information needed to sync a layer that has just been published with
+    a given name. Layers that have no key field and cannot be synced by fid are not
+    synced, and any information stored for them is removed
+    '''
+    keyField = _keyField(layer)
+    if keyField is None and not hasServerFids(layer):
+        clearSyncInfo(layer)
+        return
+    info = {"typename": name,
+            "workspace": workspace.name if workspace is not None else None,
+            "keyField": keyField}
+    setTrackedLayerSyncInfo(layer, info)
+    if pluginSetting("SyncLayerDataSnapshot"):
+        saveSnapshot(layer, computeSnapshot(layer, info))
+
+
+def clearSyncInfo(layer):
+    '''Removes the information needed to sync a layer and its snapshot, if any, so its edits are not synced'''
+    if getTrackedLayerSyncInfo(layer) is not None:
+        setTrackedLayerSyncInfo(layer, None)
+    filename = _snapshotFile(layer)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def captureEditBuffer(layer):
+    '''
+    Returns a FeatureChanges object with the changes in the edit buffer of the layer.
+    Must be called before the changes are committed. Returns an empty FeatureChanges
+    object if the layer has no edit buffer, and None if the changes cannot be synced
+    incrementally (i.e. the layer schema has changed)
+    '''
+    editBuffer = layer.editBuffer()
+    if editBuffer is None:
+        return FeatureChanges()
+    if editBuffer.addedAttributes() or editBuffer.deletedAttributeIds():
+        return None
+    info = getTrackedLayerSyncInfo(layer)
+    keyField = info.get("keyField") if info else None
+    changes = FeatureChanges()
+    changes.inserted = [QgsFeature(f) for f in editBuffer.addedFeatures().values()]
+    changedAttributes = editBuffer.changedAttributeValues()
+    changedGeometries = editBuffer.changedGeometries()
+    deletedIds = [fid for fid in editBuffer.deletedFeatureIds() if fid >= 0]
+    updatedIds = set([fid for fid in changedAttributes.keys() if fid >= 0])
+    updatedIds.update([fid for fid in changedGeometries.keys() if fid >= 0])
+    updatedIds.difference_update(deletedIds)
+
+    # original key values have to be read from the provider, since they might have been edited
+    keys = {}
+    if keyField is not None and (updatedIds or deletedIds):
+        request = QgsFeatureRequest().setFilterFids(set(updatedIds) | set(deletedIds))
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        for feature in layer.dataProvider().getFeatures(request):
+            keys[feature.id()] = feature[keyField]
+
+    fields = layer.pendingFields()
+    for fid in updatedIds:
+        feature = QgsFeature()
+        if not layer.getFeatures(QgsFeatureRequest(fid)).nextFeature(feature):
+            continue
+        changedNames = [fields[idx].name() for idx in changedAttributes.get(fid, {}).keys()]
+        changes.updated.append((fid, keys.get(fid), feature, changedNames, fid in changedGeometries))
+    changes.deleted = [(fid, keys.get(fid)) for fid in deletedIds]
+    return changes
+
+
+class CommittedChanges(object):
+    '''
+    The changes of a layer that have been written to its data provider in an edit session.
+
+    Changes are captured from the edit buffer before each commit, and only those that
+    the provider reports as committed are kept. A commit that fails leaves the layer in
+    edit mode, and the parts of it that were committed are kept along with the ones of
+    the next commit, so they are sent even if the remaining edits are rolled back.
+    structureChanged is True if added or deleted attributes were committed, in which
+    case the changes cannot be synced incrementally
+    '''
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.structureChanged = False
+        self._inserted = []
+        self._updated = []
+        self._deleted = []
+        self._captured = FeatureChanges()
+        self._capturedUpdates = {}
+        self._committedUpdates = {}
+
+    def capture(self, changes):
+        '''Sets the changes that are about to be committed, as returned by captureEditBuffer'''
+        # updates of a previous commit are kept apart, since they have to be sent
+        # before the ones of this commit if the same feature is updated again
+        self._updated.extend(self._committedUpdates.values())
+        self._committedUpdates = {}
+        self._captured = changes if changes is not None else FeatureChanges()
+        self._capturedUpdates = {update[0]: update for update in self._captured.updated}
+
+    def attributesChanged(self, attributes):
+        self.structureChanged = True
+
+    def featuresAdded(self, features):
+        self._inserted.extend([QgsFeature(f) for f in features])
+
+    def featuresRemoved(self, fids):
+        self._deleted.extend([item for item in self._captured.deleted if item[0] in fids])
+
+    def _committedUpdate(self, fid):
+        if fid not in self._committedUpdates:
+            if fid not in self._capturedUpdates:
+                return None
+            fid, key, feature, changedNames, geometryChanged = self._capturedUpdates[fid]
+            self._committedUpdates[fid] = [fid, key, feature, set(), False]
+        return self._committedUpdates[fid]
+
+    def attributeValuesChanged(self, changedAttributes):
+        fields = self.layer.pendingFields()
+        for fid, values in changedAttributes.iteritems():
+            update = self._committedUpdate(fid)
+            if update is not None:
+                update[3].update([fields[idx].name() for idx in values.keys()])
+
+    def geometriesChanged(self, changedGeometries):
+        for fid in changedGeometries.keys():
+            update = self._committedUpdate(fid)
+            if update is not None:
+                update[4] = True
+
+    def changes(self):
+        '''Returns a FeatureChanges object with the committed changes'''
+        changes = FeatureChanges()
+        changes.inserted = list(self._inserted)
+        changes.updated = [(fid, key, feature, list(changedNames), geometryChanged)
+                           for fid, key, feature, changedNames, geometryChanged
+                           in self._updated + self._committedUpdates.values()]
+        changes.deleted = list(self._deleted)
+        return changes
+
+
+def _snapshotFile(layer):
+    name = hashlib.md5(layer.source().encode("utf-8")).hexdigest()
+    folder = os.path.join(userFolder(), "snapshots")
+    if not os.path.exists(folder):
+        os.mkdir(folder)
+    return os.path.join(folder, name + ".json")
+
+
+def _featureHash(feature):
+    h = hashlib.md5()
+    geom = feature.geometry()
+    if geom is not None:
+        h.update(geom.asWkb())
+    for value in feature.attributes():
+        h.update(unicode(value).encode("utf-8"))
+        h.update("\0")
+    return h.hexdigest()
+
+
+def _featureKey(feature, keyField):
+    return unicode(feature[keyField]) if keyField is not None else str(feature.id())
+
+
+def computeSnapshot(layer, info):
+    keyField = info.get("keyField")
+    return {_featureKey(f, keyField): _featureHash(f) for f in layer.getFeatures()}
+
+
+def loadSnapshot(layer):
+    filename = _snapshotFile(layer)
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        return json.load(f)
+
+
+def saveSnapshot(layer, snapshot):
+    with open(_snapshotFile(layer), "w") as f:
+        json.dump(snapshot, f)
+
+
+def diffSnapshot(layer):
+    '''
+    Compares the current features of the layer with the last synced snapshot.
+    Returns a tuple with a FeatureChanges object and the new snapshot, or (None, None)
+    if there is no snapshot to compare with
+    '''
+    info = getTrackedLayerSyncInfo(layer)
+    snapshot = loadSnapshot(layer)
+    if info is None or snapshot is None:
+        return None, None
+    keyField = info.get("keyField")
+    changes = FeatureChanges()
+    current = {}
+    for feature in layer.getFeatures():
+        key = _featureKey(feature, keyField)
+        featureHash = _featureHash(feature)
+        current[key] = featureHash
+        if key not in snapshot:
+            changes.inserted.append(QgsFeature(feature))
+        elif snapshot[key] != featureHash:
+            changes.updated.append((feature.id(), feature[keyField] if keyField else None,
+                                    QgsFeature(feature), None, True))
+    for key in snapshot:
+        if key not in current:
+            if keyField is None:
+                changes.deleted.append((int(key), None))
+            else:
+                changes.deleted.append((None, key))
+    return changes, current
+
+
+class WfsTransaction(object):
+
+    def __init__(self, catalog, layer, info):
+        self.catalog = catalog
+        self.layer = layer
+        self.info = info
+        self._resolveTypeInfo()
+        self.url = catalog.gs_base_url + "wfs"
+
+    def _resolveTypeInfo(self):
+        '''Namespace and attribute names of the feature type are retrieved only the
+        first time the layer is synced, and stored along with the tracking info'''
+        info = self.info
+        if "namespace" not in info or "attributes" not in info:
+            name = info["typename"]
+            if info.get("workspace") is not None:
+                name = info["workspace"] + ":" + name
+            gslayer = self.catalog.get_layer(name)
+            if gslayer is None:
+                raise FeatureSyncError("Layer '%s' could not be found in the catalog" % name)
+            resource = gslayer.resource
+            info["workspace"] = resource.workspace.name
+            info["namespace"] = self.catalog.get_namespace(resource.workspace.name).uri
+            info["nativeName"] = resource.native_name or resource.name
+            info["attributes"] = list(resource.attributes)
+            setTrackedLayerSyncInfo(self.layer, info)
+        localNames = [f.name().lower() for f in self.layer.pendingFields()]
+        self.attributes = {a.lower(): a for a in info["attributes"]}
+        geomNames = [a for a in info["attributes"] if a.lower() not in localNames]
+        self.geometryName = geomNames[0] if geomNames else "the_geom"
+        self.prefix = info["workspace"]
+        self.typename = self.prefix + ":" + info["typename"]
+
+    def _serverFid(self, fid):
+        # GeoServer numbers shapefile records from 1, while QGIS uses 0-based fids.
+        # Only layers with hasServerFids are synced by fid
+        return "%s.%d" % (self.info["nativeName"], fid + 1)
+
+    def _filter(self, doc, items):
+        keyField = self.info.get("keyField")
+        filterElement = doc.createElementNS(OGC_NS, "ogc:Filter")
+        if keyField is None:
+            for fid, key in items:
+                featureId = doc.createElementNS(OGC_NS, "ogc:FeatureId")
+                featureId.setAttribute("fid", self._serverFid(fid))
+                filterElement.appendChild(featureId)
+        else:
+            parent = filterElement
+            if len(items) > 1:
+                parent = doc.createElementNS(OGC_NS, "ogc:Or")
+                filterElement.appendChild(parent)
+            for fid, key in items:
+                equal = doc.createElementNS(OGC_NS, "ogc:PropertyIsEqualTo")
+                propName = doc.createElementNS(OGC_NS, "ogc:PropertyName")
+                propName.appendChild(doc.createTextNode(self.attributes.get(keyField.lower(), keyField)))
+                literal = doc.createElementNS(OGC_NS, "ogc:Literal")
+                literal.appendChild(doc.createTextNode(unicode(key)))
+                equal.appendChild(propName)
+                equal.appendChild(literal)
+                parent.appendChild(equal)
+        return filterElement
+
+    def _geometry(self, doc, feature):
+        geom = feature.geometry()
+        if geom is None:
+            return None
+        gml = QgsOgcUtils.geometryToGML(geom, doc)
+        authid = self.layer.crs().authid()
+        if authid:
+            gml.setAttribute("srsName", authid)
+        return gml
+
+    def _value(self, value):
+        if value is None or (hasattr(value, "isNull") and value.isNull()):
+            return None
+        if isinstance(value, (QtCore.QDate, QtCore.QDateTime)):
+            return value.toString(QtCore.Qt.ISODate)
+        return unicode(value)
+
+    def _insert(self, doc, features):
+        insert = doc.createElementNS(WFS_NS, "wfs:Insert")
+        fields = self.layer.pendingFields()
+        for feature in features:
+            element = doc.createElement(self.typename)
+            gml = self._geometry(doc, feature)
+            if gml is not None:
+                geomElement = doc.createElement(self.prefix + ":" + self.geometryName)
+                geomElement.appendChild(gml)
+                element.appendChild(geomElement)
+            for i, field in enumerate(fields):
+                attrName = self.attributes.get(field.name().lower())
+                value = self._value(feature[i])
+                if attrName is None or value is None:
+                    continue
+                attr = doc.createElement(self.prefix + ":" + attrName)
+                attr.appendChild(doc.createTextNode(value))
+                element.appendChild(attr)
+            insert.appendChild(element)
+        return insert
+
+    def _property(self, doc, name, value=None, valueElement=None):
+        prop = doc.createElementNS(WFS_NS, "wfs:Property")
+        nameElement = doc.createElementNS(WFS_NS, "wfs:Name")
+        nameElement.appendChild(doc.createTextNode(name))
+        prop.appendChild(nameElement)
+        if value is not None or valueElement is not None:
+            valueNode = doc.createElementNS(WFS_NS, "wfs:Value")
+            if valueElement is not None:
+                valueNode.appendChild(valueElement)
+            else:
+                valueNode.appendChild(doc.createTextNode(value))
+            prop.appendChild(valueNode)
+        return prop
+
+    def _update(self, doc, fid, key, feature, changedNames, geometryChanged):
+        update = doc.createElementNS(WFS_NS, "wfs:Update")
+        update.setAttribute("typeName", self.typename)
+        fields = self.layer.pendingFields()
+        for i, field in enumerate(fields):
+            if changedNames is not None and field.name() not in changedNames:
+                continue
+            attrName = self.attributes.get(field.name().lower())
+            if attrName is not None:
+                update.appendChild(self._property(doc, attrName, self._value(feature[i])))
+        if geometryChanged:
+            update.appendChild(self._property(doc, self.geometryName,
+                                              valueElement=self._geometry(doc, feature)))
+        update.appendChild(self._filter(doc, [(fid, key)]))
+        return update
+
+    def _delete(self, doc, items):
+        delete = doc.createElementNS(WFS_NS, "wfs:Delete")
+        delete.setAttribute("typeName", self.typename)
+        delete.appendChild(self._filter(doc, items))
+        return delete
+
+    def transactionXml(self, inserted, updated, deleted):
+        doc = QDomDocument()
+        root = doc.createElementNS(WFS_NS, "wfs:Transaction")
+        root.setAttribute("service", "WFS")
+        root.setAttribute("version", "1.0.0")
+        root.setAttribute("xmlns:ogc", OGC_NS)
+        root.setAttribute("xmlns:gml", GML_NS)
+        root.setAttribute("xmlns:" + self.prefix, self.info["namespace"])
+        doc.appendChild(root)
+        if inserted:
+            root.appendChild(self._insert(doc, inserted))
+        for fid, key, feature, changedNames, geometryChanged in updated:
+            root.appendChild(self._update(doc, fid, key, feature, changedNames, geometryChanged))
+        if deleted:
+            root.appendChild(self._delete(doc, deleted))
+        return doc.toString()
+
+    def send(self, xml):
+        headers = {"Content-type": "text/xml"}
+        response, content = self.catalog.http.request(self.url, "POST", xml.encode("utf-8"), headers)
+        if response.status != 200:
+            raise FeatureSyncError("WFS-T request failed with status %d: %s" % (response.status, content))
+        try:
+            dom = XML(content)
+        except Exception, e:
+            raise FeatureSyncError("Wrong WFS-T response: %s" % content)
+        if dom.find(".//{%s}SUCCESS" % WFS_NS) is None:
+            message = dom.find(".//{%s}Message" % WFS_NS)
+            raise FeatureSyncError("WFS-T transaction failed: %s"
+                                   % (message.text if message is not None else content))
+
+    def push(self, changes, batchSize=None):
+        '''
+        Sends the changes in batches of a maximum of batchSize features per transaction.
+        Updates go first and inserts last. If features are identified by their fid, all deletes
+        are sent in a single transaction, since deleting records renumbers the ones after them
+        '''
+        batchSize = int(batchSize or pluginSetting("WfsTransactionBatchSize"))
+        for i in xrange(0, len(changes.updated), batchSize):
+            self.send(self.transactionXml([], changes.updated[i:i + batchSize], []))
+        deleteBatchSize = batchSize if self.info.get("keyField") else max(len(changes.deleted), 1)
+        for i in xrange(0, len(changes.deleted), deleteBatchSize):
+            self.send(self.transactionXml([], [], changes.deleted[i:i + deleteBatchSize]))
+        for i in xrange(0, len(changes.inserted), batchSize):
+            self.send(self.transactionXml(changes.inserted[i:i + batchSize], [], []))
+
+
+def pushChanges(catalog, layer, changes):
+    '''Sends the changes to the layer in the catalog and updates the snapshot of the layer, if any'''
+    info = getTrackedLayerSyncInfo(layer)
+    if info is None:
+        raise FeatureSyncError("Layer %s is not tracked or cannot be synced" % layer.name())
+    if not changes.isEmpty():
+        WfsTransaction(catalog, layer, info).push(changes)
+    if loadSnapshot(layer) is not None:
+        saveSnapshot(layer, computeSnapshot(layer, info))
+
+
+def syncLayerFromSnapshot(catalog, layer):
+    '''Sends the differences between the layer and its last synced snapshot.
+    Returns the number of features that were sent'''
+    changes, snapshot = diffSnapshot(layer)
+    if changes is None:
+        raise FeatureSyncError("There is no snapshot of layer %s to compare with" % layer.name())
+    info = getTrackedLayerSyncInfo(layer)
+    if not changes.isEmpty():
+        WfsTransaction(catalog, layer, info).push(changes)
+    saveSnapshot(layer, snapshot)
+    return changes.count()
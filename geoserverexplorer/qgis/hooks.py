@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module loads the algorithms used as pre-upload hooks and keeps the outputs
+they produce, so unchanged layers do not have to be preprocessed again.
+'''
+
+import os
+import json
+import hashlib
+from geoserverexplorer.qgis.utils import userFolder
+
+try:
+    from processing.modeler.ModelerAlgorithm import ModelerAlgorithm
+    from processing.script.ScriptAlgorithm import ScriptAlgorithm
+    from processing.modeler.ModelerUtils import ModelerUtils
+except Exception, e:
+    pass
+
+_algorithms = {}
+
+def _loadAlgorithm(hookFile):
+    if hookFile.endswith('py'):
+        script = ScriptAlgorithm(hookFile)
+        script.provider = ModelerUtils.providers['script']
+        return script
+    elif hookFile.endswith('model'):
+        model = ModelerAlgorithm()
+        model.openModel(hookFile)
+        model.provider = ModelerUtils.providers['model']
+        return model
+    else:
+        raise Exception ("Wrong hook file")
+
+def getHookAlgorithm(hookFile):
+    '''
+    Returns a new instance of the algorithm defined in a hook file. The file is
+    only parsed again if it has been modified since it was last loaded
+    '''
+    key = (hookFile, os.path.getmtime(hookFile))
+    if key not in _algorithms:
+        for oldKey in [k for k in _algorithms if k[0] == hookFile]:
+            del _algorithms[oldKey]
+        _algorithms[key] = _loadAlgorithm(hookFile)
+    return _algorithms[key].getCopy()
+
+def _updateWithFile(digest, filename):
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+def _layerContentHash(layer):
+    '''
+    Returns a hash of the files containing the data of a file-based layer,
+    including the sidecar files that share its base name, or None if the
+    layer is not file-based
+    '''
+    if layer.providerType() not in ("ogr", "gdal"):
+        return None
+    source = unicode(layer.source())
+    filename = source.split("|")[0]
+    if not os.path.isfile(filename):
+        return None
+    digest = hashlib.md5()
+    digest.update(source.encode("utf-8"))
+    if hasattr(layer, "subsetString"):
+        digest.update(layer.subsetString().encode("utf-8"))
+    folder = os.path.dirname(filename)
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    for f in sorted(os.listdir(folder)):
+        if os.path.splitext(f)[0] == basename:
+            _updateWithFile(digest, os.path.join(folder, f))
+    return digest.hexdigest()
+
+def _outputsFolder():
+    folder = os.path.join(userFolder(), "hookoutputs")
+    if not os.path.exists(folder):
+        os.mkdir(folder)
+    return folder
+
+def _readIndex():
+    try:
+        with open(os.path.join(_outputsFolder(), "index.json")) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def _writeIndex(index):
+    with open(os.path.join(_outputsFolder(), "index.json"), "w") as f:
+        json.dump(index, f)
+
+def _removeOutput(path):
+    folder = os.path.dirname(path)
+    basename = os.path.splitext(os.path.basename(path))[0]
+    for f in os.listdir(folder):
+        if os.path.splitext(f)[0] == basename:
+            try:
+                os.remove(os.path.join(folder, f))
+            except OSError:
+                pass
+
+def getHookOutput(hookFile, layer, extension):
+    '''
+    Returns the path where the output of running a hook on a layer is stored,
+    and whether that output has already been computed. The path depends on the
+    content of the layer files and of the hook file, so the hook is only run
+    again if any of them changes. Returns None as path if the output cannot be
+    cached, which is the case of layers that are not file-based
+    '''
+    contentHash = _layerContentHash(layer)
+    if contentHash is None:
+        return None, False
+    digest = hashlib.md5(contentHash)
+    _updateWithFile(digest, hookFile)
+    key = digest.hexdigest()
+    path = os.path.join(_outputsFolder(), "%s.%s" % (key, extension))
+    index = _readIndex()
+    return path, index.get(unicode(layer.source()) + "|" + hookFile) == key and os.path.exists(path)
+
+def setHookOutputComputed(hookFile, layer, path):
+    '''Records a hook output as computed, removing the previous output for the same layer and hook'''
+    index = _readIndex()
+    indexKey = unicode(layer.source()) + "|" + hookFile
+    key = os.path.splitext(os.path.basename(path))[0]
+    oldKey = index.get(indexKey)
+    if oldKey is not None and oldKey != key and oldKey not in [v for k, v in index.items() if k != indexKey]:
+        _removeOutput(os.path.join(_outputsFolder(), oldKey))
+    index[indexKey] = key
+    _writeIndex(index)
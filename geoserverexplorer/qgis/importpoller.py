@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import time
+from PyQt4 import QtGui, QtCore
+from qgis.gui import QgsMessageBar
+from geoserverexplorer import config
+from geoserverexplorer.qgis.utils import UserCanceledOperation
+from geoserverexplorer.geoserver.importer import FINAL_STATES
+from qgiscommons2.settings import pluginSetting
+
+class ImportPoller(object):
+    '''
+    Waits for a set of running importer sessions to finish, showing their
+    progress in the message bar along with a button to cancel them.
+
+    Sessions are polled from timer events, so the GUI stays responsive while
+    GeoServer ingests the data. The explorer is disabled meanwhile, so no other
+    operation is started before the import finishes. Sessions that do not finish
+    in the number of seconds set in the ImportTimeout setting are canceled
+    '''
+
+    def __init__(self, sessions, msg="Importing data into GeoServer", interval=1000):
+        self.sessions = sessions
+        self.msg = msg
+        self.interval = interval
+        self.timeout = float(pluginSetting("ImportTimeout"))
+        self.canceled = False
+        self.timedOut = False
+        self.error = None
+
+    def wait(self, progress=None):
+        '''
+        Returns once all sessions have finished, with a dict of task states for
+        each session id. progress, if passed, is called with the number of
+        finished tasks each time the sessions are polled.
+        Raises UserCanceledOperation if the user cancels the import, and an
+        exception if the import times out
+        '''
+        self.progressCallback = progress
+        self.start = time.time()
+        self.loop = QtCore.QEventLoop()
+        widget = config.iface.messageBar().createMessage(self.msg)
+        self.progressBar = QtGui.QProgressBar()
+        self.progressBar.setAlignment(QtCore.Qt.AlignLeft|QtCore.Qt.AlignVCenter)
+        widget.layout().addWidget(self.progressBar)
+        cancelButton = QtGui.QPushButton("Cancel")
+        cancelButton.clicked.connect(self.cancel)
+        widget.layout().addWidget(cancelButton)
+        config.iface.messageBar().pushWidget(widget, QgsMessageBar.INFO)
+        QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.ArrowCursor))
+        explorer = config.explorer
+        disabled = explorer is not None and explorer.isEnabled()
+        if disabled:
+            explorer.setEnabled(False)
+        try:
+            QtCore.QTimer.singleShot(0, self.poll)
+            self.loop.exec_()
+        finally:
+            if disabled:
+                explorer.setEnabled(True)
+            QtGui.QApplication.restoreOverrideCursor()
+            config.iface.messageBar().popWidget(widget)
+        if self.canceled or self.timedOut:
+            for session in self.sessions:
+                if not session.isFinished():
+                    session.cancel()
+        if self.canceled:
+            raise UserCanceledOperation()
+        if self.timedOut:
+            raise Exception("The import did not finish in %i seconds and was canceled" % self.timeout)
+        if self.error is not None:
+            raise self.error
+        return {session.id: session.tasks for session in self.sessions}
+
+    def cancel(self):
+        self.canceled = True
+        self.loop.quit()
+
+    def poll(self):
+        if self.canceled:
+            return
+        try:
+            value, maximum, finished = 0, 0, 0
+            for session in self.sessions:
+                states = session.refresh()
+                sessionValue, sessionMaximum = session.progress()
+                value += sessionValue
+                maximum += sessionMaximum
+                finished += len([s for s in states.values() if s in FINAL_STATES])
+        except Exception, e:
+            self.error = e
+            self.loop.quit()
+            return
+        self.progressBar.setMaximum(maximum)
+        self.progressBar.setValue(value)
+        if self.progressCallback is not None:
+            self.progressCallback(finished)
+        if all(session.isFinished() for session in self.sessions):
+            self.loop.quit()
+        elif self.timeout > 0 and time.time() - self.start > self.timeout:
+            self.timedOut = True
+            self.loop.quit()
+        else:
+            # polls are not overlapped, in case a request takes longer than the interval
+            QtCore.QTimer.singleShot(self.interval, self.poll)
@@ -3,8 +3,10 @@
 # (c) 2016 Boundless, http://boundlessgeo.com
 # This code is licensed under the GPL 2.0 license.
 #
+import os
 from qgis.core import *
 from geoserverexplorer import config
+from geoserverexplorer.geoserver.util import mapPath
 
 ALL_TYPES = -1
 
@@ -41,4 +43,84 @@ def getGroups():
             groups[groupName] = [QgsMapLayerRegistry.instance().mapLayer(layerid) for layerid in groupLayers]
     return groups
 
+def getLayerMetadata(layer, name):
+    '''
+    Returns the title and the abstract to publish a layer with, given the name
+    it is published with. The title defaults to the name, and the abstract is
+    None if the layer has none
+    '''
+    return layer.title() or name, layer.abstract() or None
+
+def getServerPath(layer, mappings):
+    '''
+    Returns the path to the data of a layer as seen by the server, if it is a
+    file that the server can read directly from a folder shared with it,
+    according to a list of (local prefix, server prefix) path mappings.
+    Returns None otherwise
+    '''
+    if not mappings:
+        return None
+    source = unicode(layer.source()).split("|")[0]
+    extension = os.path.splitext(source)[1].lower()
+    if layer.type() == layer.RasterLayer:
+        if layer.providerType() != "gdal" or extension not in (".tif", ".tiff"):
+            return None
+    elif layer.providerType() != "ogr" or extension not in (".shp", ".gpkg"):
+        return None
+    return mapPath(source, mappings)
+
+_transforms = {}
+
+def _transformToWgs84(crs):
+    '''
+    Returns a transform from the given CRS to EPSG:4326. Transforms are cached
+    per CRS, so layers sharing a CRS reuse the same one
+    '''
+    key = crs.toWkt()
+    if key not in _transforms:
+        _transforms[key] = QgsCoordinateTransform(crs, QgsCoordinateReferenceSystem("EPSG:4326"))
+    return _transforms[key]
+
+def getLayerBoundingBoxes(layer):
+    '''
+    Returns the native and the lat/lon bounding boxes of a layer, as
+    (minx, maxx, miny, maxy, crs) tuples, and the SRS of the layer.
+    The SRS is None if the layer CRS has no authority identifier, and the
+    lat/lon bounding box is None if the extent cannot be transformed
+    '''
+    crs = layer.crs()
+    srs = crs.authid() or None
+    extent = layer.extent()
+    native = (extent.xMinimum(), extent.xMaximum(),
+              extent.yMinimum(), extent.yMaximum(), srs)
+    wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+    if crs == wgs84:
+        latlon = native[:4] + ("EPSG:4326",)
+    else:
+        try:
+            extent = _transformToWgs84(crs).transformBoundingBox(extent)
+            latlon = (extent.xMinimum(), extent.xMaximum(),
+                      extent.yMinimum(), extent.yMaximum(), "EPSG:4326")
+        except QgsCsException:
+            latlon = None
+    return native, latlon, srs
+
+def getGroupBounds(layers):
+    '''
+    Returns the lat/lon bounding box of a set of layers, as a tuple of strings
+    (minx, maxx, miny, maxy, crs), ready to be used as bounds of a layer group
+    '''
+    bounds = None
+    for layer in layers:
+        latlon = getLayerBoundingBoxes(layer)[1]
+        if latlon is None:
+            continue
+        if bounds is None:
+            bounds = list(latlon[:4])
+        else:
+            bounds = [min(bounds[0], latlon[0]), max(bounds[1], latlon[1]),
+                      min(bounds[2], latlon[2]), max(bounds[3], latlon[3])]
+    if bounds is None:
+        return None
+    return (str(bounds[0]), str(bounds[1]), str(bounds[2]), str(bounds[3]), "EPSG:4326")
 
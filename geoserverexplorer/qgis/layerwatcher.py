@@ -5,7 +5,7 @@
 #
 from geoserverexplorer.qgis.utils import isTrackedLayer
 from geoserverexplorer.qgis import uri as uri_utils
-from geoserverexplorer.qgis.sldadapter import adaptGsToQgs
+from geoserverexplorer.qgis.sldadapter import setLayerSld
 from qgis.core import *
 from qgis.gui import *
 from qgis.utils import iface
@@ -13,19 +13,33 @@ from geoserverexplorer.qgis.utils import readTrackedLayers
 from functools import partial
 from PyQt4 import QtCore, QtGui
 from geoserverexplorer.qgis.utils import getTrackingInfo, removeTrackedLayer
+from geoserverexplorer.qgis import featuresync
 from geoserver.catalog import Catalog
-from geoserverexplorer.qgis.catalog import CatalogWrapper
+from geoserverexplorer.qgis.catalog import CatalogWrapper, getQgisStyle
 from qgiscommons2.settings import pluginSetting
-from qgiscommons2.files import tempFilename
 
 _explorer = None
 
+# the slots connected to the signals of each layer, as (signal name, slot) tuples
+# by layer id, so they can be disconnected when the plugin is unloaded
+_connections = {}
+
+def _connect(layer, signal, slot):
+    getattr(layer, signal).connect(slot)
+    _connections.setdefault(layer.id(), []).append((signal, slot))
+
 def layerAdded(qgislayer):
     try:
-        qgislayer.styleChanged.connect(partial(updatePublishedStyle, qgislayer))
+        _connect(qgislayer, "styleChanged", partial(updatePublishedStyle, qgislayer))
     except: #styleChanged only available for QGIS >2.16
         pass
 
+    if qgislayer.type() == QgsMapLayer.VectorLayer:
+        _connect(qgislayer, "beforeCommitChanges", partial(captureLayerEdits, qgislayer))
+        for signal, method in _COMMIT_SIGNALS:
+            _connect(qgislayer, signal, partial(recordCommittedEdits, qgislayer, method))
+        _connect(qgislayer, "editingStopped", partial(syncLayerEdits, qgislayer))
+
     try:
         if qgislayer.providerType().lower() != "wfs":
             return
@@ -38,12 +52,7 @@ def layerAdded(qgislayer):
                 uri = uri_utils.layerUri(layer)
                 if uri == qgislayer.source():
                     try:
-                        sld = layer.default_style.sld_body
-                        sld = adaptGsToQgs(sld)
-                        sldfile = tempFilename("sld")
-                        with open(sldfile, 'w') as f:
-                            f.write(sld)
-                        msg, ok = qgislayer.loadSldStyle(sldfile)
+                        ok = setLayerSld(qgislayer, getQgisStyle(cat, layer.default_style))
                         if not ok:
                             raise Exception("Could not load style for layer <b>%s</b>" % qgislayer.name())
                     except Exception, e:
@@ -91,11 +100,109 @@ def updatePublishedStyle(layer):
             #iface.messageBar().widgetRemoved.connect(_resetCurrentMessageBarLayer)
 
 
+_pendingChanges = {}
+
+# signals emitted by a layer for each part of a commit that is written to its provider,
+# and the methods of CommittedChanges that record them
+_COMMIT_SIGNALS = [("committedAttributesAdded", "attributesChanged"),
+                   ("committedAttributesDeleted", "attributesChanged"),
+                   ("committedFeaturesAdded", "featuresAdded"),
+                   ("committedFeaturesRemoved", "featuresRemoved"),
+                   ("committedAttributeValuesChanges", "attributeValuesChanged"),
+                   ("committedGeometriesChanges", "geometriesChanged")]
+
+def _canSyncLayer(layer):
+    url = getTrackingInfo(layer)
+    return url is not None and featuresync.canSyncLayer(layer, _catalogFromUrl(url))
+
+def captureLayerEdits(layer):
+    if not pluginSetting("SyncLayerData") or not _canSyncLayer(layer):
+        return
+    if layer.id() not in _pendingChanges:
+        _pendingChanges[layer.id()] = featuresync.CommittedChanges(layer)
+    _pendingChanges[layer.id()].capture(featuresync.captureEditBuffer(layer))
+
+def recordCommittedEdits(layer, method, layerId, committed):
+    if layer.id() in _pendingChanges:
+        getattr(_pendingChanges[layer.id()], method)(committed)
+
+def _catalogFromUrl(url):
+    for cat in _explorer.explorerTree.gsItem._catalogs.values():
+        if cat.service_url == url:
+            return cat
+    return Catalog(url)
+
+def syncLayerEdits(layer):
+    if layer.id() not in _pendingChanges:
+        return
+    edits = _pendingChanges.pop(layer.id())
+    if edits.structureChanged:
+        iface.messageBar().pushMessage("Warning", "The structure of layer <b>%s</b> has changed. "
+                                       "It has to be published again to update it in the GeoServer catalog" % layer.name(),
+                                       level = QgsMessageBar.WARNING,
+                                       duration = 10)
+        return
+    changes = edits.changes()
+    if changes.isEmpty():
+        return
+    try:
+        catalog = _catalogFromUrl(getTrackingInfo(layer))
+        featuresync.pushChanges(catalog, layer, changes)
+        iface.messageBar().pushMessage("Info", "%i edited features of layer <b>%s</b> were synchronized with the GeoServer catalog"
+                                       % (changes.count(), layer.name()),
+                                       level = QgsMessageBar.INFO,
+                                       duration = 5)
+    except Exception, e:
+        iface.messageBar().pushMessage("Warning", "Could not synchronize edits of layer <b>%s</b>: %s"
+                                       % (layer.name(), unicode(e)),
+                                       level = QgsMessageBar.WARNING,
+                                       duration = 10)
+
+def syncActiveLayerData():
+    '''Sends the differences between the active layer and its last synced snapshot'''
+    layer = iface.activeLayer()
+    if layer is None or not _canSyncLayer(layer) or featuresync.loadSnapshot(layer) is None:
+        iface.messageBar().pushMessage("Warning", "The selected layer is not a tracked layer with a snapshot to synchronize",
+                                       level = QgsMessageBar.WARNING,
+                                       duration = 10)
+        return
+    QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
+    try:
+        catalog = _catalogFromUrl(getTrackingInfo(layer))
+        count = featuresync.syncLayerFromSnapshot(catalog, layer)
+        iface.messageBar().pushMessage("Info", "%i features of layer <b>%s</b> were synchronized with the GeoServer catalog"
+                                       % (count, layer.name()),
+                                       level = QgsMessageBar.INFO,
+                                       duration = 5)
+    except Exception, e:
+        iface.messageBar().pushMessage("Warning", "Could not synchronize layer <b>%s</b>: %s"
+                                       % (layer.name(), unicode(e)),
+                                       level = QgsMessageBar.WARNING,
+                                       duration = 10)
+    finally:
+        QtGui.QApplication.restoreOverrideCursor()
+
+
+def layerWillBeRemoved(layerId):
+    _connections.pop(layerId, None)
+    _pendingChanges.pop(layerId, None)
+
+
 def connectLayerWasAdded(explorer):
     global _explorer
     _explorer = explorer
     QgsMapLayerRegistry.instance().layerWasAdded.connect(layerAdded)
+    QgsMapLayerRegistry.instance().layerWillBeRemoved.connect(layerWillBeRemoved)
     readTrackedLayers()
 
 def disconnectLayerWasAdded():
-    QgsMapLayerRegistry.instance().layerWasAdded.disconnect(layerAdded)
+    registry = QgsMapLayerRegistry.instance()
+    registry.layerWasAdded.disconnect(layerAdded)
+    registry.layerWillBeRemoved.disconnect(layerWillBeRemoved)
+    for layerId, connections in _connections.items():
+        layer = registry.mapLayer(layerId)
+        if layer is not None:
+            for signal, slot in connections:
+                getattr(layer, signal).disconnect(slot)
+    _connections.clear()
+    _pendingChanges.clear()
@@ -14,6 +14,8 @@ from PyQt4.QtXml import *
 from qgiscommons2.settings import pluginSetting
 from qgis.core import *
 import math
+import hashlib
+from geoserverexplorer.qgis import stylecache
 
 
 SIZE_FACTOR = 4
@@ -53,38 +55,9 @@ def setScaleFactor():
         if pluginSetting("SldScaleFactor"):
             SIZE_FACTOR = pluginSetting("SldScaleFactor")
 
-def adaptQgsToGs(sld, layer):
-    if layer.type() != QgsMapLayer.VectorLayer:
-        return sld, []
-    
-    setScaleFactor()
-
-    sld = sld.replace("se:SvgParameter","CssParameter")
-    sld = sld.replace("1.1.","1.0.")
-    sld = sld.replace("\t","")
-    sld = sld.replace("\n","")
-    sld = re.sub("\s\s+" , " ", sld)
-    sld = re.sub("<ogc:Filter>[ ]*?<ogc:Filter>","<ogc:Filter>", sld)
-    sld = re.sub("</ogc:Filter>[ ]*?</ogc:Filter>","</ogc:Filter>", sld)
-    if layer.hasScaleBasedVisibility():
-        s = ("<MinScaleDenominator>" + str(layer.minimumScale()) +
-        "</MinScaleDenominator><MaxScaleDenominator>" + str(layer.maximumScale()) + "</MaxScaleDenominator>")
-        sld = sld.replace("<se:Rule>", "<se:Rule>" + s)
-    labeling = layer.customProperty("labeling/enabled")
-    labeling = str(labeling).lower() == str(True).lower()
-    if labeling:
-        s = getLabelingAsSld(layer)
-        sld = sld.replace("<se:Rule>", "<se:Rule>" + s)
-    sld = sld.replace("se:", "sld:")
-    dasharrays = re.findall('<CssParameter name="stroke-dasharray">.*?</CssParameter>', sld)
-    for arr in dasharrays:
-        newpattern = " ".join([str(int(math.floor(float(i) * SIZE_FACTOR))) for i in arr[38:-15].strip().split(" ")])
-        newdasharrays='<CssParameter name="stroke-dasharray">%s</CssParameter>' % newpattern
-        sld = sld.replace(arr, newdasharrays)
-    #//replace "native" SLD symbols
-    wknReplacements = {}
-    if layer.geometryType() == QGis.Point:
-        wknReplacements = {"regular_star":"star",
+# replacements for the well-known names of QGIS symbols that are not
+# supported by GeoServer, depending on the geometry type of the layer
+POINT_WKN_REPLACEMENTS = {"regular_star":"star",
                        "cross2": "x",
                        "equilateral_triangle": "triangle",
                        "rectangle": "square",
@@ -92,25 +65,106 @@ def adaptQgsToGs(sld, layer):
                        "line": "shape://vertline",
                        "arrow": "ttf://Wingdings#0xE9",
                        "diamond": "ttf://Wingdings#0x75"}
-    if layer.geometryType() == QGis.Polygon:
-        wknReplacements = {"horline":"shape://horline",
+POLYGON_WKN_REPLACEMENTS = {"horline":"shape://horline",
                        "vertline":"shape://vertline",
                        "cross":"shape://plus",
                        "slash":"shape://slash",
                        "backslash":"shape://backslash",
                        "x": "shape://times"}
-    for key,value in wknReplacements.iteritems():
-        sld = sld.replace("<sld:WellKnownName>%s</sld:WellKnownName>" % key,
-                      "<sld:WellKnownName>%s</sld:WellKnownName>" % value)
-
-    fontmarkers = re.findall('<sld:OnlineResource xlink:type=".*?"/> <sld:Format>ttf</sld:Format> <sld:MarkIndex>.*?</sld:MarkIndex>', sld)
-    for arr in fontmarkers:
-        police = re.findall('xlink:href=".*?"/>', arr)
-        policeValue=police[0][12:-3]
-        markerIndex = re.findall('<sld:MarkIndex>.*?</sld:MarkIndex>', arr)
-        markerIndexValue=markerIndex[0][15:-16]
-        sld = sld.replace(arr, '<WellKnownName>'+policeValue+'#'+hex(int(markerIndexValue))+'</WellKnownName>')
-        
+
+# the conversion is done in three passes over the SLD, each of them with a single
+# compiled pattern that matches all the elements to replace at that stage
+_NORMALIZE_PATTERN = re.compile(r"se:SvgParameter|1\.1\.|\s+")
+_RENAME_PATTERN = re.compile(r"<ogc:Filter>[ ]*?<ogc:Filter>|</ogc:Filter>[ ]*?</ogc:Filter>|<se:Rule>|se:")
+_SYMBOLS_PATTERN = re.compile(r'(?P<dasharray><CssParameter name="stroke-dasharray">(?P<pattern>.*?)</CssParameter>)'
+                              r'|<sld:WellKnownName>(?P<wkn>[^<]*)</sld:WellKnownName>'
+                              r'|(?P<fontmarker><sld:OnlineResource xlink:type=".*?"/> <sld:Format>ttf</sld:Format> '
+                              r'<sld:MarkIndex>.*?</sld:MarkIndex>)')
+_FONT_HREF_PATTERN = re.compile('xlink:href="(.*?)"/>')
+_MARK_INDEX_PATTERN = re.compile('<sld:MarkIndex>(.*?)</sld:MarkIndex>')
+
+def _normalize(match):
+    token = match.group(0)
+    if token == "se:SvgParameter":
+        return "CssParameter"
+    elif token == "1.1.":
+        return "1.0."
+    # tabs and line breaks are removed, and the remaining runs of whitespace collapsed
+    token = token.replace("\t", "").replace("\n", "")
+    return " " if len(token) > 1 else token
+
+def convertQgsSld(sld, rulePrefix="", wknReplacements=None, iconNames=None, sizeFactor=None):
+    '''
+    Converts the SLD 1.1 produced by QGIS into SLD 1.0 that GeoServer can use.
+
+    rulePrefix is added at the beginning of each rule, wknReplacements maps
+    well-known names of marks to the ones to use instead, and iconNames maps the
+    paths of the SVG icons in the SLD to the names of their uploaded copies.
+    Sizes of dash arrays are multiplied by sizeFactor, which defaults to SIZE_FACTOR
+    '''
+    sizeFactor = SIZE_FACTOR if sizeFactor is None else sizeFactor
+    wknReplacements = wknReplacements or {}
+    rulePrefix = "<sld:Rule>" + rulePrefix.replace("se:", "sld:")
+
+    def rename(match):
+        token = match.group(0)
+        if token == "se:":
+            return "sld:"
+        elif token == "<se:Rule>":
+            return rulePrefix
+        elif token.startswith("</"):
+            return "</ogc:Filter>"
+        else:
+            return "<ogc:Filter>"
+
+    def replaceSymbol(match):
+        if match.group("dasharray") is not None:
+            pattern = " ".join([str(int(math.floor(float(i) * sizeFactor)))
+                                for i in match.group("pattern").strip().split(" ")])
+            return '<CssParameter name="stroke-dasharray">%s</CssParameter>' % pattern
+        elif match.group("fontmarker") is not None:
+            fontmarker = match.group("fontmarker")
+            font = _FONT_HREF_PATTERN.search(fontmarker).group(1)
+            index = _MARK_INDEX_PATTERN.search(fontmarker).group(1)
+            return '<WellKnownName>' + font + '#' + hex(int(index)) + '</WellKnownName>'
+        else:
+            wkn = match.group("wkn")
+            if wkn in wknReplacements:
+                return "<sld:WellKnownName>%s</sld:WellKnownName>" % wknReplacements[wkn]
+            return match.group(0)
+
+    sld = _NORMALIZE_PATTERN.sub(_normalize, sld)
+    sld = _RENAME_PATTERN.sub(rename, sld)
+    sld = _SYMBOLS_PATTERN.sub(replaceSymbol, sld)
+    if iconNames:
+        # longest paths first, so absolute paths are not partially replaced
+        paths = sorted(iconNames, key=len, reverse=True)
+        iconPattern = re.compile("|".join(re.escape(path) for path in paths))
+        sld = iconPattern.sub(lambda match: iconNames[match.group(0)], sld)
+    return sld
+
+def adaptQgsToGs(sld, layer):
+    if layer.type() != QgsMapLayer.VectorLayer:
+        return sld, []
+
+    setScaleFactor()
+
+    rulePrefix = ""
+    labeling = layer.customProperty("labeling/enabled")
+    labeling = str(labeling).lower() == str(True).lower()
+    if labeling:
+        rulePrefix += getLabelingAsSld(layer)
+    if layer.hasScaleBasedVisibility():
+        rulePrefix += ("<MinScaleDenominator>" + str(layer.minimumScale()) +
+        "</MinScaleDenominator><MaxScaleDenominator>" + str(layer.maximumScale()) + "</MaxScaleDenominator>")
+
+    #//replace "native" SLD symbols
+    wknReplacements = {}
+    if layer.geometryType() == QGis.Point:
+        wknReplacements = POINT_WKN_REPLACEMENTS
+    if layer.geometryType() == QGis.Polygon:
+        wknReplacements = POLYGON_WKN_REPLACEMENTS
+
     icons = []
     renderer = layer.rendererV2()
     if isinstance(renderer, QgsSingleSymbolRendererV2):
@@ -121,44 +175,74 @@ def adaptQgsToGs(sld, layer):
     elif isinstance(renderer, QgsGraduatedSymbolRendererV2):
         for ran in renderer.ranges():
             icons.extend(getReadyToUploadSvgIcons(ran.symbol()))
+    # symbols sharing an icon with the same parameters produce a single icon
+    uniqueIcons, names = [], set()
+    for icon in icons:
+        if icon[1] not in names:
+            names.add(icon[1])
+            uniqueIcons.append(icon)
+    icons = uniqueIcons
 
-
+    # paths of the icons relative to each of the SVG folders. When several
+    # icons are created from the same file, the first one is used
+    iconNames = {}
     for icon in icons:
         for path in QgsApplication.svgPaths():
             path = os.path.normpath(path)
             if path[-1] != os.sep:
                 path += os.sep
             relPath = os.path.normpath(icon[0]).replace(path, "").replace("\\", "/")
-            sld = sld.replace(relPath, icon[1])
+            iconNames.setdefault(relPath, icon[1])
 
+    sld = convertQgsSld(sld, rulePrefix, wknReplacements, iconNames)
     return sld, icons
 
+def _iconName(filename, ext, svg):
+    # icons are named after their content, so the same icon always gets the
+    # same name and an icon with a given name never has to be uploaded again
+    if isinstance(svg, unicode):
+        svg = svg.encode("utf-8")
+    return "%s_%s%s" % (filename, hashlib.md5(svg).hexdigest(), ext)
+
+# SVG files with their parameters replaced by the colors and width of each
+# symbol, keyed by path and modification time. Each template holds the
+# fragments of the file between its parameters and the icons already
+# generated from it
+_svgTemplates = {}
+_SVG_PARAM_PATTERN = re.compile(r'param\((outline|fill|outline-width)\).*?\"')
+_SVG_PARAM_PROPS = {"outline": "outline_color", "fill": "color", "outline-width": "outline_width"}
+
+def _svgTemplate(path):
+    key = (path, os.path.getmtime(path))
+    if key not in _svgTemplates:
+        for oldKey in [k for k in _svgTemplates if k[0] == path]:
+            del _svgTemplates[oldKey]
+        with open(path) as f:
+            svg = f.read()
+        _svgTemplates[key] = (_SVG_PARAM_PATTERN.split(svg), {})
+    return _svgTemplates[key]
+
+def _svgIcon(path, props):
+    fragments, icons = _svgTemplate(path)
+    params = fragments[1::2]
+    values = tuple(props[_SVG_PARAM_PROPS[param]] for param in params)
+    if values not in icons:
+        svg = []
+        for i, fragment in enumerate(fragments):
+            svg.append(fragment if i % 2 == 0 else values[i // 2] + '"')
+        svg = "".join(svg)
+        filename, ext = os.path.splitext(os.path.basename(path))
+        icons[values] = [path, _iconName(filename, ext, svg), svg]
+    return icons[values]
+
 def getReadyToUploadSvgIcons(symbol):
     icons = []
     for i in xrange(symbol.symbolLayerCount()):
         sl = symbol.symbolLayer(i)
         if isinstance(sl, QgsSvgMarkerSymbolLayerV2):
-            props = sl.properties()
-            with open(sl.path()) as f:
-                svg = "".join(f.readlines())
-            svg = re.sub(r'param\(outline\).*?\"', props["outline_color"] + '"', svg)
-            svg = re.sub(r'param\(fill\).*?\"', props["color"] + '"', svg)
-            svg = re.sub(r'param\(outline-width\).*?\"', props["outline_width"] + '"', svg)
-            basename = os.path.basename(sl.path())
-            filename, ext = os.path.splitext(basename)
-            propsHash = hash(frozenset(props.items()))
-            icons.append ([sl.path(), "%s_%s%s" % (filename, propsHash, ext), svg])
+            icons.append(_svgIcon(sl.path(), sl.properties()))
         elif isinstance(sl, QgsSVGFillSymbolLayer):
-            props = sl.properties()
-            with open(sl.svgFilePath()) as f:
-                svg = "".join(f.readlines())
-            svg = re.sub(r'param\(outline\).*?\"', props["outline_color"] + '"', svg)
-            svg = re.sub(r'param\(fill\).*?\"', props["color"] + '"', svg)
-            svg = re.sub(r'param\(outline-width\).*?\"', props["outline_width"] + '"', svg)
-            basename = os.path.basename(sl.svgFilePath())
-            filename, ext = os.path.splitext(basename)
-            propsHash = hash(frozenset(props.items()))
-            icons.append ([sl.svgFilePath(), "%s_%s%s" % (filename, propsHash, ext), svg])
+            icons.append(_svgIcon(sl.svgFilePath(), sl.properties()))
         elif isinstance(sl, QgsMarkerLineSymbolLayerV2):
             return getReadyToUploadSvgIcons(sl.subSymbol())
     return icons
@@ -236,10 +320,69 @@ def adaptGsToQgs(sld):
         sld = sld.replace(w, newwidth)
     return sld
 
+_SCALE_DENOMINATOR_PATTERN = re.compile(r"<((?:sld:)?)(Min|Max)ScaleDenominator>([^<]*)</\1\2ScaleDenominator>")
+_RULE_PATTERN = re.compile(r"(<sld:Rule>)(.*?)(</sld:Rule>)", re.DOTALL)
+_SYMBOLIZER_PATTERN = re.compile(r"<sld:\w+Symbolizer\b")
+
+def setScaleRange(sld, minScale=None, maxScale=None):
+    '''
+    Limits the range of scale denominators of all the rules in an SLD adapted for
+    GeoServer. The range of each rule is the intersection of the range it already
+    had and the passed one. None means no limit
+    '''
+    def limitRule(match):
+        body = match.group(2)
+        ruleMin, ruleMax = minScale, maxScale
+        for prefix, bound, value in _SCALE_DENOMINATOR_PATTERN.findall(body):
+            value = float(value)
+            if bound == "Min":
+                ruleMin = value if ruleMin is None else max(ruleMin, value)
+            else:
+                ruleMax = value if ruleMax is None else min(ruleMax, value)
+        # denominators go after the filter of the rule and before its symbolizers
+        existing = _SCALE_DENOMINATOR_PATTERN.search(body)
+        symbolizer = _SYMBOLIZER_PATTERN.search(body)
+        position = existing.start() if existing else symbolizer.start() if symbolizer else len(body)
+        s = ""
+        if ruleMin is not None:
+            s += "<sld:MinScaleDenominator>" + str(ruleMin) + "</sld:MinScaleDenominator>"
+        if ruleMax is not None:
+            s += "<sld:MaxScaleDenominator>" + str(ruleMax) + "</sld:MaxScaleDenominator>"
+        body = body[:position] + s + _SCALE_DENOMINATOR_PATTERN.sub("", body[position:])
+        return match.group(1) + body + match.group(3)
+    return _RULE_PATTERN.sub(limitRule, sld)
+
+def setLayerSld(layer, sld):
+    '''
+    Sets the style of a layer from an SLD string, without writing it to a file.
+    Returns True if the style could be loaded
+    '''
+    document = QDomDocument()
+    ok, errorMsg, line, column = document.setContent(sld, True)
+    if not ok:
+        return False
+    namedLayer = document.firstChildElement("StyledLayerDescriptor").firstChildElement("NamedLayer")
+    if namedLayer.isNull():
+        return False
+    errorMsg = ""
+    return layer.readSld(namedLayer, errorMsg)
+
 def getGsCompatibleSld(layer):
+    '''
+    Returns the SLD of a layer, ready to be uploaded to GeoServer, and the SVG
+    icons it uses. The result is cached, and only computed again if the style
+    settings of the layer change
+    '''
+    fingerprint = stylecache.styleFingerprint(layer)
+    cached = stylecache.getCachedSld(fingerprint)
+    if cached is not None:
+        return cached
     sld = getStyleAsSld(layer)
     if sld is not None:
-        return adaptQgsToGs(sld, layer)
+        sld, icons = adaptQgsToGs(sld, layer)
+        if fingerprint is not None:
+            stylecache.setCachedSld(fingerprint, sld, icons)
+        return sld, icons
     else:
         return None, None
 
@@ -274,14 +417,13 @@ def getStyleAsSld(layer):
             sld =  RASTER_SLD_TEMPLATE.replace("SYMBOLIZER_CODE", symbolizerCode).replace("STYLE_NAME", layer.name())
             return sld
         elif isinstance(renderer, QgsSingleBandPseudoColorRenderer):
-            symbolizerCode = "<ColorMap>"
             band = renderer.usesBands()[0]
-            items = renderer.shader().rasterShaderFunction().colorRampItemList()
-            for item in items:
-                color = item.color
-                rgb = '#%02x%02x%02x' % (color.red(), color.green(), color.blue())
-                symbolizerCode += '<ColorMapEntry color="' + rgb + '" quantity="' + unicode(item.value) + '" />'
-            symbolizerCode += "</ColorMap>"
+            shader = renderer.shader().rasterShaderFunction()
+            items = [(item.value, (item.color.red(), item.color.green(), item.color.blue()))
+                     for item in shader.colorRampItemList()]
+            rampType = {QgsColorRampShader.DISCRETE: "intervals",
+                        QgsColorRampShader.EXACT: "values"}.get(shader.colorRampType(), "ramp")
+            symbolizerCode = buildColorMap(items, rampType, pluginSetting("CompactColorMaps"))
             sld =  RASTER_SLD_TEMPLATE.replace("SYMBOLIZER_CODE", symbolizerCode).replace("STYLE_NAME", layer.name())
             return sld
         else:
@@ -297,6 +439,67 @@ def getStyleAsSld(layer):
     else:
         return None
 
+def _compactRamp(items):
+    # removes the stops of an interpolated ramp that lie on the line between
+    # the stops around them, up to color rounding. For each run of removed
+    # stops, the range of slopes that keeps all of them within half a unit of
+    # their color is tracked, so each stop is only checked once
+    compacted = [items[0]]
+    last = None
+    for item in items[1:]:
+        if last is not None:
+            anchor = compacted[-1]
+            dvLast = last[0] - anchor[0]
+            dv = item[0] - anchor[0]
+            if dvLast > 0 and item[0] > last[0]:
+                newLows = [max(lo, (c - a - 0.5) / dvLast) for lo, c, a in zip(lows, last[1], anchor[1])]
+                newHighs = [min(hi, (c - a + 0.5) / dvLast) for hi, c, a in zip(highs, last[1], anchor[1])]
+                slopes = [(c - a) / dv for c, a in zip(item[1], anchor[1])]
+                if all(lo <= slope <= hi for slope, lo, hi in zip(slopes, newLows, newHighs)):
+                    lows, highs, last = newLows, newHighs, item
+                    continue
+            compacted.append(last)
+        lows = [float("-inf")] * 3
+        highs = [float("inf")] * 3
+        last = item
+    if last is not None:
+        compacted.append(last)
+    return compacted
+
+def _compactIntervals(items):
+    # consecutive intervals with the same color are merged into the last one
+    compacted = []
+    for i, item in enumerate(items):
+        if i + 1 < len(items) and items[i + 1][1] == item[1]:
+            continue
+        compacted.append(item)
+    return compacted
+
+def buildColorMap(items, rampType="ramp", compact=False):
+    '''
+    Returns the ColorMap element of an SLD raster symbolizer, as a string.
+
+    items is a list of (value, (red, green, blue)) tuples, and rampType is the
+    type of the color map ("ramp", "intervals" or "values"). If compact is
+    True, the type is written and redundant entries are removed, producing the
+    same colors: stops of a ramp that lie on the line between their neighbours
+    and consecutive intervals with the same color
+    '''
+    items = [(float(value), color) for value, color in items]
+    if compact and items:
+        if rampType == "ramp":
+            items = _compactRamp(items)
+        elif rampType == "intervals":
+            items = _compactIntervals(items)
+    if compact and rampType != "ramp":
+        code = ['<ColorMap type="%s">' % rampType]
+    else:
+        code = ["<ColorMap>"]
+    for value, color in items:
+        code.append('<ColorMapEntry color="#%02x%02x%02x" quantity="%s" />' % (color + (unicode(value),)))
+    code.append("</ColorMap>")
+    return "".join(code)
+
 def getGeomTypeFromSld(sld):
     if "PointSymbolizer" in sld:
         return "Point"
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module keeps track of the styles generated for QGIS layers and of the
+styles uploaded to each catalog, so unchanged styles are not converted or
+uploaded again.
+
+Styles are identified by a fingerprint of the settings of the layer that the
+SLD depends on: its renderer, its labeling and its scale-based visibility, along
+with the plugin settings and the SVG files used to generate the SLD and its icons.
+'''
+
+import os
+import hashlib
+from xml.etree import ElementTree
+from PyQt4.QtXml import QDomDocument
+from qgis.core import QgsMapLayer, QgsSingleSymbolRendererV2, QgsCategorizedSymbolRendererV2, \
+    QgsGraduatedSymbolRendererV2, QgsSvgMarkerSymbolLayerV2, QgsSVGFillSymbolLayer, \
+    QgsMarkerLineSymbolLayerV2
+from qgiscommons2.settings import pluginSetting
+
+_slds = {}
+_uploaded = {}
+_converted = {}
+
+def _symbols(layer):
+    renderer = layer.rendererV2()
+    if isinstance(renderer, QgsSingleSymbolRendererV2):
+        return [renderer.symbol()]
+    elif isinstance(renderer, QgsCategorizedSymbolRendererV2):
+        return [cat.symbol() for cat in renderer.categories()]
+    elif isinstance(renderer, QgsGraduatedSymbolRendererV2):
+        return [ran.symbol() for ran in renderer.ranges()]
+    return []
+
+def _svgFiles(symbol):
+    '''Returns the (path, modification time) tuples of the SVG files used by a symbol
+    to create icons, in the same way as sldadapter.getReadyToUploadSvgIcons'''
+    files = []
+    for i in xrange(symbol.symbolLayerCount()):
+        sl = symbol.symbolLayer(i)
+        if isinstance(sl, QgsSvgMarkerSymbolLayerV2):
+            path = sl.path()
+        elif isinstance(sl, QgsSVGFillSymbolLayer):
+            path = sl.svgFilePath()
+        elif isinstance(sl, QgsMarkerLineSymbolLayerV2):
+            return _svgFiles(sl.subSymbol())
+        else:
+            continue
+        files.append((path, os.path.getmtime(path) if os.path.exists(path) else None))
+    return files
+
+def styleFingerprint(layer):
+    '''
+    Returns a hash of the style settings of a layer, or None if the layer is
+    not a vector or raster layer
+    '''
+    if layer.type() not in (QgsMapLayer.VectorLayer, QgsMapLayer.RasterLayer):
+        return None
+    document = QDomDocument()
+    node = document.createElement("maplayer")
+    document.appendChild(node)
+    errorMsg = ""
+    layer.writeSymbology(node, document, errorMsg)
+    digest = hashlib.md5()
+    digest.update(document.toString().encode("utf-8"))
+    digest.update(layer.name().encode("utf-8"))
+    for key in sorted(layer.customPropertyKeys()):
+        if key.startswith("labeling"):
+            digest.update((u"%s=%s" % (key, layer.customProperty(key))).encode("utf-8"))
+    digest.update(repr((layer.hasScaleBasedVisibility(), layer.minimumScale(), layer.maximumScale(),
+                        pluginSetting("SldUomManaging"), pluginSetting("SldScaleFactor"),
+                        pluginSetting("CompactColorMaps"))))
+    if layer.type() == QgsMapLayer.VectorLayer:
+        # icons are generated from the current content of the SVG files
+        for symbol in _symbols(layer):
+            digest.update(repr(_svgFiles(symbol)))
+    return digest.hexdigest()
+
+def getCachedSld(fingerprint):
+    '''Returns the (sld, icons) tuple generated for a style fingerprint, or None if it is not cached'''
+    return _slds.get(fingerprint)
+
+def setCachedSld(fingerprint, sld, icons):
+    _slds[fingerprint] = (sld, icons)
+
+def canonicalXml(xml, ignoreNames=False):
+    '''Returns the XML with whitespace-only text removed, so documents that
+    only differ in their formatting compare as equal. Attributes are written
+    in alphabetical order. If ignoreNames is True, the names of the layers and
+    styles in an SLD are removed as well'''
+    if isinstance(xml, unicode):
+        xml = xml.encode("utf-8")
+    try:
+        root = ElementTree.fromstring(xml)
+    except Exception:
+        return xml
+    for element in root.iter():
+        if element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+    if ignoreNames:
+        for element in list(root.iter()):
+            if element.tag.split("}")[-1] in ("NamedLayer", "UserStyle"):
+                for child in list(element):
+                    if child.tag.split("}")[-1] == "Name":
+                        element.remove(child)
+    return ElementTree.tostring(root)
+
+def sldHash(sld, ignoreNames=False):
+    '''Returns a hash of an SLD that does not depend on its formatting, and
+    optionally on the names of the layer and style it defines'''
+    return hashlib.md5(canonicalXml(sld, ignoreNames)).hexdigest()
+
+def getUploadedHash(catalog, name):
+    '''
+    Returns the hash of the SLD of a style in a catalog, as it was last uploaded
+    or read from the catalog, or None if it is not known
+    '''
+    return _uploaded.get((catalog.service_url, name))
+
+def setUploadedHash(catalog, name, hash):
+    _uploaded[(catalog.service_url, name)] = hash
+
+def forgetUploadedStyle(catalog, name):
+    '''To be called when a style is modified or deleted by other means than uploading a QGIS style'''
+    _uploaded.pop((catalog.service_url, name), None)
+    _converted.pop((catalog.service_url, name), None)
+
+def getConvertedStyle(catalog, name):
+    '''
+    Returns the (etag, sld) tuple of a style of a catalog converted to be used
+    in QGIS, or None if it is not cached
+    '''
+    return _converted.get((catalog.service_url, name))
+
+def setConvertedStyle(catalog, name, etag, sld):
+    _converted[(catalog.service_url, name)] = (etag, sld)
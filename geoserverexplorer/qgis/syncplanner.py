@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+'''
+This module computes the operations needed to make a workspace in a catalog
+match the layers, styles and groups of the current QGIS project.
+
+The state of the catalog is read once, concurrently, and compared with the
+project, so only the elements that are missing or have changed are published.
+'''
+
+from xml.etree import ElementTree
+from geoserver.support import url
+from geoserverexplorer.qgis import layers as qgislayers
+from geoserverexplorer.qgis.sldadapter import getGsCompatibleSld
+from geoserverexplorer.qgis.stylecache import canonicalXml, sldHash, setUploadedHash
+from geoserverexplorer.gui.gsnameutils import xmlNameFixUp
+from geoserverexplorer.geoserver.parallel import runConcurrently
+
+ATOM_LINK = "{http://www.w3.org/2005/Atom}link"
+
+
+def _get(catalog, segments):
+    response, content = catalog.http.request(url(catalog.service_url, segments))
+    if response.status == 200:
+        return content
+    return None
+
+def _put(catalog, segments, xml):
+    headers = {"Content-type": "text/xml"}
+    response, content = catalog.http.request(url(catalog.service_url, segments), "PUT", xml, headers)
+    if response.status != 200:
+        raise Exception("Error updating %s: %s" % ("/".join(segments), content))
+
+def _names(xml, tag):
+    if xml is None:
+        return []
+    return [e.text for e in ElementTree.fromstring(xml).findall(tag + "/name")]
+
+def getWorkspaceResourceNames(catalog, workspace):
+    '''
+    Returns the names of the feature types and the coverages in a workspace,
+    as two sets, with one request for each of them
+    '''
+    ws = workspace.name
+    return (set(_names(_get(catalog, ["workspaces", ws, "featuretypes.xml"]), "featureType")),
+            set(_names(_get(catalog, ["workspaces", ws, "coverages.xml"]), "coverage")))
+
+def _strip(name):
+    return name.split(":")[-1]
+
+
+class CatalogSnapshot(object):
+    '''
+    The state of the elements of a workspace that are relevant for the
+    synchronization of a project: resources, styles, default styles of layers
+    and layer groups
+    '''
+
+    def __init__(self, catalog, workspace, layerNames, groupNames):
+        self.catalog = catalog
+        self.workspace = workspace
+        ws = workspace.name
+        self.featureTypes, self.coverages = getWorkspaceResourceNames(catalog, workspace)
+        self.styleNames = set(_names(_get(catalog, ["styles.xml"]), "style"))
+        self.groupNames = set(_names(_get(catalog, ["layergroups.xml"]), "layerGroup"))
+
+        tasks = []
+        for name in layerNames:
+            if name in self.featureTypes:
+                tasks.append(("resource", ["workspaces", ws, "featuretypes", name + ".xml"]))
+            elif name in self.coverages:
+                tasks.append(("resource", ["workspaces", ws, "coverages", name + ".xml"]))
+            else:
+                continue
+            tasks.append(("layer", ["layers", ws + ":" + name + ".xml"]))
+            if name in self.styleNames:
+                tasks.append(("style", ["styles", name + ".sld"]))
+        for name in groupNames:
+            if name in self.groupNames:
+                tasks.append(("group", ["layergroups", name + ".xml"]))
+
+        def fetch(catalog, task):
+            return _get(catalog, task[1])
+        results = runConcurrently(catalog, fetch, tasks)
+
+        self.resources = {}
+        self.defaultStyles = {}
+        self.styles = {}
+        self.groups = {}
+        for (kind, segments), content, error in results:
+            if error is not None:
+                raise error
+            if content is None:
+                continue
+            if kind == "style":
+                styleName = segments[1][:-len(".sld")]
+                self.styles[styleName] = canonicalXml(content)
+                setUploadedHash(catalog, styleName, sldHash(content))
+                continue
+            dom = ElementTree.fromstring(content)
+            name = dom.findtext("name")
+            if kind == "resource":
+                self.resources[name] = (dom.findtext("title"), dom.findtext("abstract") or None)
+            elif kind == "layer":
+                self.defaultStyles[_strip(name)] = _strip(dom.findtext("defaultStyle/name") or "")
+            elif kind == "group":
+                self.groups[name] = ([_strip(e.findtext("name")) for e in dom.findall("publishables/published")]
+                                     or [_strip(e.findtext("name")) for e in dom.findall("layers/layer")],
+                                     [e.findtext("name") for e in dom.findall("styles/style")])
+
+    def hasLayer(self, name):
+        return name in self.featureTypes or name in self.coverages
+
+
+class SyncPlan(object):
+    '''An ordered list of operations, each of them with a description'''
+
+    def __init__(self):
+        self.operations = []
+
+    def add(self, description, func, *args):
+        self.operations.append((description, func, args))
+
+    def __len__(self):
+        return len(self.operations)
+
+    def descriptions(self):
+        return [op[0] for op in self.operations]
+
+
+def planProjectSync(catalogWrapper, workspace, groupName=None, republishData=False, deleteOthers=False):
+    '''
+    Compares the layers, styles and groups of the current project with the ones
+    in a workspace of a catalog, and returns a SyncPlan with the operations
+    needed to make the catalog match the project.
+
+    Layers that already exist in the workspace are only republished if
+    republishData is True. Otherwise, only their style and metadata are updated,
+    if needed. Layers in the workspace that are not in the project are deleted
+    if deleteOthers is True
+    '''
+    catalog = catalogWrapper.catalog
+    projectLayers = qgislayers.getAllLayers()
+    projectGroups = qgislayers.getGroups()
+    names = dict((layer, xmlNameFixUp(layer.name())) for layer in projectLayers)
+    groupNames = list(projectGroups.keys())
+    if groupName is not None:
+        groupNames.append(groupName)
+    snapshot = CatalogSnapshot(catalog, workspace, names.values(), groupNames)
+
+    styleOps, layerOps, updateOps, groupOps, deleteOps = [], [], [], [], []
+    for layer in projectLayers:
+        name = names[layer]
+        if not snapshot.hasLayer(name) or republishData:
+            description = ("Republish layer '%s'" if snapshot.hasLayer(name) else "Publish layer '%s'") % name
+            layerOps.append((description, catalogWrapper.publishLayer, (layer, workspace, True, name)))
+            continue
+        sld, icons = getGsCompatibleSld(layer)
+        if sld is not None:
+            if name not in snapshot.styles:
+                styleOps.append(("Create style '%s'" % name, catalogWrapper.publishStyle, (layer, True, name)))
+            elif snapshot.styles[name] != canonicalXml(sld):
+                styleOps.append(("Update style '%s'" % name, catalogWrapper.publishStyle, (layer, True, name)))
+            if snapshot.defaultStyles.get(name) != name:
+                updateOps.append(("Set style '%s' as default style of layer '%s'" % (name, name),
+                                  _setDefaultStyle, (catalog, workspace, name, name)))
+        # the same metadata that publishing the layer would set
+        title, abstract = qgislayers.getLayerMetadata(layer, name)
+        if snapshot.resources.get(name) != (title, abstract):
+            updateOps.append(("Update title and abstract of layer '%s'" % name,
+                              setResourceMetadata, (catalog, workspace, name, layer.type() == layer.RasterLayer,
+                                                    title, abstract)))
+
+    groups = [(group, [names[layer] for layer in projectGroups[group][::-1]],
+               projectGroups[group]) for group in projectGroups]
+    if groupName is not None:
+        groups.append((groupName, [names[layer] for layer in projectLayers[::-1]], projectLayers))
+    for group, members, groupLayers in groups:
+        if group not in snapshot.groupNames:
+            groupOps.append(("Create layer group '%s'" % group,
+                             _saveGroup, (catalog, group, members, groupLayers, True)))
+        elif snapshot.groups.get(group) != (members, members):
+            groupOps.append(("Update layer group '%s'" % group,
+                             _saveGroup, (catalog, group, members, groupLayers, False)))
+
+    if deleteOthers:
+        projectNames = set(names.values())
+        for name in sorted((snapshot.featureTypes | snapshot.coverages) - projectNames):
+            deleteOps.append(("Delete layer '%s'" % name, _deleteLayer, (catalog, workspace, name)))
+
+    plan = SyncPlan()
+    for description, func, args in styleOps + layerOps + updateOps + groupOps + deleteOps:
+        plan.add(description, func, *args)
+    return plan
+
+
+def _setDefaultStyle(catalog, workspace, name, style):
+    xml = "<layer><defaultStyle><name>%s</name></defaultStyle></layer>" % style
+    _put(catalog, ["layers", workspace.name + ":" + name + ".xml"], xml)
+
+def setResourceMetadata(catalog, workspace, name, isRaster, title, abstract):
+    '''Sets the title and the abstract of a feature type or coverage with a single request'''
+    tag = "coverage" if isRaster else "featureType"
+    root = ElementTree.Element(tag)
+    ElementTree.SubElement(root, "title").text = title
+    ElementTree.SubElement(root, "abstract").text = abstract or ""
+    segments = ["workspaces", workspace.name, "coverages" if isRaster else "featuretypes", name + ".xml"]
+    _put(catalog, segments, ElementTree.tostring(root, "utf-8"))
+
+def _saveGroup(catalog, name, members, groupLayers, create):
+    bounds = qgislayers.getGroupBounds(groupLayers)
+    if create:
+        group = catalog.create_layergroup(name, members, members, bounds)
+    else:
+        group = catalog.get_layergroup(name)
+        group.dirty.update(layers=members, styles=members, bounds=bounds)
+    catalog.save(group)
+
+def _deleteLayer(catalog, workspace, name):
+    layer = catalog.get_layer(workspace.name + ":" + name)
+    if layer is None:
+        return
+    link = layer.dom.find("resource/" + ATOM_LINK)
+    catalog.delete(layer, recurse=True)
+    if link is not None:
+        response, content = catalog.http.request(link.get("href") + "?recurse=true", "DELETE")
+        if response.status != 200:
+            raise Exception("Error deleting resource of layer %s: %s" % (name, content))
+    catalog._cache.clear()
@@ -47,6 +47,7 @@ def formatSource(source):
     if isinstance(source, QgsVectorLayer):
         source = source.source()
     source = os.path.normcase(source)
+    return source
 
 def addTrackedLayer(layer, catalogUrl):
     global tracked
@@ -87,3 +88,22 @@ def getTrackingInfo(layer):
     for obj in tracked:
         if obj[0] == source:
             return obj[1]
+
+def getTrackedLayerSyncInfo(layer):
+    '''Returns the dict with the data needed to synchronize the features of a tracked layer
+    (typename, workspace, namespace...), or None if it is not available'''
+    source = formatSource(layer.source())
+    for obj in tracked:
+        if obj[0] == source:
+            return obj[2] if len(obj) > 2 else None
+
+def setTrackedLayerSyncInfo(layer, info):
+    source = formatSource(layer.source())
+    for obj in tracked:
+        if obj[0] == source:
+            if len(obj) > 2:
+                obj[2] = info
+            else:
+                obj.append(info)
+            saveTrackedLayers()
+            return
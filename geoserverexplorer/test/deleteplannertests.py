@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import sys
+import urllib
+from geoserver.layer import Layer
+from geoserver.layergroup import LayerGroup
+from geoserver.style import Style
+from geoserver.workspace import Workspace
+from geoserver.store import DataStore
+from geoserver.resource import FeatureType
+from geoserverexplorer.geoserver.deleteplanner import CatalogGraph, _container, _resourceKey
+
+SERVICE_URL = "http://localhost:8080/geoserver/rest"
+
+LAYER_XML = '''<layer>
+  <name>%(name)s</name>
+  <defaultStyle><name>%(style)s</name></defaultStyle>
+  <styles>%(styles)s</styles>
+  <resource class="featureType">
+    <name>%(resource)s</name>
+    <atom:link xmlns:atom="http://www.w3.org/2005/Atom" rel="alternate"
+      href="%(url)s/workspaces/ws/datastores/store/featuretypes/%(resource)s.xml" type="application/xml"/>
+  </resource>
+</layer>'''
+
+GROUP_XML = '''<layerGroup>
+  <name>%(name)s</name>
+  <publishables>%(published)s</publishables>
+</layerGroup>'''
+
+
+class _Response(object):
+
+    def __init__(self, status):
+        self.status = status
+
+
+class _Catalog(object):
+    '''A catalog that answers requests with canned layer and group descriptions'''
+
+    def __init__(self, layers, groups, failing=()):
+        self.service_url = SERVICE_URL
+        self._cache = {}
+        self.http = self
+        self.layers = layers
+        self.groups = groups
+        self.failing = failing
+        self.deleted = []
+
+    def setup_connection(self):
+        pass
+
+    def gsversion(self):
+        return "2.8.x"
+
+    def get_layers(self):
+        return [Layer(self, name) for name in sorted(self.layers)]
+
+    def get_layergroups(self):
+        return [LayerGroup(self, name) for name in sorted(self.groups)]
+
+    def get_style(self, name, workspace=None):
+        return Style(self, name, workspace)
+
+    def request(self, url, *args):
+        name = urllib.unquote(url.split("/")[-1])[:-len(".xml")]
+        if name in self.failing:
+            return _Response(500), "Internal error"
+        if "/layergroups/" in url:
+            published = "".join('<published type="%s"><name>%s</name></published>'
+                                % ("layerGroup" if member in self.groups else "layer", member)
+                                for member in self.groups[name])
+            return _Response(200), GROUP_XML % {"name": name, "published": published}
+        style, alternates = self.layers[name]
+        styles = "".join("<style><name>%s</name></style>" % s for s in alternates)
+        return _Response(200), LAYER_XML % {"name": name, "resource": name.split(":")[-1],
+                                            "style": style, "styles": styles, "url": SERVICE_URL}
+
+    def delete(self, element, recurse=False, purge=False):
+        self.deleted.append(element.name)
+
+
+class DeletePlannerTests(unittest.TestCase):
+    '''
+    Tests for the computation of the elements to delete and the order to delete them.
+    They use canned catalog responses and do not require a GeoServer catalog
+    '''
+
+    def setUp(self):
+        self.catalog = _Catalog({"ws:a": ("style_a", ["shared"]),
+                                 "ws:b": ("style_b", ["shared"]),
+                                 "ws:c": ("style_c", [])},
+                                {"group1": ["ws:a", "group2"],
+                                 "group2": ["ws:b"]})
+        self.workspace = Workspace(self.catalog, "ws")
+        self.store = DataStore(self.catalog, self.workspace, "store")
+
+    def _resource(self, name):
+        return FeatureType(self.catalog, self.workspace, self.store, name)
+
+    def testResourceKey(self):
+        href = SERVICE_URL + "/workspaces/ws/datastores/store/featuretypes/a.xml"
+        self.assertEqual(("resource", "ws", "store", "a"), _resourceKey(href))
+        href = SERVICE_URL + "/workspaces/ws/coveragestores/dem/coverages/dem.xml"
+        self.assertEqual(("resource", "ws", "dem", "dem"), _resourceKey(href))
+        self.assertIsNone(_resourceKey(SERVICE_URL + "/layers/a.xml"))
+
+    def testContainer(self):
+        self.assertEqual(("store", "ws", "store"), _container(("resource", "ws", "store", "a")))
+        self.assertEqual(("workspace", "ws"), _container(("store", "ws", "store")))
+        self.assertEqual(("workspace", "ws"), _container(("style", "ws:style")))
+        self.assertEqual(("workspace", "ws"), _container(("group", "ws:group")))
+        self.assertIsNone(_container(("style", "style")))
+        self.assertIsNone(_container(("layer", "ws:a")))
+        self.assertIsNone(_container(("workspace", "ws")))
+
+    def testDependents(self):
+        graph = CatalogGraph(self.catalog)
+        self.assertEqual([], graph.errors)
+        plan = graph.plan([self._resource("b")])
+        dependent = sorted(e.name for e in plan.dependent)
+        self.assertEqual(["group1", "group2", "ws:b"], dependent)
+
+    def testWavesOrder(self):
+        graph = CatalogGraph(self.catalog)
+        plan = graph.plan([self._resource("a"), self._resource("b")], True)
+        wave = dict((key, i) for i, keys in enumerate(plan.waves) for key in keys)
+        # groups are deleted before the groups containing them, and layers after the
+        # groups containing them. Resources and styles go after the layers using them
+        self.assertLess(wave[("group", "group1")], wave[("group", "group2")])
+        self.assertLess(wave[("group", "group2")], wave[("layer", "ws:b")])
+        self.assertLess(wave[("group", "group1")], wave[("layer", "ws:a")])
+        for name in ["a", "b"]:
+            layer = wave[("layer", "ws:" + name)]
+            self.assertLess(layer, wave[("resource", "ws", "store", name)])
+            self.assertLess(layer, wave[("style", "style_" + name)])
+            self.assertLess(layer, wave[("style", "shared")])
+        self.assertEqual(4, len(plan.waves))
+        self.assertEqual(9, len(plan))
+
+    def testSharedStyleIsKept(self):
+        graph = CatalogGraph(self.catalog)
+        plan = graph.plan([self._resource("a")], True)
+        self.assertEqual(["style_a"], [s.name for s in plan.styles])
+
+    def testSkippedStyles(self):
+        graph = CatalogGraph(self.catalog)
+        plan = graph.plan([self._resource("a")], True)
+        plan.skip(plan.styles, "skipped")
+        errors = plan.execute()
+        self.assertEqual([("style_a", "skipped")], [(e.name, msg) for e, msg in errors])
+        self.assertEqual(["a", "group1", "ws:a"], sorted(self.catalog.deleted))
+
+    def testCircularGroups(self):
+        self.catalog.groups = {"group1": ["group2"], "group2": ["group1"]}
+        graph = CatalogGraph(self.catalog)
+        plan = graph.plan([LayerGroup(self.catalog, "group1")])
+        self.assertEqual([[("group", "group1"), ("group", "group2")]], plan.waves)
+        errors = plan.execute()
+        self.assertEqual([], errors)
+        self.assertEqual(["group1", "group2"], sorted(self.catalog.deleted))
+
+    def testUnreadableLayer(self):
+        self.catalog.failing = ("group1",)
+        graph = CatalogGraph(self.catalog)
+        self.assertEqual(1, len(graph.errors))
+        self.assertTrue("group1" in graph.errors[0])
+        plan = graph.plan([self._resource("a")])
+        self.assertEqual(["ws:a"], [e.name for e in plan.dependent])
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(DeletePlannerTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(DeletePlannerTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
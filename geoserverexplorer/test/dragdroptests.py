@@ -57,11 +57,12 @@ class DragDropTests(ExplorerIntegrationTest):
         self.assertIsNotNone(styleItem)
         layerItem = self.getLayerItem(PT2)
         self.assertIsNotNone(layerItem)
+        self.expandItem(layerItem)
         layerItem.acceptDroppedItems(self.tree, self.explorer, [styleItem])
         self.assertIsNotNone(self._getItemUnder(layerItem, STYLE))
 
     def testDropGsLayerInGsGroupItem(self):
-        groupItem = self.getGroupItem(GROUP)
+        groupItem = self.expandItem(self.getGroupItem(GROUP))
         childCount = groupItem.childCount()
         layerItem = self.getLayerItem(PT3)
         groupItem.acceptDroppedItems(self.tree, self.explorer, [layerItem])
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import sys
+from xml.etree import ElementTree
+from qgis.core import *
+from PyQt4.QtCore import QVariant
+from geoserverexplorer.qgis.featuresync import FeatureChanges, CommittedChanges, captureEditBuffer, \
+    WfsTransaction, hasServerFids, WFS_NS, OGC_NS
+
+NAMESPACE = "http://test.com"
+
+
+class _Catalog(object):
+
+    def __init__(self):
+        self.gs_base_url = "http://localhost:8080/geoserver/"
+
+
+class FeatureSyncTests(unittest.TestCase):
+    '''
+    Tests for the capture of the edits of a layer that are synced with WFS-T.
+    They use memory layers and do not require a GeoServer catalog
+    '''
+
+    def setUp(self):
+        self.layer = QgsVectorLayer("Point?field=id:integer&field=name:string", "points", "memory")
+        features = []
+        for i in range(3):
+            feature = QgsFeature(self.layer.pendingFields())
+            feature.setAttributes([i, "feature%i" % i])
+            feature.setGeometry(QgsGeometry.fromPoint(QgsPoint(i, i)))
+            features.append(feature)
+        self.layer.dataProvider().addFeatures(features)
+        self.fids = sorted(f.id() for f in self.layer.getFeatures())
+        self.edits = CommittedChanges(self.layer)
+        self.layer.beforeCommitChanges.connect(lambda: self.edits.capture(captureEditBuffer(self.layer)))
+        self.layer.committedAttributesAdded.connect(lambda layerId, attrs: self.edits.attributesChanged(attrs))
+        self.layer.committedFeaturesAdded.connect(lambda layerId, features: self.edits.featuresAdded(features))
+        self.layer.committedFeaturesRemoved.connect(lambda layerId, fids: self.edits.featuresRemoved(fids))
+        self.layer.committedAttributeValuesChanges.connect(lambda layerId, values: self.edits.attributeValuesChanged(values))
+        self.layer.committedGeometriesChanges.connect(lambda layerId, geoms: self.edits.geometriesChanged(geoms))
+
+    def testNoEditBuffer(self):
+        changes = captureEditBuffer(self.layer)
+        self.assertIsNotNone(changes)
+        self.assertTrue(changes.isEmpty())
+
+    def testStructureChanged(self):
+        self.layer.startEditing()
+        self.layer.addAttribute(QgsField("extra", QVariant.Int))
+        self.assertIsNone(captureEditBuffer(self.layer))
+        self.assertTrue(self.layer.commitChanges())
+        self.assertTrue(self.edits.structureChanged)
+
+    def testCommittedChanges(self):
+        self.layer.startEditing()
+        nameIdx = self.layer.fieldNameIndex("name")
+        self.layer.changeAttributeValue(self.fids[0], nameIdx, "changed")
+        self.layer.changeGeometry(self.fids[1], QgsGeometry.fromPoint(QgsPoint(10, 10)))
+        self.layer.deleteFeature(self.fids[2])
+        feature = QgsFeature(self.layer.pendingFields())
+        feature.setAttributes([3, "feature3"])
+        feature.setGeometry(QgsGeometry.fromPoint(QgsPoint(3, 3)))
+        self.layer.addFeature(feature)
+        self.assertTrue(self.layer.commitChanges())
+        changes = self.edits.changes()
+        self.assertFalse(self.edits.structureChanged)
+        self.assertEqual(4, changes.count())
+        self.assertEqual(1, len(changes.inserted))
+        self.assertEqual("feature3", changes.inserted[0]["name"])
+        updated = dict((u[0], u) for u in changes.updated)
+        self.assertEqual(["name"], updated[self.fids[0]][3])
+        self.assertFalse(updated[self.fids[0]][4])
+        self.assertEqual([], updated[self.fids[1]][3])
+        self.assertTrue(updated[self.fids[1]][4])
+        self.assertEqual([(self.fids[2], None)], changes.deleted)
+
+    def testRolledBackChangesAreNotSent(self):
+        self.layer.startEditing()
+        self.layer.deleteFeature(self.fids[0])
+        self.layer.rollBack()
+        self.assertTrue(self.edits.changes().isEmpty())
+
+    def testPartialCommit(self):
+        # only the parts of a commit reported by the provider are kept, so
+        # edits that fail to be committed and are later rolled back are not sent
+        captured = FeatureChanges()
+        feature = QgsFeature(self.layer.pendingFields())
+        captured.inserted = [feature]
+        captured.updated = [(self.fids[0], None, feature, ["name"], False)]
+        captured.deleted = [(self.fids[1], None), (self.fids[2], None)]
+        self.edits.capture(captured)
+        self.edits.featuresRemoved(set([self.fids[1]]))
+        changes = self.edits.changes()
+        self.assertEqual([], changes.inserted)
+        self.assertEqual([], changes.updated)
+        self.assertEqual([(self.fids[1], None)], changes.deleted)
+        # a second commit keeps the parts committed by the first one
+        self.edits.capture(captured)
+        self.edits.attributeValuesChanged({self.fids[0]: {1: "changed"}})
+        changes = self.edits.changes()
+        self.assertEqual([(self.fids[0], None, feature, ["name"], False)], changes.updated)
+        self.assertEqual([(self.fids[1], None)], changes.deleted)
+
+    def _transaction(self, keyField=None):
+        info = {"typename": "points", "workspace": "ws", "namespace": NAMESPACE,
+                "nativeName": "points_native", "attributes": ["the_geom", "id", "name"],
+                "keyField": keyField}
+        return WfsTransaction(_Catalog(), self.layer, info)
+
+    def _parse(self, xml):
+        return ElementTree.fromstring(xml.encode("utf-8"))
+
+    def testServerFids(self):
+        # memory layers are not uploaded as they are, so their fids do not match the server ones
+        self.assertFalse(hasServerFids(self.layer))
+        transaction = self._transaction()
+        self.assertEqual("points_native.1", transaction._serverFid(0))
+        xml = self._parse(transaction.transactionXml([], [], [(0, None), (2, None)]))
+        delete = xml.find("{%s}Delete" % WFS_NS)
+        self.assertEqual("ws:points", delete.get("typeName"))
+        fids = [e.get("fid") for e in delete.findall("{%s}Filter/{%s}FeatureId" % (OGC_NS, OGC_NS))]
+        self.assertEqual(["points_native.1", "points_native.3"], fids)
+
+    def testTransactionXml(self):
+        feature = QgsFeature(self.layer.pendingFields())
+        feature.setAttributes([5, "changed"])
+        feature.setGeometry(QgsGeometry.fromPoint(QgsPoint(5, 5)))
+        transaction = self._transaction("id")
+        xml = self._parse(transaction.transactionXml([feature], [(0, 1, feature, ["name"], False)],
+                                                     [(None, 2), (None, 3)]))
+        self.assertEqual("1.0.0", xml.get("version"))
+        inserted = xml.find("{%s}Insert/{%s}points" % (WFS_NS, NAMESPACE))
+        self.assertEqual("5", inserted.findtext("{%s}id" % NAMESPACE))
+        self.assertEqual("changed", inserted.findtext("{%s}name" % NAMESPACE))
+        self.assertIsNotNone(inserted.find("{%s}the_geom" % NAMESPACE))
+
+        update = xml.find("{%s}Update" % WFS_NS)
+        properties = [(p.findtext("{%s}Name" % WFS_NS), p.findtext("{%s}Value" % WFS_NS))
+                      for p in update.findall("{%s}Property" % WFS_NS)]
+        self.assertEqual([("name", "changed")], properties)
+        equal = update.find("{%s}Filter/{%s}PropertyIsEqualTo" % (OGC_NS, OGC_NS))
+        self.assertEqual("id", equal.findtext("{%s}PropertyName" % OGC_NS))
+        self.assertEqual("1", equal.findtext("{%s}Literal" % OGC_NS))
+
+        delete = xml.find("{%s}Delete" % WFS_NS)
+        literals = [e.text for e in delete.findall(".//{%s}Literal" % OGC_NS)]
+        self.assertEqual(["2", "3"], literals)
+        self.assertIsNotNone(delete.find("{%s}Filter/{%s}Or" % (OGC_NS, OGC_NS)))
+        self.assertIsNone(xml.find(".//{%s}FeatureId" % OGC_NS))
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(FeatureSyncTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(FeatureSyncTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
@@ -63,6 +63,11 @@ class ExplorerIntegrationTest(unittest.TestCase):
             result = _get_item(name.split(':')[1], parent)
         return result
 
+    def expandItem(self, item):
+        '''Populates an item whose children are only added when it is expanded'''
+        self.tree.treeItemExpanded(item)
+        return item
+
     def getStoreItem(self, ws, name):
         return self._getItemUnder(self.getWorkspaceItem(ws), name)
 
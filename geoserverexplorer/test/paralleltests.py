@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import sys
+import threading
+import time
+from geoserverexplorer.geoserver.parallel import runConcurrently
+from qgiscommons2.settings import pluginSetting, setPluginSetting
+
+
+class _Catalog(object):
+    '''A catalog that only keeps track of the connections it sets up'''
+
+    def __init__(self):
+        self._cache = {}
+        self.connections = 0
+
+    def setup_connection(self):
+        self.connections += 1
+
+
+class ParallelTests(unittest.TestCase):
+    '''
+    Tests for the helpers that send requests to a catalog concurrently.
+    They do not require a GeoServer catalog
+    '''
+
+    def setUp(self):
+        self.concurrentRequests = pluginSetting("ConcurrentRequests")
+        setPluginSetting("ConcurrentRequests", 4)
+        self.catalog = _Catalog()
+
+    def tearDown(self):
+        setPluginSetting("ConcurrentRequests", self.concurrentRequests)
+
+    def testResultsOrder(self):
+        def func(catalog, item):
+            # later items finish first
+            time.sleep(0.01 * (10 - item))
+            return item * 2
+        results = runConcurrently(self.catalog, func, range(10))
+        self.assertEqual([(i, i * 2, None) for i in range(10)], results)
+
+    def testErrors(self):
+        def func(catalog, item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+        results = runConcurrently(self.catalog, func, range(6))
+        self.assertEqual(range(6), [item for item, result, error in results])
+        for item, result, error in results:
+            if item % 2:
+                self.assertIsNone(result)
+                self.assertTrue(isinstance(error, ValueError))
+            else:
+                self.assertEqual(item, result)
+                self.assertIsNone(error)
+
+    def testProgress(self):
+        calls = []
+        def progress(n):
+            calls.append((n, threading.current_thread()))
+        runConcurrently(self.catalog, lambda catalog, item: item, range(5), progress)
+        self.assertEqual([1, 2, 3, 4, 5], [n for n, thread in calls])
+        self.assertTrue(all(thread is threading.current_thread() for n, thread in calls))
+
+    def testCatalogPerThread(self):
+        catalogs = {}
+        lock = threading.Lock()
+        def func(catalog, item):
+            time.sleep(0.01)
+            with lock:
+                catalogs.setdefault(threading.current_thread().ident, set()).add(catalog)
+        runConcurrently(self.catalog, func, range(20))
+        self.assertTrue(len(catalogs) > 1)
+        clones = set()
+        for threadCatalogs in catalogs.values():
+            self.assertEqual(1, len(threadCatalogs))
+            clones.update(threadCatalogs)
+        self.assertEqual(len(catalogs), len(clones))
+        self.assertFalse(self.catalog in clones)
+        self.assertEqual(0, self.catalog.connections)
+        for clone in clones:
+            self.assertEqual(1, clone.connections)
+            self.assertIsNot(self.catalog._cache, clone._cache)
+
+    def testSequential(self):
+        setPluginSetting("ConcurrentRequests", 1)
+        catalogs = set()
+        runConcurrently(self.catalog, lambda catalog, item: catalogs.add(catalog), range(3))
+        self.assertEqual(set([self.catalog]), catalogs)
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(ParallelTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(ParallelTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
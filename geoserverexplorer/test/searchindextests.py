@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import sys
+from geoserverexplorer.gui.searchindex import SearchIndex, indexWords, queryWords
+
+
+class _Item(object):
+    '''An explorer item with just the text used to sort search results'''
+
+    def __init__(self, text):
+        self._text = text
+
+    def text(self, column):
+        return self._text
+
+
+class SearchIndexTests(unittest.TestCase):
+    '''
+    Tests for the index used by the search box of the explorer.
+    They do not require a GeoServer catalog
+    '''
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.roads = _Item("Roads")
+        self.rivers = _Item("rivers")
+        self.railways = _Item("Main_railways")
+        self.index.add(self.roads, ["Roads", "roads_2016", "Main roads of the country"])
+        self.index.add(self.rivers, ["rivers", "Rivers and lakes"])
+        self.index.add(self.railways, ["Main_railways", None, ""])
+
+    def _checkWords(self):
+        self.assertEqual(sorted(self.index._words), self.index._words)
+        self.assertEqual(sorted(self.index._index.keys()), self.index._words)
+        for word, keys in self.index._index.items():
+            self.assertTrue(keys)
+            for key in keys:
+                self.assertTrue(word in self.index._items[key][1])
+
+    def testIndexWords(self):
+        self.assertEqual(set(["main_railways", "main", "railways"]), indexWords("Main_railways"))
+        self.assertEqual(set(["roads", "2016", "roads_2016"]), indexWords("roads_2016"))
+        self.assertEqual(set(["main", "roads", "of"]), indexWords("Main roads of"))
+        self.assertEqual(set(["main_rail", "rivers"]), queryWords("Main_rail, rivers"))
+
+    def testSearch(self):
+        self.assertEqual([self.railways, self.rivers, self.roads], self.index.search("r"))
+        self.assertEqual([self.railways, self.roads], self.index.search("main"))
+        self.assertEqual([self.railways], self.index.search("rail"))
+        self.assertEqual([self.railways], self.index.search("main_rail"))
+        self.assertEqual([], self.index.search("lakes_"))
+        self.assertEqual([], self.index.search(" ,"))
+
+    def testMultipleWords(self):
+        # each word has to match a word of the item
+        self.assertEqual([self.roads], self.index.search("ro main"))
+        self.assertEqual([self.railways, self.roads], self.index.search("MAIN R"))
+        self.assertEqual([self.rivers], self.index.search("lakes riv"))
+        self.assertEqual([], self.index.search("lakes main"))
+
+    def testLimit(self):
+        # the first items by their text are returned
+        self.assertEqual([self.railways], self.index.search("r", 1))
+        self.assertEqual([self.railways, self.rivers], self.index.search("r", 2))
+        self.assertEqual([self.railways, self.rivers, self.roads], self.index.search("r", 10))
+
+    def testReplace(self):
+        self.index.add(self.roads, ["Highways"])
+        self.assertEqual(3, len(self.index))
+        self.assertEqual([], self.index.search("roads"))
+        self.assertEqual([self.roads], self.index.search("high"))
+        self._checkWords()
+
+    def testRemove(self):
+        self._checkWords()
+        self.index.remove(self.roads)
+        self.assertEqual(2, len(self.index))
+        self.assertEqual([self.railways], self.index.search("main"))
+        self.assertEqual([], self.index.search("country"))
+        self.assertFalse("roads" in self.index._words)
+        self.assertTrue("main" in self.index._words)
+        self._checkWords()
+        # removing an item that is not indexed does nothing
+        self.index.remove(self.roads)
+        self.index.remove(_Item("unknown"))
+        self.assertEqual(2, len(self.index))
+        for item in [self.rivers, self.railways]:
+            self.index.remove(item)
+        self.assertEqual(0, len(self.index))
+        self.assertEqual([], self.index._words)
+        self.assertEqual({}, self.index._index)
+
+    def testItemsWithoutTerms(self):
+        self.index.add(_Item("empty"), [None, ""])
+        self.assertEqual(3, len(self.index))
+        self._checkWords()
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(SearchIndexTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(SearchIndexTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import sys
+import os
+import tempfile
+from qgis.core import *
+from PyQt4.QtGui import QColor
+from geoserverexplorer.qgis import stylecache
+from qgiscommons2.settings import pluginSetting, setPluginSetting
+
+SLD = '''<?xml version="1.0" encoding="UTF-8"?>
+<sld:StyledLayerDescriptor xmlns:sld="http://www.opengis.net/sld" version="1.0.0">
+  <sld:NamedLayer>
+    <sld:Name>%s</sld:Name>
+    <sld:UserStyle>
+      <sld:Name>%s</sld:Name>
+      <sld:FeatureTypeStyle>
+        <sld:Rule>
+          <sld:PointSymbolizer/>
+        </sld:Rule>
+      </sld:FeatureTypeStyle>
+    </sld:UserStyle>
+  </sld:NamedLayer>
+</sld:StyledLayerDescriptor>'''
+
+
+class _Catalog(object):
+
+    def __init__(self, url):
+        self.service_url = url
+
+
+class StyleCacheTests(unittest.TestCase):
+    '''
+    Tests for the cache of generated and uploaded styles.
+    They do not require a GeoServer catalog
+    '''
+
+    def testCanonicalXml(self):
+        compact = "".join(line.strip() for line in (SLD % ("a", "a")).splitlines()[1:])
+        self.assertEqual(stylecache.canonicalXml(SLD % ("a", "a")), stylecache.canonicalXml(compact))
+        self.assertEqual(stylecache.sldHash(SLD % ("a", "a")), stylecache.sldHash(compact))
+        self.assertEqual(stylecache.canonicalXml(u"<a b='2' a='1'>é</a>"),
+                         stylecache.canonicalXml("<a a='1' b='2'>\xc3\xa9</a>"))
+        # documents that cannot be parsed are returned unchanged
+        self.assertEqual("<a>", stylecache.canonicalXml("<a>"))
+
+    def testIgnoreNames(self):
+        sld, renamed = SLD % ("a", "a"), SLD % ("b", "c")
+        self.assertNotEqual(stylecache.sldHash(sld), stylecache.sldHash(renamed))
+        self.assertEqual(stylecache.sldHash(sld, True), stylecache.sldHash(renamed, True))
+        self.assertFalse("<sld:Name>" in stylecache.canonicalXml(sld, True))
+        self.assertTrue("PointSymbolizer" in stylecache.canonicalXml(sld, True))
+
+    def testUploadedHash(self):
+        catalog, other = _Catalog("http://a/rest"), _Catalog("http://b/rest")
+        stylecache.setUploadedHash(catalog, "style", "hash")
+        stylecache.setConvertedStyle(catalog, "style", "etag", "sld")
+        self.assertEqual("hash", stylecache.getUploadedHash(catalog, "style"))
+        self.assertIsNone(stylecache.getUploadedHash(other, "style"))
+        self.assertEqual(("etag", "sld"), stylecache.getConvertedStyle(catalog, "style"))
+        stylecache.forgetUploadedStyle(catalog, "style")
+        self.assertIsNone(stylecache.getUploadedHash(catalog, "style"))
+        self.assertIsNone(stylecache.getConvertedStyle(catalog, "style"))
+        # forgetting a style that is not cached does nothing
+        stylecache.forgetUploadedStyle(other, "style")
+
+    def testStyleFingerprint(self):
+        layer = QgsVectorLayer("Point?field=id:integer", "points", "memory")
+        fingerprint = stylecache.styleFingerprint(layer)
+        self.assertEqual(fingerprint, stylecache.styleFingerprint(layer))
+        layer.rendererV2().symbol().setColor(QColor(255, 0, 0))
+        changed = stylecache.styleFingerprint(layer)
+        self.assertNotEqual(fingerprint, changed)
+        layer.setCustomProperty("labeling/enabled", True)
+        labeled = stylecache.styleFingerprint(layer)
+        self.assertNotEqual(changed, labeled)
+        # other custom properties do not affect the style
+        layer.setCustomProperty("other", True)
+        self.assertEqual(labeled, stylecache.styleFingerprint(layer))
+
+    def testFingerprintSettings(self):
+        layer = QgsVectorLayer("Point?field=id:integer", "points", "memory")
+        compact = pluginSetting("CompactColorMaps")
+        fingerprint = stylecache.styleFingerprint(layer)
+        setPluginSetting("CompactColorMaps", not compact)
+        try:
+            self.assertNotEqual(fingerprint, stylecache.styleFingerprint(layer))
+        finally:
+            setPluginSetting("CompactColorMaps", compact)
+
+    def testFingerprintSvgFiles(self):
+        handle, path = tempfile.mkstemp(suffix=".svg")
+        os.write(handle, '<svg xmlns="http://www.w3.org/2000/svg"><circle r="5"/></svg>')
+        os.close(handle)
+        try:
+            layer = QgsVectorLayer("Point?field=id:integer", "points", "memory")
+            symbol = QgsMarkerSymbolV2()
+            symbol.changeSymbolLayer(0, QgsSvgMarkerSymbolLayerV2(path))
+            layer.setRendererV2(QgsSingleSymbolRendererV2(symbol))
+            fingerprint = stylecache.styleFingerprint(layer)
+            # editing the file changes the icons, even if the style of the layer is the same
+            mtime = os.path.getmtime(path)
+            os.utime(path, (mtime + 10, mtime + 10))
+            self.assertNotEqual(fingerprint, stylecache.styleFingerprint(layer))
+        finally:
+            os.remove(path)
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(StyleCacheTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(StyleCacheTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
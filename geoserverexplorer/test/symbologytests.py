@@ -8,7 +8,7 @@ import os
 import sys
 from geoserverexplorer.qgis import layers, catalog
 from geoserverexplorer.qgis.sldadapter import adaptGsToQgs,\
-    getGsCompatibleSld
+    getGsCompatibleSld, convertQgsSld, buildColorMap, setScaleRange, POINT_WKN_REPLACEMENTS, POLYGON_WKN_REPLACEMENTS
 from qgis.core import *
 from qgis.utils import iface, QGis
 from PyQt4.QtCore import *
@@ -16,6 +16,8 @@ from geoserverexplorer.test import utils
 from geoserverexplorer.test.utils import PT1, DEM, DEM2, PT1JSON, DEMASCII,\
     GEOLOGY_GROUP, GEOFORMS, LANDUSE, HOOK, WORKSPACE, WORKSPACEB
 import re
+import io
+import json
 
 class SymbologyTests(unittest.TestCase):
     '''
@@ -64,6 +66,59 @@ class SymbologyTests(unittest.TestCase):
 
 
 
+class SldAdapterTests(unittest.TestCase):
+    '''
+    Regression tests for the conversion of the SLD produced by QGIS, using the
+    styles in resources/sldadapter. Does not require a Geoserver catalog
+    '''
+
+    def testConvertQgsSld(self):
+        folder = os.path.join(os.path.dirname(__file__), "resources", "sldadapter")
+        with open(os.path.join(folder, "cases.json")) as f:
+            cases = json.load(f)
+        wknReplacements = {"point": POINT_WKN_REPLACEMENTS, "polygon": POLYGON_WKN_REPLACEMENTS}
+        for case in cases:
+            with io.open(os.path.join(folder, case["name"] + ".qgis.sld"), encoding="utf-8") as f:
+                sld = f.read()
+            with io.open(os.path.join(folder, case["name"] + ".gs.sld"), encoding="utf-8") as f:
+                expected = f.read()
+            converted = convertQgsSld(sld, case.get("rulePrefix", ""),
+                                      wknReplacements.get(case["geometry"]),
+                                      case.get("iconNames"), case["sizeFactor"])
+            self.assertEqual(expected, converted, "Wrong conversion of style " + case["name"])
+
+    def testSetScaleRange(self):
+        sld = ('<sld:Rule><sld:Name>a</sld:Name><sld:MinScaleDenominator>1000</sld:MinScaleDenominator>'
+               '<sld:MaxScaleDenominator>50000</sld:MaxScaleDenominator><sld:PointSymbolizer/></sld:Rule>'
+               '<sld:Rule><sld:Name>b</sld:Name><sld:PointSymbolizer/></sld:Rule>')
+        # ranges of rules are intersected with the passed one, not replaced
+        self.assertEqual('<sld:Rule><sld:Name>a</sld:Name><sld:MinScaleDenominator>10000</sld:MinScaleDenominator>'
+                         '<sld:MaxScaleDenominator>50000.0</sld:MaxScaleDenominator><sld:PointSymbolizer/></sld:Rule>'
+                         '<sld:Rule><sld:Name>b</sld:Name><sld:MinScaleDenominator>10000</sld:MinScaleDenominator>'
+                         '<sld:PointSymbolizer/></sld:Rule>',
+                         setScaleRange(sld, 10000, None))
+        self.assertEqual('<sld:Rule><sld:Name>a</sld:Name><sld:MinScaleDenominator>1000.0</sld:MinScaleDenominator>'
+                         '<sld:MaxScaleDenominator>5000</sld:MaxScaleDenominator><sld:PointSymbolizer/></sld:Rule>'
+                         '<sld:Rule><sld:Name>b</sld:Name><sld:MaxScaleDenominator>5000</sld:MaxScaleDenominator>'
+                         '<sld:PointSymbolizer/></sld:Rule>',
+                         setScaleRange(sld, None, 5000))
+
+    def testBuildColorMap(self):
+        ramp = [(float(i), (i, 0, 255 - i)) for i in range(256)]
+        colorMap = buildColorMap(ramp)
+        self.assertEqual(256, colorMap.count("<ColorMapEntry "))
+        colorMap = buildColorMap(ramp, "ramp", True)
+        self.assertEqual('<ColorMap><ColorMapEntry color="#0000ff" quantity="0.0" />'
+                         '<ColorMapEntry color="#ff0000" quantity="255.0" /></ColorMap>', colorMap)
+        steps = [(1, (0, 0, 0)), (2, (0, 0, 0)), (3, (255, 0, 0)), (4, (0, 0, 0))]
+        colorMap = buildColorMap(steps, "intervals", True)
+        self.assertEqual('<ColorMap type="intervals"><ColorMapEntry color="#000000" quantity="2.0" />'
+                         '<ColorMapEntry color="#ff0000" quantity="3.0" />'
+                         '<ColorMapEntry color="#000000" quantity="4.0" /></ColorMap>', colorMap)
+        colorMap = buildColorMap(steps, "values", True)
+        self.assertEqual(4, colorMap.count("<ColorMapEntry "))
+
+
 ##################################################################################################
 
 def suiteSubset():
@@ -73,6 +128,7 @@ def suiteSubset():
 
 def suite():
     suite = unittest.makeSuite(SymbologyTests, 'test')
+    suite.addTests(unittest.makeSuite(SldAdapterTests, 'test'))
     return suite
 
 # run all tests using unittest skipping nose or testplugin
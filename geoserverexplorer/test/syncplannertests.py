@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# (c) 2016 Boundless, http://boundlessgeo.com
+# This code is licensed under the GPL 2.0 license.
+#
+import unittest
+import os
+import sys
+from geoserverexplorer.qgis import layers
+from geoserverexplorer.qgis.syncplanner import planProjectSync
+from qgis.utils import iface
+from geoserverexplorer.test import utils
+from geoserverexplorer.test.utils import PT1, WORKSPACE
+
+
+class SyncPlannerTests(unittest.TestCase):
+    '''
+    Tests for the computation of the operations needed to publish a project
+    Requires a Geoserver catalog running on localhost:8080 with default credentials
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cat = utils.getGeoServerCatalog()
+        projectFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "test.qgs")
+        iface.addProject(projectFile)
+
+    def setUp(self):
+        ''' 'test' workspace cannot exist in the test catalog'''
+        utils.cleanCatalog(self.cat.catalog)
+        self.cat.catalog.create_workspace(WORKSPACE, "http://geoserver.com")
+        self.ws = self.cat.catalog.get_workspace(WORKSPACE)
+        assert self.ws is not None
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.cleanCatalog(cls.cat.catalog)
+
+    def _publishProject(self):
+        plan = planProjectSync(self.cat, self.ws)
+        for description, func, args in plan.operations:
+            func(*args)
+
+    def testEmptyWorkspace(self):
+        plan = planProjectSync(self.cat, self.ws)
+        self.assertEqual(len(layers.getAllLayers()), len([d for d in plan.descriptions()
+                                                          if d.startswith("Publish layer")]))
+
+    def testPublishedProjectYieldsEmptyPlan(self):
+        self._publishProject()
+        plan = planProjectSync(self.cat, self.ws)
+        self.assertEqual([], plan.descriptions())
+
+    def testChangedTitle(self):
+        self._publishProject()
+        layer = layers.resolveLayer(PT1)
+        title = layer.title()
+        layer.setTitle("A new title")
+        try:
+            plan = planProjectSync(self.cat, self.ws)
+            self.assertEqual(["Update title and abstract of layer '%s'" % PT1], plan.descriptions())
+            for description, func, args in plan.operations:
+                func(*args)
+            self.assertEqual("A new title", self.cat.catalog.get_layer(PT1).resource.title)
+        finally:
+            layer.setTitle(title)
+
+
+##################################################################################################
+
+def suiteSubset():
+    tests = []
+    suite = unittest.TestSuite(map(SyncPlannerTests, tests))
+    return suite
+
+def suite():
+    suite = unittest.makeSuite(SyncPlannerTests, 'test')
+    return suite
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+# run a subset of tests using unittest skipping nose or testplugin
+def run_subset():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suiteSubset())
@@ -8,9 +8,15 @@ import sys
 from geoserverexplorer.test import utils
 from geoserverexplorer.test.catalogtests import suite as catalogSuite
 from geoserverexplorer.test.deletetests import suite as deleteSuite
+from geoserverexplorer.test.deleteplannertests import suite as deletePlannerSuite
 from geoserverexplorer.test.dragdroptests import suite as dragdropSuite
+from geoserverexplorer.test.featuresynctests import suite as featureSyncSuite
 from geoserverexplorer.test.guitests import suite as guiSuite
+from geoserverexplorer.test.paralleltests import suite as parallelSuite
+from geoserverexplorer.test.searchindextests import suite as searchIndexSuite
+from geoserverexplorer.test.stylecachetests import suite as styleCacheSuite
 from geoserverexplorer.test.symbologytests import suite as symbologySuite
+from geoserverexplorer.test.syncplannertests import suite as syncPlannerSuite
 
 # Tests for the QGIS Tester plugin. To know more see
 # https://github.com/boundlessgeo/qgis-tester-plugin
@@ -42,9 +48,15 @@ def unitTests():
     _tests = []
     _tests.extend(catalogSuite())
     _tests.extend(deleteSuite())
+    _tests.extend(deletePlannerSuite())
     _tests.extend(dragdropSuite())
+    _tests.extend(featureSyncSuite())
     _tests.extend(guiSuite())
+    _tests.extend(parallelSuite())
+    _tests.extend(searchIndexSuite())
+    _tests.extend(styleCacheSuite())
     _tests.extend(symbologySuite())
+    _tests.extend(syncPlannerSuite())
     return _tests
 
 def settings():
@@ -58,7 +70,13 @@ def runAllUnitTests():
     suite = unittest.TestSuite()
     suite.addTest(catalogSuite())
     suite.addTest(deleteSuite())
+    suite.addTest(deletePlannerSuite())
     suite.addTest(dragdropSuite())
+    suite.addTest(featureSyncSuite())
     suite.addTest(guiSuite())
+    suite.addTest(parallelSuite())
+    suite.addTest(searchIndexSuite())
+    suite.addTest(styleCacheSuite())
     suite.addTest(symbologySuite())
+    suite.addTest(syncPlannerSuite())
     unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite)